@@ -1,17 +1,42 @@
 # app.py
-from flask import Flask, render_template, request, redirect, url_for, flash, session, make_response
+from flask import Flask, Response, jsonify, render_template, request, redirect, url_for, flash, session, make_response, g, stream_with_context
 from flask_cors import CORS
 import os
 import datetime
 import logging
 import traceback
 import re
+import time
+import random
 import json
+import codecs
+import click
+import gzip
+import hashlib
+import functools
+import itertools
+try:
+    import brotli  # optional: Content-Encoding: br when installed
+except ImportError:
+    brotli = None
 
 # Import database functions and OpenAI integration
-from database import initialize_db, add_workout, get_all_workouts, get_users, add_user, delete_workout
-from openai_integration import query_openai
-import database  # Import full database module to access USE_SQLITE, cursor, conn, etc.
+from database import (initialize_db, add_workout, add_workouts, get_workouts, get_recent_dates, get_users, get_user, get_user_by_name,
+                      add_user, delete_workout, get_user_stats, rebuild_user_stats, search_workouts)
+from openai_integration import query_openai, query_openai_hedged, stream_openai, FALLBACK_MESSAGE
+import suggestion_cache
+import single_flight
+import batch_plans
+import latency
+import local_planner
+import jobs
+import llm_client
+import prompt_store
+import history_io
+import metrics
+from history_compactor import compact_gym_history, PROMPT_RECENT_SESSIONS
+from wod_parser import iter_wod_blocks, split_wod_blocks, parse_wod_blocks
+import database  # Import full database module for admin helpers (clear_database, etc.)
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -23,8 +48,24 @@ app = Flask(__name__, template_folder=template_dir)
 app.config["APPLICATION_ROOT"] = "/"
 CORS(app)
 
-# Use a fixed secret key during development if desired, but here using os.urandom(16)
-app.secret_key = os.urandom(16)
+# Sessions are signed with SECRET_KEY; set it when running several gunicorn workers so
+# every worker accepts the same session cookie. Falls back to a random key, which is
+# shared by all workers only when the app is preloaded (gunicorn.conf.py).
+app.secret_key = os.environ.get("SECRET_KEY") or os.urandom(16)
+
+# Stream suggestions over Server-Sent Events (page shell first, tokens as they arrive).
+STREAM_SUGGESTIONS = os.environ.get("STREAM_SUGGESTIONS", "true").lower() == "true"
+# Seconds the suggestion pages wait for the LLM (the first token, when streaming)
+# before showing a plan built locally from the user's history; 0 waits forever.
+SUGGESTION_DEADLINE = float(os.environ.get("SUGGESTION_DEADLINE", "15"))
+
+# Suggestion prompts are logged at DEBUG level for this fraction of calls, truncated.
+PROMPT_LOG_SAMPLE_RATE = float(os.environ.get("PROMPT_LOG_SAMPLE_RATE", "0.01"))
+PROMPT_LOG_MAX_CHARS = int(os.environ.get("PROMPT_LOG_MAX_CHARS", "500"))
+
+# Responses smaller than this are sent uncompressed.
+COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", "500"))
+COMPRESSIBLE_TYPES = ("text/html", "text/plain", "text/csv", "application/json")
 
 @app.route('/logout')
 def logout():
@@ -33,48 +74,13 @@ def logout():
     return redirect(url_for('index'))
 
 # --- Prompt Storage Functions ---
-import os
-
-PROMPTS_FILE = os.path.join("/data", "prompts.json")
-
 def load_prompts():
-    if not os.path.exists(PROMPTS_FILE):
-        default_prompts = {
-            "gym_prompt": (
-                "Based on my recent gym workout history focusing on strength training.\n"
-                "Please suggest a workout plan for today, starting with warm-up and following with the main exercises. "
-                "Keep in mind a high-intensity level. Suggest 5 min warm-up & stretching exercises relevant to the main exercises. "
-                "Include exactly 5 types of exercises in the main exercises. Each exercise can be from 3 to 5 sets. "
-                "The exercises must be limited to 2 body parts per session, for example - chest and back, or shoulders and legs. "
-                "Do not suggest the same body parts that were trained in the most recent history. Suggest those that I haven't trained in a while. "
-                "When choosing weight for the exercise - take the weight I have done with this exercise in the last historic session and add 1-3 kg. "
-                "Give me suggestion in the following format where every set starts from the new line. "
-                "In the beginning, tell me briefly and without too much details what I trained last time, and where the focus of today's training should be. "
-                "Then give me warm-up exercises. The title saying **Warm-up & Stretching** must be in bold font. "
-                "Keep one blank line between warm-up and main exercises. The title saying **Main Exercises** must be in bold font. "
-                "Then give me today's program. Indicate which part of the body it works, max number of sets, max number of repetitions and max weight. "
-                "List main exercises as single line for each out of 5. For example: Chest - Bench press: ramp to 80kg, 6 reps, 5 sets.\n"
-            ),
-            "wod_prompt": (
-                "You are a professional CrossFit coach, and I am an athlete with 2 years of experience in CrossFit. "
-                "Give me a WOD exercise program following the typical structure of a WOD. Include Rx weights and time for exercises where appropriate. "
-                "The weights should be in kilograms. The time should be in minutes. "
-                "Please provide today's WOD program in exactly 4 complete blocks. Each block should start with 'Block X:' where X is the block number. "
-                "Each block must include the following details: Block title, Exercises, Time. The first block is always the warm-up. "
-                "The suggestion must take into account my last saved WOD workout below, targeting different muscle groups and considering previous difficulty feedback. "
-                "To understand the difficulty feedback, look for one of the following keywords: too easy, easy, perfect, too difficult.\n"
-            )
-        }
-        with open(PROMPTS_FILE, "w") as f:
-            json.dump(default_prompts, f, indent=4)
-        return default_prompts
-    else:
-        with open(PROMPTS_FILE, "r") as f:
-            return json.load(f)
+    return prompt_store.load()
 
 def save_prompts(prompts):
-    with open(PROMPTS_FILE, "w") as f:
-        json.dump(prompts, f, indent=4)
+    prompt_store.save(prompts)
+    # Suggestions built from the old prompts are no longer valid
+    suggestion_cache.clear()
 
 # --- Admin Prompts Editing Route ---
 @app.route('/prompts', methods=['GET', 'POST'])
@@ -106,22 +112,153 @@ def favicon():
 def handle_binary_response(response):
     if 'text/html' in response.headers.get('Content-Type', ''):
         response.headers['Content-Type'] = 'text/html; charset=utf-8'
+    compress_response(response)
     return response
 
+def compress_response(response):
+    """Brotli/gzip-encode a buffered text response if the client accepts it.
+
+    Streamed responses (SSE, import progress, exports) are left alone: they
+    have to reach the client chunk by chunk.
+    """
+    if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return
+    response.vary.add("Accept-Encoding")
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return
+    if brotli is not None and request.accept_encodings["br"]:
+        response.set_data(brotli.compress(body, quality=5))
+        response.headers["Content-Encoding"] = "br"
+    elif request.accept_encodings["gzip"]:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers["Content-Encoding"] = "gzip"
+
+# --- Conditional GET ---
+# History, progress and suggestion pages only change when the user's workouts,
+# the prompts or the templates change. Their validators are built from
+# database.get_user_version() (one primary-key lookup), so a revalidation that
+# ends in 304 Not Modified never reads the workouts or renders a template.
+def _templates_mtime():
+    paths = [os.path.join(template_dir, name) for name in os.listdir(template_dir)]
+    return max(os.path.getmtime(path) for path in paths + [os.path.abspath(__file__)])
+
+TEMPLATES_MTIME = _templates_mtime()
+
+def conditional_get(view=None, *, when=None):
+    """Answer If-None-Match/If-Modified-Since with 304 for a logged-in user's page.
+
+    "regenerate" requests are never validated. With `when` (a callable),
+    requests are only validated while it returns True.
+    """
+    if view is None:
+        return lambda view: conditional_get(view, when=when)
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        user_id = session.get("user_id")
+        if request.method != "GET" or user_id is None or request.args.get("regenerate") == "1" \
+                or (when is not None and not when()):
+            return view(*args, **kwargs)
+        version, updated_at = database.get_user_version(user_id)
+        prompts = prompt_store.signature()
+        validator = repr((request.endpoint, user_id, version, updated_at, request.full_path,
+                          TEMPLATES_MTIME, prompts, STREAM_SUGGESTIONS))
+        etag = hashlib.sha1(validator.encode()).hexdigest()[:20]
+        last_modified = datetime.datetime.fromtimestamp(
+            max(updated_at or 0, TEMPLATES_MTIME, prompts[1] / 1e9 if prompts else 0), datetime.timezone.utc)
+
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains_weak(etag)
+        else:
+            since = request.if_modified_since
+            not_modified = since is not None and last_modified.replace(microsecond=0) <= since
+        if not_modified:
+            response = make_response("", 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag, weak=True)
+        response.last_modified = last_modified
+        # Always revalidate; the page is per user, so no shared caches
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+    return wrapper
+
+# --- Request Metrics ---
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    # For streamed responses this is the time to the first byte, not to the last event
+    start = g.pop("request_start", None)
+    if start is not None:
+        endpoint = request.endpoint or "unmatched"
+        metrics.observe("http_request_duration_seconds", time.perf_counter() - start,
+                        {"endpoint": endpoint, "method": request.method})
+        metrics.inc("http_requests_total",
+                    {"endpoint": endpoint, "method": request.method, "status": str(response.status_code)})
+    return response
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint (totals across all worker processes)."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+def job_gauges():
+    return [("jobs", {"status": status}, count) for status, count in jobs.stats().items()]
+metrics.register_gauges(job_gauges, per_process=False)
+
+def log_prompt(kind, user_id, prompt):
+    """Log a sampled, truncated copy of a suggestion prompt for debugging."""
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < PROMPT_LOG_SAMPLE_RATE:
+        shown = prompt if len(prompt) <= PROMPT_LOG_MAX_CHARS else prompt[:PROMPT_LOG_MAX_CHARS] + "..."
+        logger.debug(f"{kind} prompt for user {user_id} ({len(prompt)} chars): {shown}")
+
 # --- Jinja Filter for Markdown Bold ---
 def markdown_bold(text):
-    return re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', text)
+    # str(): on already-escaped Markup, re.sub would escape the <strong> tags too
+    return re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', str(text))
 app.jinja_env.filters['markdown_bold'] = markdown_bold
 
-# --- Initialize the Database ---
-try:
-    logger.info("Initializing database...")
+# --- Application Factory ---
+# Importing this module only builds the Flask app; nothing is opened or
+# started. The database initializes itself on first use in each process and
+# the job workers start with the first request (or in gunicorn's post_fork),
+# so the app can be preloaded in the gunicorn master and forked safely.
+def create_app():
+    """Initialize the database up front and return the WSGI app.
+
+    Safe to call before forking (gunicorn --preload): the connection used
+    for the migrations is closed again, and no threads are started.
+    """
+    try:
+        logger.info("Initializing database...")
+        initialize_db()
+        database.close_connection()
+        logger.info("Database initialized successfully")
+    except Exception as e:
+        logger.error(f"Failed to initialize database: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise
+    return app
+
+def init_worker():
+    """Per-process setup after fork (gunicorn post_fork hook)."""
+    llm_client.reset_session()
+    # Background workers precompute suggestions after new workouts are saved
+    jobs.start()
+
+@app.before_request
+def ensure_process_initialized():
+    # No-ops after the first request of each process
     initialize_db()
-    logger.info("Database initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize database: {str(e)}")
-    logger.error(traceback.format_exc())
-    raise
+    jobs.start()
 
 # ------------------------------
 # Error Handling
@@ -135,6 +272,27 @@ def handle_error(error):
 # ------------------------------
 # Index Route & User Selection
 # ------------------------------
+def login_user(user):
+    session["user_id"] = user["id"]
+    session["user_name"] = user["username"]
+    if user["username"].lower() == "admin":
+        return redirect(url_for("edit_prompts"))
+    return redirect(url_for("index"))
+
+def login_new_user(username):
+    # Usernames are unique: entering an existing name selects that user
+    user = get_user_by_name(username)
+    if user is None:
+        logger.info(f"Creating new user: {username}")
+        try:
+            user = {"id": add_user(username), "username": username}
+        except ValueError:
+            # Created by a concurrent request in the meantime
+            user = get_user_by_name(username)
+    else:
+        flash(f"User {user['username']} already exists and has been selected.")
+    return login_user(user)
+
 @app.route('/', methods=["GET", "POST"])
 def index():
     logger.info("Starting index route")
@@ -147,13 +305,7 @@ def index():
             # If the dropdown selection indicates a new user
             if selected_user == "new":
                 if new_user:
-                    logger.info(f"Creating new user: {new_user}")
-                    user_id = add_user(new_user)
-                    session["user_id"] = user_id
-                    session["user_name"] = new_user
-                    if new_user.lower() == "admin":
-                        return redirect(url_for("edit_prompts"))
-                    return redirect(url_for("index"))
+                    return login_new_user(new_user)
                 else:
                     flash("Please enter a new username.")
                     return redirect(url_for("index"))
@@ -161,32 +313,23 @@ def index():
             # If an existing user was selected
             elif selected_user:
                 logger.info(f"Selected existing user: {selected_user}")
-                session["user_id"] = int(selected_user)
-                users = get_users()
-                for user in users:
-                    if user["id"] == int(selected_user):
-                        session["user_name"] = user["username"]
-                        break
-                if session.get("user_name", "").lower() == "admin":
-                    return redirect(url_for("edit_prompts"))
-                return redirect(url_for("index"))
+                user = get_user(int(selected_user))
+                if user is None:
+                    flash("Unknown user. Please select again.")
+                    return redirect(url_for("index"))
+                return login_user(user)
             
             # If nothing was selected but new_user field has a value (fallback)
             elif new_user:
-                logger.info(f"Creating new user: {new_user}")
-                user_id = add_user(new_user)
-                session["user_id"] = user_id
-                session["user_name"] = new_user
-                if new_user.lower() == "admin":
-                    return redirect(url_for("edit_prompts"))
-                return redirect(url_for("index"))
+                return login_new_user(new_user)
             
             else:
                 flash("Please select an existing user or enter a new username.")
                 return redirect(url_for("index"))
         else:
             logger.info("Processing GET request to index")
-            users = get_users()
+            # The user list (a cached copy, see database.get_users) is only shown before login
+            users = get_users() if not session.get("user_id") else []
             return render_template("index.html", users=users, current_user=session.get("user_id"))
     except Exception as e:
         logger.error(f"Error in index route: {str(e)}")
@@ -203,20 +346,197 @@ def clear_database():
         flash("Unauthorized access.")
         return redirect('/')
     
-    if database.USE_SQLITE:
-        database.cursor.execute("DELETE FROM users")
-        database.cursor.execute("DELETE FROM workouts")
-        database.conn.commit()
-    else:
-        # For in-memory storage
-        database.users = []
-        database.workouts = []
-        database.next_workout_id = 1
-        database.next_user_id = 1
+    database.clear_database()
     
     flash("Database cleared successfully.")
     return redirect(url_for("edit_prompts"))
 
+# ------------------------------
+# History Pagination & JSON API
+# ------------------------------
+# Sessions shown per history page, and max rows per /api/workouts call.
+HISTORY_PAGE_SESSIONS = int(os.environ.get("HISTORY_PAGE_SESSIONS", "10"))
+API_MAX_LIMIT = 200
+
+def encode_cursor(workout):
+    return f"{workout['date']}:{workout['id']}"
+
+def decode_cursor(cursor):
+    """Parse a "<date>:<id>" keyset cursor. Returns None for a missing cursor, raises ValueError if malformed."""
+    if not cursor:
+        return None
+    date, _, workout_id = cursor.rpartition(":")
+    if not date:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return date, int(workout_id)
+
+def get_history_page(user_id, workout_type, cursor):
+    """Return ([(date, [workouts])...] newest first, next_cursor) for one history page."""
+    try:
+        before = decode_cursor(cursor)
+    except ValueError:
+        before = None
+    dates = get_recent_dates(user_id, workout_type, HISTORY_PAGE_SESSIONS + 1, before=before)
+    has_more = len(dates) > HISTORY_PAGE_SESSIONS
+    dates = dates[:HISTORY_PAGE_SESSIONS]
+    if not dates:
+        return [], None
+    rows = get_workouts(user_id, workout_type, since=dates[-1], order="desc", before=before)
+    sessions = {}
+    for w in rows:
+        sessions.setdefault(w["date"], []).append(w)
+    # Oldest session shown is complete, so the cursor is its oldest row
+    next_cursor = encode_cursor(rows[-1]) if has_more else None
+    return [(date, list(reversed(sessions[date]))) for date in dates], next_cursor
+
+@app.route('/api/workouts')
+def api_workouts():
+    if "user_id" not in session:
+        return jsonify({"error": "Please select a user first."}), 401
+    workout_type = request.args.get("type", "gym")
+    if workout_type not in ("gym", "wod"):
+        return jsonify({"error": "type must be 'gym' or 'wod'"}), 400
+    try:
+        before = decode_cursor(request.args.get("before"))
+        limit = min(max(int(request.args.get("limit", 50)), 1), API_MAX_LIMIT)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    # Fetch one extra row to know whether there is another page
+    rows = get_workouts(session.get("user_id"), workout_type, limit=limit + 1, order="desc", before=before)
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return jsonify({"workouts": rows[:limit], "next_cursor": next_cursor})
+
+# ------------------------------
+# History Search
+# ------------------------------
+# Results per /search page (the JSON API takes limit, up to API_MAX_LIMIT).
+SEARCH_PAGE_SIZE = int(os.environ.get("SEARCH_PAGE_SIZE", "20"))
+
+def run_search(user_id, args, limit):
+    """Search for the q/type/offset request args. Returns (results, next_offset); raises ValueError on bad args."""
+    workout_type = args.get("type") or None
+    if workout_type not in (None, "gym", "wod"):
+        raise ValueError("type must be 'gym' or 'wod'")
+    offset = max(int(args.get("offset", 0)), 0)
+    # Fetch one extra result to know whether there is another page
+    results = search_workouts(user_id, args.get("q", ""), workout_type, limit=limit + 1, offset=offset)
+    next_offset = offset + limit if len(results) > limit else None
+    return results[:limit], next_offset
+
+@app.route('/search')
+@conditional_get
+def search():
+    if "user_id" not in session:
+        flash("Please select a user first.")
+        return redirect('/')
+    try:
+        results, next_offset = run_search(session.get("user_id"), request.args, SEARCH_PAGE_SIZE)
+    except ValueError:
+        results, next_offset = [], None
+    return render_template('search.html', query=request.args.get("q", ""),
+                           workout_type=request.args.get("type", ""), results=results, next_offset=next_offset)
+
+@app.route('/api/search')
+def api_search():
+    if "user_id" not in session:
+        return jsonify({"error": "Please select a user first."}), 401
+    try:
+        limit = min(max(int(request.args.get("limit", SEARCH_PAGE_SIZE)), 1), API_MAX_LIMIT)
+        results, next_offset = run_search(session.get("user_id"), request.args, limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"results": results, "next_offset": next_offset})
+
+# ------------------------------
+# Bulk Import / Export
+# ------------------------------
+@app.route('/import', methods=['POST'])
+def import_workouts():
+    """Import CSV/JSONL history for the current user.
+
+    Accepts a multipart upload ("file") or a raw request body. Responds with
+    one JSON progress report per line (application/x-ndjson) while importing.
+    """
+    if "user_id" not in session:
+        return jsonify({"error": "Please select a user first."}), 401
+    user_id = session.get("user_id")
+    upload = request.files.get("file")
+    if upload:
+        fmt = request.args.get("format") or history_io.detect_format(upload.filename)
+        body = upload.stream
+    else:
+        fmt = request.args.get("format") or ("jsonl" if "json" in request.mimetype else "csv")
+        body = request.stream
+    if fmt not in history_io.FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(history_io.FORMATS)}"}), 400
+    lines = codecs.iterdecode(body, "utf-8-sig")
+
+    def events():
+        report = {"types": []}
+        try:
+            for report in history_io.iter_import(lines, fmt, user_id):
+                yield json.dumps(report) + "\n"
+        except Exception as e:
+            logger.error(f"Import failed for user {user_id}: {str(e)}")
+            yield json.dumps({"error": "Import failed; rows before this point were saved."}) + "\n"
+        for kind in report["types"]:
+            history_changed(user_id, kind)
+
+    return Response(stream_with_context(events()), mimetype="application/x-ndjson")
+
+@app.route('/export')
+def export_workouts():
+    """Download the current user's history as CSV (default) or JSONL, streamed."""
+    if "user_id" not in session:
+        flash("Please select a user first.")
+        return redirect('/')
+    fmt = request.args.get("format", "csv")
+    workout_type = request.args.get("type", "all")
+    if fmt not in history_io.FORMATS or workout_type not in ("all", "gym", "wod"):
+        return jsonify({"error": "format must be csv or jsonl, type must be all, gym or wod"}), 400
+    types = ("gym", "wod") if workout_type == "all" else (workout_type,)
+    filename = f"workouts-{workout_type}-{datetime.date.today().isoformat()}.{fmt}"
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return Response(history_io.export_history(session.get("user_id"), fmt, types), mimetype=mimetype,
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+def resolve_user(user):
+    """Find a user by id or username for the CLI commands."""
+    found = get_user(int(user)) if user.isdigit() else get_user_by_name(user)
+    if found is None:
+        raise click.ClickException(f"No such user: {user}")
+    return found
+
+@app.cli.command("import-history")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--user", required=True, help="User id or username.")
+@click.option("--format", "fmt", type=click.Choice(history_io.FORMATS), help="Default: from the file extension.")
+@click.option("--chunk-size", type=int, default=None, help="Rows per transaction.")
+def import_history_command(path, user, fmt, chunk_size):
+    """Import a CSV/JSONL workout history file for a user."""
+    user = resolve_user(user)
+    fmt = fmt or history_io.detect_format(path)
+    progress = lambda r: print(f"{r['processed']} rows read, {r['imported']} imported, {r['error_count']} invalid")
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        report = history_io.import_history(f, fmt, user["id"], chunk_size, progress)
+    for error in report["errors"]:
+        print(f"line {error['line']}: {error['error']}")
+    for kind in report["types"]:
+        history_changed(user["id"], kind)
+    print(f"Imported {report['imported']} workout(s) for {user['username']}.")
+
+@app.cli.command("export-history")
+@click.option("--user", required=True, help="User id or username.")
+@click.option("--format", "fmt", type=click.Choice(history_io.FORMATS), default="csv")
+@click.option("--type", "workout_type", type=click.Choice(["all", "gym", "wod"]), default="all")
+@click.option("--output", type=click.File("w"), default="-", help="Default: stdout.")
+def export_history_command(user, fmt, workout_type, output):
+    """Write a user's workout history as CSV/JSONL."""
+    user = resolve_user(user)
+    types = ("gym", "wod") if workout_type == "all" else (workout_type,)
+    for chunk in history_io.export_history(user["id"], fmt, types):
+        output.write(chunk)
+
 # ------------------------------
 # Gym Workout Routes
 # ------------------------------
@@ -226,7 +546,7 @@ def record_workout():
         date_input = request.form.get('date') or datetime.date.today().isoformat()
         # Check if the multi-row fields exist
         if request.form.get('body_part_0') is not None:
-            rows_saved = 0
+            rows = []
             for i in range(5):
                 muscle_group = request.form.get(f'body_part_{i}', '').strip()
                 exercise = request.form.get(f'exercise_{i}', '').strip()
@@ -242,9 +562,11 @@ def record_workout():
                         "sets": sets,
                         "reps": reps
                     }
-                    add_workout(date_input, session.get("user_id"), "gym", details)
-                    rows_saved += 1
+                    rows.append((date_input, session.get("user_id"), "gym", details))
+            # Save all rows in one transaction
+            rows_saved = add_workouts(rows)
             if rows_saved:
+                history_changed(session.get("user_id"), "gym")
                 flash(f"{rows_saved} gym workout record(s) saved successfully.")
             else:
                 flash("No valid workout data provided.")
@@ -265,6 +587,7 @@ def record_workout():
                     "reps": reps
                 }
                 add_workout(date_input, session.get("user_id"), "gym", details)
+                history_changed(session.get("user_id"), "gym")
                 flash('Gym workout recorded successfully.')
             else:
                 flash('Missing fields for gym workout.')
@@ -272,54 +595,39 @@ def record_workout():
     return render_template('record.html')
 
 @app.route('/gym_history')
+@conditional_get
 def gym_history():
     if "user_id" not in session:
         flash("Please select a user first.")
         return redirect('/')
-    all_workouts = get_all_workouts()
-    # Filter to only gym workouts for the logged-in user
-    gym_workouts = [w for w in all_workouts if w.get("workout_type") == "gym" and w.get("user_id") == session.get("user_id")]
-    return render_template('gym_history.html', workouts=gym_workouts)
+    sessions, next_cursor = get_history_page(session.get("user_id"), "gym", request.args.get("before"))
+    return render_template('gym_history.html', sessions=sessions, next_cursor=next_cursor)
 
-@app.route('/gym_suggest')
-def gym_suggest():
-    workouts = get_all_workouts()
-    # Filter workouts for the current user and only gym type
-    workouts = [w for w in workouts if w["user_id"] == session.get("user_id")]
-    gym_workouts = [w for w in workouts if w["workout_type"] == "gym"]
-    
-    # Sort gym workouts by date descending (assumes ISO format: YYYY-MM-DD)
-    gym_workouts = sorted(gym_workouts, key=lambda w: w["date"], reverse=True)
-    
-    # Group workouts by session date
-    sessions = {}
-    for w in gym_workouts:
-        sessions.setdefault(w["date"], []).append(w)
-    
-    # Sort the session dates in descending order
-    session_dates = sorted(sessions.keys(), reverse=True)
+def build_gym_prompt(user_id):
+    """Build the gym suggestion prompt for a user.
+
+    Returns (prompt, last_session) where last_session is the most recent
+    session's records for display (or None).
+    """
+    # Only the most recent sessions are loaded; older history comes from user_stats
+    recent_dates = get_recent_dates(user_id, "gym", PROMPT_RECENT_SESSIONS)
+    gym_workouts = get_workouts(user_id, "gym", since=recent_dates[-1], order="desc") if recent_dates else []
     
-    # Build a structured history string
-    structured_history_lines = []
-    for date in session_dates:
-        structured_history_lines.append(f"Session Date: {date}")
-        for record in sessions[date]:
-            structured_history_lines.append(
-                f"- Body Part: {record['details'].get('muscle_group', '')}, "
-                f"Exercise: {record['details'].get('exercise', '')}, "
-                f"Max Weight: {record['details'].get('max_weight', '')}, "
-                f"Sets: {record['details'].get('sets', '')}, "
-                f"Reps: {record['details'].get('reps', '')}"
-            )
-        structured_history_lines.append("")  # Blank line between sessions
-    history_text = "\n".join(structured_history_lines)
+    # Recent sessions verbatim plus a condensed summary, within the token budget
+    history_text, stats = compact_gym_history(gym_workouts, get_user_stats(user_id))
+    logger.info(
+        f"Gym prompt history for user {user_id}: {stats['sessions']} sessions, "
+        f"~{stats['full_tokens']} -> ~{stats['compact_tokens']} tokens "
+        f"({stats['verbatim_sessions']} verbatim)"
+    )
     
     # Determine the most recent session (for display purposes, if needed)
-    if session_dates:
-        max_date = session_dates[0]  # most recent date
-        last_workouts = sessions[max_date]
+    if gym_workouts:
+        max_date = gym_workouts[0]["date"]  # most recent date
         records = []
-        for w in last_workouts:
+        for w in gym_workouts:
+            if w["date"] != max_date:
+                break
             records.append({
                 "muscle_group": w["details"].get("muscle_group", ""),
                 "exercise": w["details"].get("exercise", ""),
@@ -340,28 +648,127 @@ def gym_suggest():
         f"{history_text}\n\nNow, based on the above, please provide today's workout program."
     )
     
-    # Log the prompt for debugging
-    logger.info("Gym Suggest Prompt: " + prompt)
-    
-    suggestion = query_openai(prompt)
+    log_prompt("Gym", user_id, prompt)
+    return prompt, last_session
+
+def get_last_gym_session(user_id):
+    """Return the most recent gym session ({"date", "records"}) without loading the full history."""
+    latest = get_workouts(user_id, "gym", limit=1, order="desc")
+    if not latest:
+        return None
+    max_date = latest[0]["date"]
+    records = [w["details"] for w in get_workouts(user_id, "gym", since=max_date, order="asc")]
+    return {"date": max_date, "records": records}
+
+def sse_event(event, data):
+    """Format one Server-Sent Event; data is JSON-encoded so newlines survive."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def sse_response(events):
+    response = Response(events, mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    # Stop reverse proxies (nginx, Render) from buffering the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+@app.route('/gym_suggest')
+# Only the streaming page shell is validated: the validator doesn't cover a suggestion embedded in the page
+@conditional_get(when=lambda: STREAM_SUGGESTIONS)
+def gym_suggest():
+    if "user_id" not in session:
+        flash("Please select a user first.")
+        return redirect('/')
+    user_id = session.get("user_id")
+    # "Regenerate" bypasses the suggestion cache
+    regenerate = request.args.get("regenerate") == "1"
+    last_session = get_last_gym_session(user_id)
+    if STREAM_SUGGESTIONS:
+        # Send the page shell right away; the suggestion arrives via /gym_suggest/stream
+        return render_template('gym_suggest.html', stream=True, regenerate=regenerate,
+                               last_session=last_session)
+    suggestion, _ = suggestion_or_local_plan("gym", user_id, regenerate=regenerate)
     return render_template('gym_suggest.html', suggestion=suggestion, last_session=last_session)
 
+@app.route('/gym_suggest/stream')
+def gym_suggest_stream():
+    if "user_id" not in session:
+        return sse_response([sse_event("error", "Please select a user first.")])
+    chunks = stream_or_local_plan("gym", session.get("user_id"),
+                                  regenerate=request.args.get("regenerate") == "1")
 
-# ------------------------------
-# WOD (CrossFit) Routes
-# ------------------------------
-@app.route('/wod_suggest')
-def wod_suggest():
+    def events():
+        for token in chunks:
+            yield sse_event("token", token)
+        yield sse_event("done", {})
+    return sse_response(events())
+
+
+@app.route('/progress')
+@conditional_get
+def progress():
     if "user_id" not in session:
         flash("Please select a user first.")
         return redirect('/')
-    workouts = get_all_workouts()
-    wod_workouts = [w for w in workouts if w["workout_type"] == "wod" and w["user_id"] == session.get("user_id")]
-    if wod_workouts:
-        sorted_wods = sorted(wod_workouts, key=lambda w: w["id"], reverse=True)
-        last_wod = sorted_wods[0]
-    else:
-        last_wod = None
+    stats = get_user_stats(session.get("user_id"))
+    muscle_groups = sorted(stats["muscle_groups"].items(), key=lambda kv: kv[1])
+    exercises = sorted(stats["exercises"].items(), key=lambda kv: (kv[1]["muscle_group"], kv[0]))
+    return render_template('progress.html', stats=stats, muscle_groups=muscle_groups, exercises=exercises)
+
+@app.cli.command("rebuild-stats")
+def rebuild_stats_command():
+    """Recompute the per-user training aggregates from the workouts table."""
+    count = rebuild_user_stats()
+    print(f"Rebuilt training stats for {count} user(s).")
+
+@app.cli.command("rebalance-shards")
+def rebalance_shards_command():
+    """Move users' workouts into the files configured by DB_SHARDS (run with the app stopped)."""
+    name = lambda location: "main DB" if location is None else f"shard {location}"
+    progress = lambda user_id, source, target: print(f"user {user_id}: {name(source)} -> {name(target)}")
+    moved = database.rebalance_shards(progress)
+    print(f"Moved {moved} user(s); {database.DB_SHARDS or 'no'} shard(s) configured.")
+
+
+@app.cli.command("generate-plans")
+@click.option("--kind", type=click.Choice(["gym", "wod", "all"]), default="all", show_default=True)
+@click.option("--workers", type=int, default=None, help="Max concurrent LLM calls (default BATCH_MAX_WORKERS).")
+@click.option("--checkpoint", type=click.Path(dir_okay=False), default=None,
+              help="Progress file (default: one per day in BATCH_CHECKPOINT_DIR).")
+@click.option("--restart", is_flag=True, help="Ignore the checkpoint and start over.")
+def generate_plans_command(kind, workers, checkpoint, restart):
+    """Pre-generate every user's suggestions into the cache (e.g. nightly), resuming an interrupted run."""
+    checkpoint = checkpoint or batch_plans.default_checkpoint()
+    if restart and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    kinds = ["gym", "wod"] if kind == "all" else [kind]
+    tasks = [(user["id"], k) for user in get_users() if user["username"].lower() != "admin" for k in kinds]
+
+    def progress(entry, stats):
+        finished = stats["generated"] + stats["cached"] + stats["error"]
+        if entry["outcome"] == "error":
+            print(f"user {entry['user_id']} {entry['kind']}: failed ({entry.get('error', 'LLM call failed')})")
+        elif finished % 50 == 0:
+            print(f"{finished}/{stats['tasks'] - stats['skipped']} done")
+    print(f"Generating {len(tasks)} plan(s); checkpoint: {checkpoint}")
+    stats = batch_plans.run(tasks, generate_plan, checkpoint, max_workers=workers, progress=progress)
+    concurrency = stats["concurrency"]
+    print(f"Done in {stats['seconds']}s: {stats['generated']} generated, {stats['cached']} already cached, "
+          f"{stats['error']} failed, {stats['skipped']} skipped (checkpoint).")
+    print(f"Throughput {stats['per_second']} plans/s; LLM latency p50 {stats['p50_seconds']}s, "
+          f"p95 {stats['p95_seconds']}s; {stats['rate_limited']} rate-limited response(s).")
+    print(f"Concurrency: started at {concurrency['start']}, ranged {concurrency['min']}-{concurrency['max']}, "
+          f"ended at {concurrency['final']}.")
+    for reason, count in sorted(stats["errors"].items(), key=lambda kv: -kv[1]):
+        print(f"  {count} x {reason}")
+
+
+# ------------------------------
+# WOD (CrossFit) Routes
+# ------------------------------
+def build_wod_prompt(user_id):
+    """Build the WOD suggestion prompt for a user. Returns (prompt, last_wod)."""
+    latest_wods = get_workouts(user_id, "wod", limit=1, order="desc")
+    last_wod = latest_wods[0] if latest_wods else None
 
     if last_wod:
         # Build a history string (for debugging; not used in the template below)
@@ -376,50 +783,196 @@ def wod_suggest():
     prompts_data = load_prompts()
     wod_prompt = prompts_data.get("wod_prompt", "")
     prompt = wod_prompt + "\nHere is my last saved WOD workout:\n" + f"{history_text}\n\nNow, based on the above, please provide today's complete WOD program. The weight should be in kilograms."
-
-    # Query OpenAI for the suggested WOD program
-    suggestion = query_openai(prompt)
-    # Use a regex to try to extract blocks (if present)
-    pattern = r'(Block\s+\d+:[\s\S]*?)(?=Block\s+\d+:|$)'
-    suggestion_blocks = re.findall(pattern, suggestion)
-    # Fallback: if no blocks found, use the full suggestion
-    if not suggestion_blocks:
-        suggestion_blocks = [suggestion]
-    saved_wod = "\n".join(suggestion_blocks)
     
     # Log for debugging
-    logger.info("WOD Suggest Prompt: " + prompt)
+    log_prompt("WOD", user_id, prompt)
+    return prompt, last_wod
+
+# ------------------------------
+# Suggestion Generation (cached)
+# ------------------------------
+PROMPT_BUILDERS = {"gym": build_gym_prompt, "wod": build_wod_prompt}
+
+def suggestion_cache_key(kind, user_id):
+    template = load_prompts().get(f"{kind}_prompt", "")
+    return suggestion_cache.make_key(kind, user_id, template)
+
+def get_suggestion(kind, user_id, regenerate=False, deadline=None, pinned=False):
+    """Return the gym/WOD suggestion for a user, from the cache when possible.
+
+    With a deadline (seconds), the LLM call is hedged and DeadlineExceeded is
+    raised once the deadline passes; the call then finishes (and is cached)
+    in the background. A new suggestion is cached pinned if `pinned` is set.
+    """
+    cache_key = suggestion_cache_key(kind, user_id)
+    suggestion = None if regenerate else suggestion_cache.get(cache_key, user_id, kind)
+    if suggestion is None:
+        prompt, _ = PROMPT_BUILDERS[kind](user_id)
+        query = query_openai if deadline is None else query_openai_hedged
+
+        def generate():
+            suggestion = query(prompt)
+            # Don't cache the error message
+            if suggestion != FALLBACK_MESSAGE:
+                suggestion_cache.put(cache_key, user_id, kind, suggestion, pinned)
+            return suggestion
+
+        def shared():
+            # Identical concurrent requests (double taps, several tabs) share one LLM call
+            try:
+                return single_flight.run(single_flight.make_key(kind, user_id, prompt), generate)
+            except single_flight.FlightError as e:
+                logger.warning(f"Shared {kind} suggestion for user {user_id} failed: {e}")
+                return FALLBACK_MESSAGE
+        suggestion = shared() if deadline is None else latency.call(shared, deadline)
+    return suggestion
+
+def stream_suggestion(kind, user_id, regenerate=False):
+    """Streaming variant of get_suggestion(): returns an iterator of text chunks.
+
+    A cache hit is returned as a single chunk; a fresh completion is cached
+    once the stream has finished.
+    """
+    cache_key = suggestion_cache_key(kind, user_id)
+    cached = None if regenerate else suggestion_cache.get(cache_key, user_id, kind)
+    if cached is not None:
+        return iter([cached])
+    prompt, _ = PROMPT_BUILDERS[kind](user_id)
+
+    def generate():
+        parts = []
+        for chunk in stream_openai(prompt):
+            parts.append(chunk)
+            yield chunk
+        suggestion = "".join(parts)
+        if suggestion and suggestion != FALLBACK_MESSAGE:
+            suggestion_cache.put(cache_key, user_id, kind, suggestion.strip())
+
+    def chunks():
+        # Identical concurrent requests share one LLM stream
+        produced = False
+        try:
+            for chunk in single_flight.stream(single_flight.make_key(kind, user_id, prompt), generate):
+                produced = True
+                yield chunk
+        except single_flight.FlightError as e:
+            logger.warning(f"Shared {kind} suggestion stream for user {user_id} failed: {e}")
+            if not produced:
+                yield FALLBACK_MESSAGE
+    return chunks()
+
+def local_suggestion(kind, user_id):
+    """A suggestion built from the user's history without the LLM (see local_planner.py)."""
+    if kind == "gym":
+        return local_planner.gym_plan(get_user_stats(user_id))
+    latest_wods = get_workouts(user_id, "wod", limit=1, order="desc")
+    return local_planner.wod_plan(latest_wods[0] if latest_wods else None)
+
+def suggestion_or_local_plan(kind, user_id, regenerate=False):
+    """For the suggestion pages: (text, is_local). The LLM suggestion if it
+    arrives within SUGGESTION_DEADLINE, else a locally built plan."""
+    try:
+        suggestion = get_suggestion(kind, user_id, regenerate, deadline=SUGGESTION_DEADLINE or None)
+        reason = "error" if suggestion == FALLBACK_MESSAGE else None
+    except latency.DeadlineExceeded:
+        reason = "deadline"
+    if reason is None:
+        return suggestion, False
+    metrics.inc("suggestion_fallbacks_total", {"kind": kind, "reason": reason})
+    return local_suggestion(kind, user_id), True
+
+def stream_or_local_plan(kind, user_id, regenerate=False):
+    """Streaming variant of suggestion_or_local_plan(): an iterator of text chunks."""
+    chunks = stream_suggestion(kind, user_id, regenerate)
+    try:
+        if SUGGESTION_DEADLINE:
+            chunks = latency.prefetch(chunks, SUGGESTION_DEADLINE)
+        first = next(chunks, FALLBACK_MESSAGE)
+        reason = "error" if first == FALLBACK_MESSAGE else None
+    except latency.DeadlineExceeded:
+        reason = "deadline"
+    if reason is None:
+        return itertools.chain([first], chunks)
+    metrics.inc("suggestion_fallbacks_total", {"kind": kind, "reason": reason})
+    return iter([local_suggestion(kind, user_id)])
+
+def precompute_suggestion(kind, user_id):
+    """Background job: build and cache the next suggestion for a user."""
+    if get_suggestion(kind, user_id) == FALLBACK_MESSAGE:
+        # Raise so the job is retried later
+        raise RuntimeError(f"LLM call failed for {kind} suggestion")
+
+def generate_plan(user_id, kind):
+    """Batch job: make sure the user's next gym/WOD suggestion is in the cache.
+
+    Returns "cached" if it already was, "generated" or "error". Either way the
+    entry is pinned, so the rest of the batch can't evict it before morning.
+    """
+    cache_key = suggestion_cache_key(kind, user_id)
+    cached = suggestion_cache.get(cache_key, user_id, kind)
+    if cached is not None:
+        suggestion_cache.pin(cache_key, user_id, kind, cached)
+        return "cached"
+    return "error" if get_suggestion(kind, user_id, pinned=True) == FALLBACK_MESSAGE else "generated"
+
+def history_changed(user_id, kind):
+    """Drop stale cached suggestions and precompute the next one in the background."""
+    suggestion_cache.invalidate_user(user_id, kind)
+    jobs.enqueue(f"{kind}_suggestion", user_id)
+
+jobs.register("gym_suggestion", lambda user_id: precompute_suggestion("gym", user_id))
+jobs.register("wod_suggestion", lambda user_id: precompute_suggestion("wod", user_id))
+
+@app.route('/wod_suggest')
+# Only the streaming page shell is validated: the validator doesn't cover a suggestion embedded in the page
+@conditional_get(when=lambda: STREAM_SUGGESTIONS)
+def wod_suggest():
+    if "user_id" not in session:
+        flash("Please select a user first.")
+        return redirect('/')
+    user_id = session.get("user_id")
+    # "Regenerate" bypasses the suggestion cache
+    regenerate = request.args.get("regenerate") == "1"
+    latest_wods = get_workouts(user_id, "wod", limit=1, order="desc")
+    last_wod = latest_wods[0] if latest_wods else None
+    if STREAM_SUGGESTIONS:
+        # Send the page shell right away; blocks arrive via /wod_suggest/stream
+        return render_template('wod_suggest.html', stream=True, regenerate=regenerate, last_wod=last_wod)
+
+    # Query OpenAI (or the cache) for the suggested WOD program
+    suggestion, _ = suggestion_or_local_plan("wod", user_id, regenerate=regenerate)
+    suggestion_blocks = split_wod_blocks(suggestion)
+    saved_wod = "\n".join(suggestion_blocks)
     
     return render_template('wod_suggest.html', 
                            suggestion_blocks=suggestion_blocks, 
                            last_wod=last_wod,
                            saved_wod=saved_wod)
 
-import re
+@app.route('/wod_suggest/stream')
+def wod_suggest_stream():
+    if "user_id" not in session:
+        return sse_response([sse_event("error", "Please select a user first.")])
+    chunks = stream_or_local_plan("wod", session.get("user_id"),
+                                  regenerate=request.args.get("regenerate") == "1")
 
-@app.template_filter('extract_blocks')
-def extract_blocks(text):
-    """
-    Extracts Block 2 and Block 3 from the given WOD text.
-    Assumes the text contains labels like "Block 2:" and "Block 3:".
-    """
-    block2 = re.search(r'(Block\s*2:.*?)(?=Block\s*3:|$)', text, re.DOTALL)
-    block3 = re.search(r'(Block\s*3:.*?)(?=Block\s*4:|$)', text, re.DOTALL)
-    blocks = []
-    if block2:
-        blocks.append(block2.group(1).strip())
-    if block3:
-        blocks.append(block3.group(1).strip())
-    return "<br>".join(blocks)
+    def events():
+        blocks = []
+        for kind, data in iter_wod_blocks(chunks):
+            if kind == "block":
+                blocks.append(data["text"])
+            yield sse_event(kind, data)
+        yield sse_event("done", {"saved_wod": "\n".join(blocks)})
+    return sse_response(events())
 
 @app.route('/wod_history')
+@conditional_get
 def wod_history():
     if "user_id" not in session:
         flash("Please select a user first.")
         return redirect('/')
-    workouts = get_all_workouts()
-    wod_workouts = [w for w in workouts if w["workout_type"] == "wod" and w["user_id"] == session.get("user_id")]
-    return render_template('wod_history.html', workouts=wod_workouts)
+    sessions, next_cursor = get_history_page(session.get("user_id"), "wod", request.args.get("before"))
+    return render_template('wod_history.html', sessions=sessions, next_cursor=next_cursor)
 
 @app.route('/record_wod_feedback', methods=['POST'])
 def record_wod_feedback():
@@ -432,9 +985,11 @@ def record_wod_feedback():
     if wod_workout and feedback:
         details = {
             "wod_blocks": wod_workout,      # Save the complete WOD workout here (use the same key as /record_wod)
-            "wod_difficulty": feedback       # Save the feedback here
+            "wod_difficulty": feedback,      # Save the feedback here
+            "blocks": parse_wod_blocks(wod_workout)  # Parsed once here so history pages don't re-parse
         }
         add_workout(today, session.get("user_id"), "wod", details)
+        history_changed(session.get("user_id"), "wod")
         flash("WOD workout and feedback recorded successfully.")
     else:
         flash("Missing WOD workout data or feedback.")
@@ -448,8 +1003,9 @@ def record_wod():
     today = datetime.date.today().isoformat()
     wod_workout = request.form.get('wod_workout')
     if wod_workout:
-        details = {"wod_blocks": wod_workout}
+        details = {"wod_blocks": wod_workout, "blocks": parse_wod_blocks(wod_workout)}
         add_workout(today, session.get("user_id"), "wod", details)
+        history_changed(session.get("user_id"), "wod")
         flash("WOD workout recorded successfully.")
     else:
         flash("No WOD workout data provided.")
@@ -459,6 +1015,7 @@ def record_wod():
 def delete_wod(record_id):
     try:
         delete_workout(record_id, workout_type='wod')
+        history_changed(session.get("user_id"), "wod")
         flash("WOD record deleted successfully.")
     except Exception as e:
         logger.error(f"Failed to delete WOD record: {str(e)}")
@@ -469,10 +1026,11 @@ def delete_wod(record_id):
 # Docker & Beanstalk Entry Point
 # ------------------------------
 if __name__ == '__main__':
+    create_app()
     host = os.environ.get("FLASK_RUN_HOST", "0.0.0.0")
     port = int(os.environ.get("FLASK_RUN_PORT", 5002))
     debug_mode = os.environ.get("FLASK_DEBUG", "False") == "True"
     app.run(host=host, port=port, debug=debug_mode, use_reloader=False)
 
-# Expose the WSGI application for Elastic Beanstalk
+# Expose the WSGI application for Elastic Beanstalk (gunicorn uses create_app(), see gunicorn.conf.py)
 application = app
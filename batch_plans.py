@@ -0,0 +1,154 @@
+# batch_plans.py
+# Runner behind `flask generate-plans`: generates every user's gym/WOD
+# suggestion ahead of time (e.g. nightly), so the morning rush is served from
+# the suggestion cache instead of starting one LLM call per page view. Its
+# entries are pinned: they expire with the cache TTL but are not evicted by
+# the row cap, however many users there are.
+#
+# - tasks run on a bounded thread pool whose effective concurrency adapts to
+#   the upstream: it grows by one after a run of clean calls and halves when
+#   the LLM client has seen new 429 responses (AIMD)
+# - every finished task is appended to a JSONL checkpoint file; a rerun skips
+#   the tasks that already succeeded (failed ones are retried)
+# - run() returns throughput and error stats for the report
+import os
+import json
+import time
+import datetime
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import llm_client
+
+# Max concurrent generations (the LLM client also caps calls per process).
+BATCH_MAX_WORKERS = int(os.environ.get("BATCH_MAX_WORKERS", str(llm_client.MAX_CONCURRENCY)))
+BATCH_START_WORKERS = int(os.environ.get("BATCH_START_WORKERS", "2"))
+# Where the default checkpoint files (one per day) are kept.
+BATCH_CHECKPOINT_DIR = os.environ.get("BATCH_CHECKPOINT_DIR", tempfile.gettempdir())
+
+def default_checkpoint(day=None):
+    """Checkpoint path for the given day's run (today by default)."""
+    day = day or datetime.date.today()
+    return os.path.join(BATCH_CHECKPOINT_DIR, f"generate-plans-{day.isoformat()}.jsonl")
+
+class AdaptiveLimit:
+    """Concurrency limit with additive increase / multiplicative decrease."""
+
+    def __init__(self, start, maximum):
+        self.cond = threading.Condition()
+        self.maximum = max(1, maximum)
+        self.limit = self.start = min(max(1, start), self.maximum)
+        self.active = 0
+        self.clean = 0  # calls finished since the last change
+        self.seen_rate_limited = llm_client.rate_limited_count()
+        self.lowest = self.highest = self.limit
+
+    def acquire(self):
+        with self.cond:
+            while self.active >= self.limit:
+                self.cond.wait()
+            self.active += 1
+
+    def release(self):
+        rate_limited = llm_client.rate_limited_count()
+        with self.cond:
+            self.active -= 1
+            if rate_limited > self.seen_rate_limited:
+                # One decrease per batch of 429s, however many calls saw them
+                self.seen_rate_limited = rate_limited
+                self.limit = max(1, self.limit // 2)
+                self.clean = 0
+            else:
+                self.clean += 1
+                if self.clean >= self.limit and self.limit < self.maximum:
+                    self.limit += 1
+                    self.clean = 0
+            self.lowest = min(self.lowest, self.limit)
+            self.highest = max(self.highest, self.limit)
+            self.cond.notify_all()
+
+def load_checkpoint(path):
+    """(user_id, kind) pairs that already succeeded according to the checkpoint file."""
+    done = set()
+    if not path or not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by a crash
+            if entry.get("outcome") != "error":
+                done.add((entry["user_id"], entry["kind"]))
+    return done
+
+def _percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def run(tasks, generate, checkpoint=None, max_workers=None, start_workers=None, progress=None):
+    """Run generate(user_id, kind) for every (user_id, kind) task not yet in the checkpoint.
+
+    generate returns an outcome string ("generated", "cached", or "error") or
+    raises. progress(entry, stats), if given, is called after each task.
+    Returns the stats dict.
+    """
+    done = load_checkpoint(checkpoint)
+    tasks = list(tasks)
+    pending = [task for task in tasks if task not in done]
+    limit = AdaptiveLimit(start_workers or BATCH_START_WORKERS, max_workers or BATCH_MAX_WORKERS)
+    lock = threading.Lock()
+    durations = []
+    stats = {"tasks": len(tasks), "skipped": len(tasks) - len(pending), "generated": 0, "cached": 0,
+             "error": 0, "errors": {}}
+    out = open(checkpoint, "a") if checkpoint else None
+    rate_limited_before = llm_client.rate_limited_count()
+
+    def work(user_id, kind):
+        start = time.perf_counter()
+        try:
+            outcome, error = generate(user_id, kind), None
+        except Exception as e:
+            outcome, error = "error", f"{type(e).__name__}: {e}"
+        finally:
+            limit.release()
+        entry = {"user_id": user_id, "kind": kind, "outcome": outcome,
+                 "seconds": round(time.perf_counter() - start, 3)}
+        if error:
+            entry["error"] = error
+        with lock:
+            stats[outcome] = stats.get(outcome, 0) + 1
+            if outcome == "error":
+                reason = error or "LLM call failed"
+                stats["errors"][reason] = stats["errors"].get(reason, 0) + 1
+            if outcome == "generated":
+                durations.append(entry["seconds"])
+            if out:
+                out.write(json.dumps(entry) + "\n")
+                out.flush()
+            if progress:
+                progress(entry, stats)
+
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(limit.maximum, thread_name_prefix="generate-plans") as pool:
+            for user_id, kind in pending:
+                # Backpressure: only submit once a slot under the current limit is free
+                limit.acquire()
+                pool.submit(work, user_id, kind)
+    finally:
+        if out:
+            out.close()
+    elapsed = time.perf_counter() - started
+    stats.update(
+        seconds=round(elapsed, 2),
+        per_second=round(len(pending) / elapsed, 2) if elapsed else 0.0,
+        p50_seconds=_percentile(durations, 50),
+        p95_seconds=_percentile(durations, 95),
+        rate_limited=llm_client.rate_limited_count() - rate_limited_before,
+        concurrency={"start": limit.start, "min": limit.lowest, "max": limit.highest, "final": limit.limit},
+    )
+    return stats
@@ -0,0 +1,14 @@
+# benchmarks
+# End-to-end performance benchmark for the app. Run from the repository root:
+#
+#   python -m benchmarks.run --users 20 --sessions 50 --requests 200 --concurrency 8 \
+#       --latency 0.5 --mode both --output bench.json
+#
+# - benchmarks.seed         seeds a SQLite database through database.add_user/add_workouts
+# - benchmarks.fake_openai  a local OpenAI-compatible server with configurable latency
+# - benchmarks.run          drives the routes through the Flask test client and/or real
+#                           gunicorn workers and writes p50/p95/p99 latency and throughput as JSON
+# - benchmarks.startup      cold start: app import/create_app() time, slowest imports, and
+#                           gunicorn time-to-first-response and memory with/without --preload
+#
+# Compare two commits with the same arguments, e.g. `git stash; python -m benchmarks.run ...`.
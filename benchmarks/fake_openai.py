@@ -0,0 +1,92 @@
+# benchmarks/fake_openai.py
+# Minimal OpenAI-compatible /chat/completions server for benchmarks.
+#
+# Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1. Every
+# request waits `latency` seconds before the first byte (model "thinking" time)
+# and, for streamed responses, `chunk_delay` seconds between content chunks.
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A canned completion that satisfies both the gym and the "Block X:" WOD format
+COMPLETION = (
+    "Last time you trained chest and back; today focus on legs and shoulders.\n\n"
+    "**Warm-up & Stretching**\n- 5 min bike\n- Leg swings 2x10\n\n"
+    "**Main Exercises**\n"
+    "Legs - Back squat: ramp to 100kg, 5 reps, 5 sets.\n"
+    "Legs - Romanian deadlift: 80kg, 8 reps, 4 sets.\n"
+    "Shoulders - Overhead press: 50kg, 6 reps, 5 sets.\n"
+    "Shoulders - Lateral raise: 12kg, 12 reps, 3 sets.\n"
+    "Legs - Walking lunge: 20kg, 10 reps, 3 sets.\n\n"
+    "Block 1: Warm-up\nBlock Title: General Warm-up\nExercises:\n- 400m run\n- 10 air squats\nTime: 8 minutes\n\n"
+    "Block 2: Strength\nBlock Title: Back Squat\nExercises:\n- 5x5 back squat at 75%\nTime: 15 minutes\n\n"
+    "Block 3: Metcon\nBlock Title: AMRAP 12\nExercises:\n- 10 thrusters 40kg\n- 10 pull-ups\nTime: 12 minutes\n\n"
+    "Block 4: Cool-down\nBlock Title: Mobility\nExercises:\n- Couch stretch 2 min/side\nTime: 5 minutes\n"
+)
+CHUNK_SIZE = 16
+
+def make_handler(latency, chunk_delay):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            prompt = "".join(m.get("content", "") for m in body.get("messages", []))
+            usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(COMPLETION) // 4}
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            time.sleep(latency)
+            if body.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for i in range(0, len(COMPLETION), CHUNK_SIZE):
+                    event = {"choices": [{"delta": {"content": COMPLETION[i:i + CHUNK_SIZE]}}]}
+                    self.wfile.write(b"data: " + json.dumps(event).encode() + b"\n\n")
+                    self.wfile.flush()
+                    if chunk_delay:
+                        time.sleep(chunk_delay)
+                self.wfile.write(b"data: " + json.dumps({"choices": [], "usage": usage}).encode() + b"\n\n")
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+                return
+            out = json.dumps({
+                "choices": [{"message": {"role": "assistant", "content": COMPLETION}}],
+                "usage": usage,
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+    return Handler
+
+def start_server(port=0, latency=0.5, chunk_delay=0.0):
+    """Serve in a daemon thread. Returns (server, base_url); call server.shutdown() to stop."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latency, chunk_delay))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/v1"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI-compatible server.")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds before the first byte")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="seconds between streamed chunks")
+    args = parser.parse_args(argv)
+    server, url = start_server(args.port, args.latency, args.chunk_delay)
+    print(f"Fake OpenAI server listening on {url}", file=sys.stderr)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+# benchmarks/run.py
+# Drives the app's routes and reports latency percentiles and throughput as JSON.
+#
+# Two modes, selectable with --mode:
+#   testclient  in-process through the Flask test client (no network, no WSGI server)
+#   gunicorn    real gunicorn workers (gthread) on a local port, driven over HTTP
+# Each route gets --requests requests spread over --concurrency client threads;
+# every client thread logs in as one of the seeded users first.
+import os
+import sys
+import json
+import math
+import time
+import random
+import socket
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (name, method, path); suggestion routes get ?regenerate=1 with --regenerate
+ROUTES = [
+    ("index", "GET", "/"),
+    ("record", "POST", "/record"),
+    ("gym_history", "GET", "/gym_history"),
+    ("gym_suggest", "GET", "/gym_suggest"),
+    ("gym_suggest_stream", "GET", "/gym_suggest/stream"),
+    ("wod_suggest", "GET", "/wod_suggest"),
+    ("wod_suggest_stream", "GET", "/wod_suggest/stream"),
+    ("wod_history", "GET", "/wod_history"),
+]
+SUGGEST_ROUTES = {"gym_suggest", "gym_suggest_stream", "wod_suggest", "wod_suggest_stream"}
+
+def record_form(rng):
+    """Form data for the multi-row /record POST (one full session)."""
+    from benchmarks.seed import gym_session
+    date = f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    form = {"date": date}
+    for i, (_, _, _, details) in enumerate(gym_session(rng, date, None)):
+        form[f"body_part_{i}"] = details["muscle_group"]
+        form[f"exercise_{i}"] = details["exercise"]
+        form[f"max_weight_{i}"] = details["max_weight"]
+        form[f"sets_{i}"] = details["sets"]
+        form[f"reps_{i}"] = details["reps"]
+    return form
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else None,
+        "max_ms": ms(latencies[-1]) if latencies else None,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+    }
+
+# --- Clients ---
+
+class TestClient:
+    """Flask test client; one instance per benchmark thread."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def login(self, user_id):
+        self.request("POST", "/", {"user_select": str(user_id)})
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        response.get_data()  # consume streamed bodies
+        response.close()
+        return response.status_code
+
+class HttpClient:
+    """requests.Session against a running server; one instance per benchmark thread."""
+
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url
+        self.session = requests.Session()
+
+    def login(self, user_id):
+        self.request("POST", "/", {"user_select": str(user_id)})
+
+    def request(self, method, path, data=None):
+        response = self.session.request(method, self.base_url + path, data=data,
+                                        allow_redirects=False, timeout=120)
+        response.content  # consume streamed bodies
+        return response.status_code
+
+# --- Driver ---
+
+def run_route(make_client, user_ids, method, path, form_factory, requests_count, concurrency):
+    remaining = [requests_count]
+    lock = threading.Lock()
+    latencies = []
+    errors = [0]
+
+    def worker(index):
+        rng = random.Random(index)
+        client = make_client()
+        client.login(user_ids[index % len(user_ids)])
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            data = form_factory(rng) if form_factory else None
+            start = time.perf_counter()
+            try:
+                status = client.request(method, path, data)
+            except Exception:
+                status = None
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if status is None or status >= 500:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summarize(latencies, errors[0], time.perf_counter() - start)
+
+def run_routes(make_client, user_ids, args):
+    results = {}
+    for name, method, path in ROUTES:
+        if args.routes and name not in args.routes:
+            continue
+        if args.regenerate and name in SUGGEST_ROUTES:
+            path += "?regenerate=1"
+        form_factory = record_form if method == "POST" else None
+        # Warm up (template compilation, connection setup, first cache fill)
+        run_route(make_client, user_ids, method, path, form_factory, min(args.concurrency, 4), 1)
+        results[name] = run_route(make_client, user_ids, method, path, form_factory,
+                                  args.requests, args.concurrency)
+        print(f"  {name}: {json.dumps(results[name])}", file=sys.stderr)
+    return results
+
+def run_testclient(user_ids, args):
+    import app as app_module
+    # The routes log every prompt at INFO level; keep the benchmark output readable
+    logging.getLogger().setLevel(logging.WARNING)
+    return run_routes(lambda: TestClient(app_module.app), user_ids, args)
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def run_gunicorn(user_ids, args, workdir):
+    import requests
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    log_path = os.path.join(workdir, "gunicorn.log")
+    # The production config (gunicorn.conf.py), with the benchmark's sizing on top
+    cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-w", str(args.workers),
+           "--threads", str(args.threads), "-b", f"127.0.0.1:{port}", "app:create_app()"]
+    with open(log_path, "w") as log:
+        server = subprocess.Popen(cmd, cwd=REPO_ROOT, env=os.environ.copy(), stdout=log, stderr=log)
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                if requests.get(base_url + "/favicon.ico", timeout=1).status_code == 204:
+                    break
+            except requests.ConnectionError:
+                pass
+            if server.poll() is not None or time.time() > deadline:
+                raise RuntimeError(f"gunicorn did not start; see {log_path}")
+            time.sleep(0.2)
+        return run_routes(lambda: HttpClient(base_url), user_ids, args)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the app end to end.")
+    parser.add_argument("--mode", choices=["testclient", "gunicorn", "both"], default="testclient")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--sessions", type=int, default=30, help="gym sessions per user")
+    parser.add_argument("--wods", type=int, default=10, help="WODs per user")
+    parser.add_argument("--requests", type=int, default=100, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=4, help="client threads")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake LLM seconds to first byte")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="fake LLM seconds between stream chunks")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=4, help="threads per gunicorn worker")
+    parser.add_argument("--regenerate", action="store_true", help="bypass the suggestion cache")
+    parser.add_argument("--routes", nargs="*", help="only run these routes (by name)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    from benchmarks.fake_openai import start_server
+    from benchmarks import seed
+
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    fake_server, fake_url = start_server(latency=args.latency, chunk_delay=args.chunk_delay)
+    # Configure before app/database are imported: both read their settings at import time
+    os.environ.update({
+        "USE_SQLITE": "true",
+        "DB_PATH": os.path.join(workdir, "bench.db"),
+        "PROMPTS_FILE": os.path.join(workdir, "prompts.json"),
+        "OPENAI_BASE_URL": fake_url,
+        "OPENAI_API_KEY": "benchmark",
+        "SECRET_KEY": "benchmark",
+        "BACKGROUND_JOBS": "false",
+    })
+    if os.path.exists(os.path.join(REPO_ROOT, "prompts.json")):
+        shutil.copy(os.path.join(REPO_ROOT, "prompts.json"), os.environ["PROMPTS_FILE"])
+    sys.path.insert(0, REPO_ROOT)
+
+    try:
+        start = time.perf_counter()
+        user_ids = seed.seed(args.users, args.sessions, args.wods, args.seed)
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "seed_seconds": round(time.perf_counter() - start, 3),
+                "args": vars(args),
+            },
+            "results": {},
+        }
+        if args.mode in ("testclient", "both"):
+            print("testclient:", file=sys.stderr)
+            report["results"]["testclient"] = run_testclient(user_ids, args)
+        if args.mode in ("gunicorn", "both"):
+            print("gunicorn:", file=sys.stderr)
+            report["results"]["gunicorn"] = run_gunicorn(user_ids, args, workdir)
+    finally:
+        fake_server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# benchmarks/seed.py
+# Seeds a SQLite database with synthetic users, gym sessions and WODs.
+#
+# database.py reads DB_PATH at import time, so this module only imports it
+# inside seed(), after the caller has set the environment.
+import os
+import sys
+import random
+import argparse
+import datetime
+
+MUSCLE_GROUPS = {
+    "Chest": ["Bench press", "Incline dumbbell press", "Cable fly"],
+    "Back": ["Deadlift", "Barbell row", "Pull-up"],
+    "Legs": ["Back squat", "Leg press", "Romanian deadlift"],
+    "Shoulders": ["Overhead press", "Lateral raise", "Face pull"],
+    "Arms": ["Barbell curl", "Skull crusher", "Hammer curl"],
+}
+DIFFICULTIES = ["too easy", "easy", "perfect", "too difficult"]
+WOD_TEMPLATE = (
+    "Block 1: Warm-up\nBlock Title: General Warm-up\nExercises:\n- 400m run\n- 15 air squats\nTime: 8 minutes\n\n"
+    "Block 2: Strength\nBlock Title: {lift}\nExercises:\n- 5x3 {lift} at {weight}kg\nTime: 15 minutes\n\n"
+    "Block 3: Metcon\nBlock Title: AMRAP {minutes}\nExercises:\n- 10 wall balls\n- 10 box jumps\nTime: {minutes} minutes\n\n"
+    "Block 4: Cool-down\nBlock Title: Mobility\nExercises:\n- Pigeon stretch 2 min/side\nTime: 5 minutes\n"
+)
+EXERCISES_PER_SESSION = 5
+
+def gym_session(rng, date, user_id):
+    """Rows for one gym session: two muscle groups, EXERCISES_PER_SESSION exercises."""
+    groups = rng.sample(sorted(MUSCLE_GROUPS), 2)
+    rows = []
+    for i in range(EXERCISES_PER_SESSION):
+        group = groups[i % 2]
+        rows.append((date, user_id, "gym", {
+            "muscle_group": group,
+            "exercise": rng.choice(MUSCLE_GROUPS[group]),
+            "max_weight": f"{rng.randrange(20, 140, 5)}kg",
+            "sets": str(rng.randint(3, 5)),
+            "reps": str(rng.randint(5, 12)),
+        }))
+    return rows
+
+def wod_details(rng):
+    from wod_parser import parse_wod_blocks
+    text = WOD_TEMPLATE.format(lift=rng.choice(["Back squat", "Clean", "Snatch"]),
+                               weight=rng.randrange(40, 120, 5), minutes=rng.choice([8, 12, 15, 20]))
+    return {"wod_blocks": text, "wod_difficulty": rng.choice(DIFFICULTIES), "blocks": parse_wod_blocks(text)}
+
+def seed(users=10, sessions=30, wods=10, seed=0, start_date=None):
+    """Add `users` users, each with `sessions` gym sessions and `wods` WODs.
+
+    Sessions are spread one every other day ending at start_date (default:
+    today). Returns the list of created user ids.
+    """
+    import database
+    rng = random.Random(seed)
+    start_date = start_date or datetime.date.today()
+    user_ids = []
+    for u in range(users):
+        user_id = database.add_user(f"bench_user_{u}")
+        user_ids.append(user_id)
+        for s in range(sessions):
+            date = (start_date - datetime.timedelta(days=2 * (sessions - s))).isoformat()
+            # One transaction per session, like the multi-row /record form
+            database.add_workouts(gym_session(rng, date, user_id))
+        for w in range(wods):
+            date = (start_date - datetime.timedelta(days=2 * (wods - w) - 1)).isoformat()
+            database.add_workout(date, user_id, "wod", wod_details(rng))
+    return user_ids
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed a benchmark database.")
+    parser.add_argument("--db", required=True, help="SQLite file to create or extend")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--sessions", type=int, default=30, help="gym sessions per user")
+    parser.add_argument("--wods", type=int, default=10, help="WODs per user")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    os.environ["USE_SQLITE"] = "true"
+    os.environ["DB_PATH"] = args.db
+    user_ids = seed(args.users, args.sessions, args.wods, args.seed)
+    print(f"Seeded {len(user_ids)} users into {args.db}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
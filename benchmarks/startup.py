@@ -0,0 +1,164 @@
+# benchmarks/startup.py
+# Measures cold start: how long a fresh interpreter takes to import the app and
+# run create_app(), which modules dominate the import, and how long gunicorn
+# takes to answer its first request with and without --preload (plus the
+# proportional set size of master + workers, on Linux).
+#
+#   python -m benchmarks.startup --runs 10 --workers 4 --output startup.json
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+from benchmarks.run import REPO_ROOT, percentile, git_commit, _free_port
+
+# Runs in a fresh interpreter; prints the phase timings as JSON
+IMPORT_PROBE = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+print(json.dumps({"import_ms": (imported - start) * 1000, "create_app_ms": (created - imported) * 1000}))
+"""
+
+def stats_ms(values):
+    values = sorted(values)
+    return {"min_ms": round(values[0], 2), "p50_ms": round(percentile(values, 50), 2),
+            "max_ms": round(values[-1], 2)}
+
+def measure_import(runs):
+    """Import/create_app timings over `runs` fresh interpreters (each on an existing database)."""
+    samples = {"import_ms": [], "create_app_ms": [], "process_ms": []}
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.check_output([sys.executable, "-c", IMPORT_PROBE], cwd=REPO_ROOT,
+                                         env=os.environ.copy(), stderr=subprocess.DEVNULL, text=True)
+        samples["process_ms"].append((time.perf_counter() - start) * 1000)
+        for key, value in json.loads(output.strip().splitlines()[-1]).items():
+            samples[key].append(value)
+    return {key: stats_ms(values) for key, values in samples.items()}
+
+def slowest_imports(top):
+    """The `top` modules with the largest cumulative import time (python -X importtime)."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=REPO_ROOT,
+                            env=os.environ.copy(), capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        # "import time:   self [us] | cumulative | imported package"
+        parts = line.split("|")
+        if not line.startswith("import time:") or len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        modules.append((int(parts[1]), parts[2].rstrip()))
+    modules.sort(reverse=True)
+    return [{"module": name.strip(), "cumulative_ms": round(us / 1000, 2),
+             "depth": (len(name) - len(name.lstrip())) // 2} for us, name in modules[:top]]
+
+def _children(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+def _pss_kb(pid):
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+def measure_gunicorn(preload, workers, workdir):
+    """Seconds from spawning gunicorn until its first 204, and total PSS once all workers run."""
+    import requests
+    port = _free_port()
+    env = dict(os.environ, GUNICORN_PRELOAD="true" if preload else "false")
+    cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-w", str(workers),
+           "-b", f"127.0.0.1:{port}", "app:create_app()"]
+    log_path = os.path.join(workdir, f"gunicorn-preload-{preload}.log")
+    start = time.perf_counter()
+    with open(log_path, "w") as log:
+        server = subprocess.Popen(cmd, cwd=REPO_ROOT, env=env, stdout=log, stderr=log)
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                if requests.get(f"http://127.0.0.1:{port}/favicon.ico", timeout=1).status_code == 204:
+                    break
+            except requests.ConnectionError:
+                pass
+            if server.poll() is not None or time.time() > deadline:
+                raise RuntimeError(f"gunicorn did not start; see {log_path}")
+            time.sleep(0.01)
+        ready = time.perf_counter() - start
+        while len(_children(server.pid)) < workers and time.time() < deadline:
+            time.sleep(0.05)
+        # Let the workers finish importing before reading their memory
+        time.sleep(1)
+        pss = [_pss_kb(pid) for pid in [server.pid] + _children(server.pid)]
+        return {"first_response_seconds": round(ready, 3),
+                "pss_mb": round(sum(pss) / 1024, 1) if pss and None not in pss else None}
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark app import time and gunicorn boot.")
+    parser.add_argument("--runs", type=int, default=10, help="fresh interpreters for the import timing")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to report")
+    parser.add_argument("--skip-gunicorn", action="store_true")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="bench-startup-")
+    os.environ.update({
+        "USE_SQLITE": "true",
+        "DB_PATH": os.path.join(workdir, "startup.db"),
+        "PROMPTS_FILE": os.path.join(workdir, "prompts.json"),
+        "METRICS_DIR": os.path.join(workdir, "metrics"),
+        "SECRET_KEY": "benchmark",
+        "BACKGROUND_JOBS": "false",
+    })
+    try:
+        # Create the schema once so every run measures a warm-disk, already-migrated start
+        subprocess.check_call([sys.executable, "-c", "import app; app.create_app()"], cwd=REPO_ROOT,
+                              env=os.environ.copy(), stderr=subprocess.DEVNULL)
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "args": vars(args),
+            },
+            "import": measure_import(args.runs),
+            "slowest_imports": slowest_imports(args.top),
+        }
+        print(f"import: {json.dumps(report['import'])}", file=sys.stderr)
+        if not args.skip_gunicorn:
+            report["gunicorn"] = {}
+            for preload in (False, True):
+                name = "preload" if preload else "no_preload"
+                report["gunicorn"][name] = measure_gunicorn(preload, args.workers, workdir)
+                print(f"gunicorn {name}: {json.dumps(report['gunicorn'][name])}", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
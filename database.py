@@ -1,24 +1,100 @@
 import os
 import json
 import sqlite3
+import threading
+import re
+import glob
+import time
+import zlib
+from contextlib import contextmanager
+
+import metrics
+import text_search
+from memory_store import MemoryStore, MEMORY_SNAPSHOT_PATH
+from wod_parser import parse_wod_blocks
 
 # Set USE_SQLITE to true for local persistent testing.
 USE_SQLITE = os.environ.get("USE_SQLITE", "true").lower() == "true"
 
-if USE_SQLITE:
-    # Use a custom database path if provided (e.g., on Render use a persistent disk path).
-    db_path = os.environ.get("DB_PATH", "/data/test.db")
-    # Connect to (or create) a local SQLite database file.
-    conn = sqlite3.connect(db_path, check_same_thread=False)
-    cursor = conn.cursor()
-    # Create tables if they don't exist (do NOT drop them every time)
-    cursor.execute('''
+# Seconds a connection waits on a locked database before raising "database is locked".
+BUSY_TIMEOUT = float(os.environ.get("DB_BUSY_TIMEOUT", "5"))
+
+# --- SQLite Connection Management ---
+# Each thread gets its own connection per database file (sqlite3 connections
+# must not be shared between threads that use them concurrently). WAL mode
+# lets readers proceed while a single writer commits, and writes use short
+# explicit transactions.
+#
+# Nothing is opened at import time. The first connection of a process runs
+# initialize_db(), and connections inherited through fork() (gunicorn
+# --preload) are never reused: SQLite handles are not fork-safe, so a thread
+# whose connections were opened under another pid opens new ones.
+_local = threading.local()
+
+def _connections():
+    """This thread's {shard: connection} dict (shard None is the main DB); reset after fork."""
+    if getattr(_local, "pid", None) != os.getpid():
+        _local.conns = {}
+        _local.pid = os.getpid()
+    return _local.conns
+
+def get_connection(shard=None):
+    """Return this thread's connection to the main DB (or a shard file), opening it on first use."""
+    conns = _connections()
+    conn = conns.get(shard)
+    if conn is None:
+        # isolation_level=None: autocommit for reads, explicit BEGIN for writes (see transaction()).
+        conn = sqlite3.connect(db_path if shard is None else shard_path(shard),
+                               timeout=BUSY_TIMEOUT, isolation_level=None)
+        conn.execute(f"PRAGMA busy_timeout = {int(BUSY_TIMEOUT * 1000)}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conns[shard] = conn
+        if not _initialized:
+            initialize_db()
+    return conn
+
+def close_connection():
+    """Close this thread's connections (if any)."""
+    for conn in _connections().values():
+        conn.close()
+    _local.conns = {}
+
+@contextmanager
+def transaction(shard=None):
+    """Run the enclosed statements in one short write transaction (on the main DB or a shard).
+
+    BEGIN IMMEDIATE takes the write lock up front, so concurrent writers wait
+    on busy_timeout instead of failing mid-transaction. Nested use joins the
+    outer transaction.
+    """
+    conn = get_connection(shard)
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    else:
+        conn.execute("COMMIT")
+
+# --- Schema Migrations ---
+# Each migration runs once, in order, in its own transaction; the schema
+# version is stored in PRAGMA user_version. Migration 1 uses IF NOT EXISTS so
+# databases created before versioning (user_version 0) upgrade cleanly.
+# Released migrations are never edited, and they don't call the module's live
+# helpers: a change to those would silently change what an old migration does.
+def _migration_base_tables(conn):
+    conn.execute('''
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             username TEXT NOT NULL
         )
     ''')
-    cursor.execute('''
+    conn.execute('''
         CREATE TABLE IF NOT EXISTS workouts (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             date TEXT,
@@ -27,69 +103,592 @@ if USE_SQLITE:
             details TEXT
         )
     ''')
-    conn.commit()
+    # Composite index so per-user history lookups don't scan the whole table
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_workouts_user_type_date
+        ON workouts (user_id, workout_type, date)
+    ''')
+
+def _migration_suggestion_cache(conn):
+    # Persistent tier of the suggestion cache (see suggestion_cache.py)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS suggestion_cache (
+            cache_key TEXT PRIMARY KEY,
+            user_id INTEGER,
+            kind TEXT,
+            suggestion TEXT,
+            created_at REAL
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_suggestion_cache_user
+        ON suggestion_cache (user_id)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_suggestion_cache_created
+        ON suggestion_cache (created_at)
+    ''')
+
+def _migration_jobs(conn):
+    # Persistent background job queue (see jobs.py)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_type TEXT NOT NULL,
+            user_id INTEGER,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            created_at REAL,
+            updated_at REAL
+        )
+    ''')
+    # At most one pending job per (job_type, user): repeated writes coalesce
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_pending
+        ON jobs (job_type, user_id) WHERE status = 'pending'
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_jobs_status
+        ON jobs (status, id)
+    ''')
+
+def _migration_typed_tables(conn):
+    # Typed copies of gym/WOD rows (keyed by workouts.id) that SQLite can index
+    # and aggregate. workouts.details keeps the original dict for the templates.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS gym_sets (
+            workout_id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            muscle_group TEXT,
+            exercise TEXT,
+            max_weight_text TEXT,
+            max_weight REAL,
+            sets INTEGER,
+            reps INTEGER
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_gym_sets_user_exercise
+        ON gym_sets (user_id, exercise, date)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_gym_sets_user_group
+        ON gym_sets (user_id, muscle_group, date)
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS wods (
+            workout_id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            wod_blocks TEXT,
+            difficulty TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_wods_user_date
+        ON wods (user_id, date)
+    ''')
+    # Backfill from the existing JSON rows
+    number = re.compile(r'\d+(?:[.,]\d+)?')
+
+    def first_number(value):
+        match = number.search(str(value or ""))
+        return float(match.group(0).replace(",", ".")) if match else None
+
+    gym_rows, wod_rows = [], []
+    for workout_id, date, user_id, workout_type, details in conn.execute(
+            "SELECT id, date, user_id, workout_type, details FROM workouts").fetchall():
+        details = json.loads(details or "{}")
+        if workout_type == "gym":
+            sets, reps = first_number(details.get("sets")), first_number(details.get("reps"))
+            gym_rows.append((workout_id, user_id, date, details.get("muscle_group"), details.get("exercise"),
+                             details.get("max_weight"), first_number(details.get("max_weight")),
+                             int(sets) if sets is not None else None, int(reps) if reps is not None else None))
+        elif workout_type == "wod":
+            wod_rows.append((workout_id, user_id, date,
+                             details.get("wod_blocks", details.get("wod_workout")),
+                             details.get("wod_difficulty", details.get("feedback"))))
+    conn.executemany(
+        "INSERT OR REPLACE INTO gym_sets (workout_id, user_id, date, muscle_group, exercise, max_weight_text, "
+        "max_weight, sets, reps) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", gym_rows)
+    conn.executemany(
+        "INSERT OR REPLACE INTO wods (workout_id, user_id, date, wod_blocks, difficulty) VALUES (?, ?, ?, ?, ?)",
+        wod_rows)
+
+def _migration_user_stats(conn):
+    # Per-user training aggregates, maintained by add_workouts/delete_workout.
+    # kind = 'muscle_group' (name = group), 'exercise' (name = exercise)
+    # or 'sessions' (name = '', entries = number of distinct gym dates).
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            name TEXT NOT NULL,
+            muscle_group TEXT,
+            last_date TEXT,
+            last_weight TEXT,
+            max_weight TEXT,
+            max_weight_value REAL,
+            entries INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, kind, name)
+        )
+    ''')
+    # Backfill for existing users: sessions (distinct dates), the last date of
+    # each muscle group, and per exercise the last row's group and weight, the
+    # heaviest weight and the number of rows
+    sessions, groups, exercises = {}, {}, {}
+    for user_id, date, group, name, weight, value in conn.execute(
+            "SELECT user_id, date, muscle_group, exercise, max_weight_text, max_weight FROM gym_sets "
+            "ORDER BY date, workout_id"):
+        group, name = (group or "").strip(), (name or "").strip()
+        sessions.setdefault(user_id, set()).add(date)
+        if group and date > groups.get((user_id, group), ""):
+            groups[(user_id, group)] = date
+        if not name:
+            continue
+        entry = exercises.get((user_id, name))
+        if entry is None:
+            exercises[(user_id, name)] = [group, date, weight, weight, value, 1]
+            continue
+        entry[5] += 1
+        if date >= entry[1]:
+            entry[:3] = [group, date, weight]
+        if value is not None and value > (entry[4] if entry[4] is not None else -1):
+            entry[3:5] = [weight, value]
+    conn.executemany("INSERT INTO user_stats (user_id, kind, name, last_date, entries) VALUES (?, 'sessions', '', ?, ?)",
+                     [(user_id, max(dates), len(dates)) for user_id, dates in sessions.items()])
+    conn.executemany("INSERT INTO user_stats (user_id, kind, name, last_date) VALUES (?, 'muscle_group', ?, ?)",
+                     [(user_id, group, date) for (user_id, group), date in groups.items()])
+    conn.executemany(
+        "INSERT INTO user_stats (user_id, kind, name, muscle_group, last_date, last_weight, max_weight, "
+        "max_weight_value, entries) VALUES (?, 'exercise', ?, ?, ?, ?, ?, ?, ?)",
+        [(user_id, name, *entry) for (user_id, name), entry in exercises.items()])
+
+def _migration_wod_blocks(conn):
+    # Parsed "Block X:" structure of each WOD, stored so history pages don't parse on render.
+    # The parsing is data, not schema: parse_missing_wod_blocks() fills the NULLs.
+    conn.execute("ALTER TABLE wods ADD COLUMN blocks TEXT")
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_wods_unparsed
+        ON wods (workout_id) WHERE blocks IS NULL
+    ''')
+
+def _migration_unique_usernames(conn):
+    # Usernames become unique (case-insensitively, like the "admin" check).
+    # Existing duplicates keep their workouts and are renamed "name (id)".
+    conn.execute('''
+        UPDATE users SET username = username || ' (' || id || ')'
+        WHERE id NOT IN (SELECT MIN(id) FROM users GROUP BY username COLLATE NOCASE)
+    ''')
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username
+        ON users (username COLLATE NOCASE)
+    ''')
+    # Version counters bumped by writers so every process can cheaply detect changes
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('users_version', 1)")
+
+def _migration_user_versions(conn):
+    # Per-user data version, bumped by every workout write/delete. HTTP validators
+    # (ETag/Last-Modified) are derived from it with one primary-key lookup.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_versions (
+            user_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    ''')
+    conn.execute('''
+        INSERT OR IGNORE INTO user_versions (user_id, version, updated_at)
+        SELECT user_id, MAX(id), ? FROM workouts GROUP BY user_id
+    ''', (time.time(),))
+
+def _migration_user_shards(conn):
+    # Which shard file holds each user's workouts (see "Optional Sharding"); NULL = the main DB
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(users)")]
+    if "shard" not in columns:
+        conn.execute("ALTER TABLE users ADD COLUMN shard INTEGER")
+
+def _migration_flight_leases(conn):
+    # Cross-worker single-flight leases for LLM calls (see single_flight.py)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS flight_leases (
+            key TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            status TEXT NOT NULL,
+            result TEXT,
+            error TEXT,
+            expires_at REAL NOT NULL
+        )
+    ''')
+
+def _migration_workout_search(conn):
+    # FTS5 index over gym exercise/muscle group and WOD text, kept in sync with
+    # gym_sets/wods by triggers (rowid = workout id). owner holds "u<user_id>"
+    # so per-user queries are resolved by the index (see text_search.py).
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS workout_search
+        USING fts5 (body, owner, tokenize = 'porter unicode61')
+    ''')
+    # INSERT OR REPLACE into gym_sets/wods doesn't fire the delete triggers, hence OR REPLACE here
+    gym_body = "coalesce(new.exercise, '') || ' ' || coalesce(new.muscle_group, '')"
+    wod_body = "coalesce(new.wod_blocks, '') || ' ' || coalesce(new.difficulty, '')"
+    for table, body in (("gym_sets", gym_body), ("wods", wod_body)):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN
+                INSERT OR REPLACE INTO workout_search (rowid, body, owner)
+                VALUES (new.workout_id, {body}, 'u' || new.user_id);
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN
+                DELETE FROM workout_search WHERE rowid = old.workout_id;
+            END
+        ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS wods_search_update AFTER UPDATE OF wod_blocks, difficulty ON wods BEGIN
+            UPDATE workout_search SET body = {wod_body} WHERE rowid = new.workout_id;
+        END
+    ''')
+    # Backfill
+    conn.execute("DELETE FROM workout_search")
+    for table, body in (("gym_sets", gym_body), ("wods", wod_body)):
+        conn.execute(f"INSERT INTO workout_search (rowid, body, owner) "
+                     f"SELECT workout_id, {body.replace('new.', '')}, 'u' || user_id FROM {table}")
+
+def _migration_pinned_suggestions(conn):
+    # Pinned suggestions (written by `flask generate-plans`) only expire by age,
+    # never to the row cap, so a large batch can't evict its own results
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(suggestion_cache)")]
+    if "pinned" not in columns:
+        conn.execute("ALTER TABLE suggestion_cache ADD COLUMN pinned INTEGER NOT NULL DEFAULT 0")
+
+MIGRATIONS = [
+    (1, _migration_base_tables),
+    (2, _migration_suggestion_cache),
+    (3, _migration_jobs),
+    (4, _migration_typed_tables),
+    (5, _migration_user_stats),
+    (6, _migration_wod_blocks),
+    (7, _migration_unique_usernames),
+    (8, _migration_user_versions),
+    (9, _migration_user_shards),
+    (10, _migration_flight_leases),
+    (11, _migration_workout_search),
+    (12, _migration_pinned_suggestions),
+]
+
+def parse_missing_wod_blocks():
+    """Store the parsed blocks of WODs saved without them (e.g. before migration 6).
+
+    Uses the current wod_parser, so it is not a migration; the partial index
+    makes it a no-op lookup once every WOD has its blocks. Returns the count.
+    """
+    count = 0
+    for location in _locations():
+        with transaction(location) as conn:
+            rows = conn.execute(
+                "SELECT w.id, w.details FROM wods JOIN workouts w ON w.id = wods.workout_id "
+                "WHERE wods.blocks IS NULL").fetchall()
+            updates = []
+            for workout_id, details in rows:
+                details = json.loads(details or "{}")
+                if "blocks" not in details:
+                    details["blocks"] = parse_wod_blocks(details.get("wod_blocks", details.get("wod_workout")))
+                updates.append((json.dumps(details), json.dumps(details["blocks"]), workout_id))
+            conn.executemany("UPDATE workouts SET details = ? WHERE id = ?", [(u[0], u[2]) for u in updates])
+            conn.executemany("UPDATE wods SET blocks = ? WHERE workout_id = ?", [(u[1], u[2]) for u in updates])
+        count += len(rows)
+    return count
+
+def get_schema_version(conn=None):
+    conn = conn or get_connection()
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate():
+    """Apply pending schema migrations to the main DB and every shard.
+
+    Returns the main DB's resulting schema version.
+    """
+    for shard in _locations():
+        for version, migration in MIGRATIONS:
+            with transaction(shard) as conn:
+                # Re-check inside the write lock: another process may have just migrated
+                if get_schema_version(conn) >= version:
+                    continue
+                migration(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+        if shard is not None:
+            with transaction(shard) as conn:
+                _reserve_id_range(conn, shard)
+    return get_schema_version()
+
+if USE_SQLITE:
+    # Use a custom database path if provided (e.g., on Render use a persistent disk path).
+    db_path = os.environ.get("DB_PATH", "/data/test.db")
+    # Number of shard files for per-user data (0: everything in db_path), see below
+    DB_SHARDS = int(os.environ.get("DB_SHARDS", "0"))
 else:
-    # In-memory storage for local testing.
-    workouts = []
-    users = []
-    next_workout_id = 1
-    next_user_id = 1
+    DB_SHARDS = 0
+    # In-memory storage for tests, benchmarks and ephemeral deployments (see memory_store.py).
+    store = MemoryStore()
+    suggestion_cache_rows = {}
+    jobs = []
+    next_job_id = 1
+    jobs_lock = threading.Lock()
+    user_stats = {}
+    flight_leases = {}
+
+# --- Optional Sharding ---
+# With DB_SHARDS=N, db_path becomes the directory DB (users, meta, jobs, the
+# suggestion cache) and each user's workouts, gym_sets/wods rows, stats and
+# data version live in one of N shard files next to it (test.shard0.db, ...),
+# so saves of different users mostly take different SQLite write locks.
+#
+# users.shard records which file holds a user's rows; NULL means the main DB
+# (users created before sharding was enabled, until `flask rebalance-shards`
+# moves them). New users go to crc32(id) % N. Each shard hands out workout ids
+# from its own range starting at (shard + 1) << SHARD_ID_BITS, so ids stay
+# unique across files and delete_workout() can find the file from the id.
+SHARD_ID_BITS = 40
+
+def _shard_name_parts():
+    root, extension = os.path.splitext(db_path)
+    return root, extension or ".db"
+
+def shard_path(shard):
+    root, extension = _shard_name_parts()
+    return f"{root}.shard{shard}{extension}"
+
+def _shards_on_disk():
+    root, extension = _shard_name_parts()
+    pattern = re.compile(re.escape(root) + r"\.shard(\d+)" + re.escape(extension) + "$")
+    return {int(match.group(1)) for match in map(pattern.match, glob.glob(shard_path("*"))) if match}
+
+def _locations():
+    """Every file that holds workouts: None (the main DB) and each configured shard."""
+    return [None] + list(range(DB_SHARDS))
+
+def _home_shard(user_id):
+    """The file a user's rows belong in under the current DB_SHARDS."""
+    return zlib.crc32(str(user_id).encode()) % DB_SHARDS if DB_SHARDS else None
+
+def _user_location(user_id):
+    if not DB_SHARDS:
+        return None
+    return _cached_users()["shards"].get(user_id)
+
+def _workout_location(workout_id):
+    if not DB_SHARDS:
+        return None
+    shard = (workout_id >> SHARD_ID_BITS) - 1
+    return shard if shard >= 0 else None
+
+def _reserve_id_range(conn, shard):
+    start = (shard + 1) << SHARD_ID_BITS
+    conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'workouts' AND seq < ?", (start, start))
+    conn.execute("INSERT INTO sqlite_sequence (name, seq) SELECT 'workouts', ? "
+                 "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'workouts')", (start,))
+
+def _delete_user_rows(conn, user_id):
+    for table in ("workouts", "gym_sets", "wods", "user_stats", "user_versions"):
+        conn.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+
+def rebalance_shards(progress=None):
+    """Move every user's rows to the file the current DB_SHARDS setting puts them in.
+
+    Covers enabling sharding on an existing database, changing DB_SHARDS and
+    going back to one file (DB_SHARDS=0). Users move one at a time: their rows
+    are copied into the target file (with new workout ids), users.shard is
+    switched, then the source rows are deleted; an interrupted run can simply
+    be repeated. Run it with the app stopped, since saves for a user that is
+    being moved can be lost. progress(user_id, source, target) is called per
+    moved user. Returns the number of users moved.
+    """
+    users = get_connection().execute("SELECT id, shard FROM users ORDER BY id").fetchall()
+    moved = 0
+    for user_id, source in users:
+        target = _home_shard(user_id)
+        if source == target:
+            continue
+        rows = [(row[0], row[1], row[2], json.loads(row[3])) for row in get_connection(source).execute(
+            "SELECT date, user_id, workout_type, details FROM workouts WHERE user_id = ? ORDER BY id",
+            (user_id,))]
+        with transaction(target) as conn:
+            # Leftovers of an interrupted move
+            _delete_user_rows(conn, user_id)
+            _insert_workouts(conn, rows)
+        with transaction() as conn:
+            conn.execute("UPDATE users SET shard = ? WHERE id = ?", (target, user_id))
+            _bump_version(conn, "users_version")
+        with transaction(source) as conn:
+            _delete_user_rows(conn, user_id)
+        moved += 1
+        if progress:
+            progress(user_id, source, target)
+    # Rows a crash left behind in a user's old file (including shards beyond a reduced DB_SHARDS)
+    owner = {user_id: _home_shard(user_id) for user_id, _ in users}
+    for location in [None] + sorted(set(range(DB_SHARDS)) | _shards_on_disk()):
+        with transaction(location) as conn:
+            stale = [user_id for (user_id,) in conn.execute("SELECT DISTINCT user_id FROM workouts")
+                     if user_id in owner and owner[user_id] != location]
+            for user_id in stale:
+                _delete_user_rows(conn, user_id)
+    return moved
+
+# --- Lazy Initialization ---
+_initialized = False
+_init_lock = threading.RLock()
 
 def initialize_db():
-    """Initialize the database if necessary."""
-    if USE_SQLITE:
-        # Tables are created above with CREATE TABLE IF NOT EXISTS
-        conn.commit()
-    else:
-        global workouts, users, next_workout_id, next_user_id
-        if not users and not workouts:
-            workouts = []
-            users = []
-            next_workout_id = 1
-            next_user_id = 1
+    """Create/upgrade the schema (SQLite) or load the memory snapshot.
+
+    Runs once per process; get_connection() calls it on first use, so calling
+    it explicitly (app.create_app()) only moves the work to startup. Other
+    threads wait until it has finished.
+    """
+    global _initialized
+    if _initialized or getattr(_local, "initializing", False):
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        # migrate() re-enters get_connection(); don't recurse from this thread
+        _local.initializing = True
+        try:
+            if USE_SQLITE:
+                migrate()
+                parse_missing_wod_blocks()
+            elif MEMORY_SNAPSHOT_PATH:
+                store.enable_snapshots(MEMORY_SNAPSHOT_PATH, username_key)
+                rebuild_user_stats()
+            _initialized = True
+        finally:
+            _local.initializing = False
+
+# --- User Registry ---
+# The users table is tiny and read on every index hit, so each process keeps a
+# copy. Writers bump meta.users_version in the same transaction; readers do a
+# single primary-key lookup of that row and reload the copy when it changed.
+_user_cache_lock = threading.Lock()
+_user_cache = {"version": None, "users": [], "by_id": {}, "by_name": {}, "shards": {}}
+
+def username_key(username):
+    """Case-folded form matching SQLite's NOCASE collation (ASCII letters only)."""
+    return "".join(c.lower() if c.isascii() else c for c in username)
+
+def _bump_version(conn, key):
+    conn.execute("INSERT INTO meta (key, value) VALUES (?, 1) "
+                 "ON CONFLICT (key) DO UPDATE SET value = value + 1", (key,))
+
+def _cached_users():
+    conn = get_connection()
+    row = conn.execute("SELECT value FROM meta WHERE key = 'users_version'").fetchone()
+    version = row[0] if row else 0
+    with _user_cache_lock:
+        if _user_cache["version"] != version:
+            # Read after the version: a concurrent write can only make the copy newer
+            rows = conn.execute("SELECT id, username, shard FROM users ORDER BY id").fetchall()
+            users = [{"id": row[0], "username": row[1]} for row in rows]
+            _user_cache.update(version=version, users=users,
+                               by_id={u["id"]: u for u in users},
+                               by_name={username_key(u["username"]): u for u in users},
+                               shards={row[0]: row[2] for row in rows})
+        return _user_cache
 
 def add_user(username):
+    """Create a user and return its id. Raises ValueError if the name is taken."""
     if USE_SQLITE:
-        cursor.execute("INSERT INTO users (username) VALUES (?)", (username,))
-        conn.commit()
-        return cursor.lastrowid
+        try:
+            with transaction() as conn:
+                cur = conn.execute("INSERT INTO users (username) VALUES (?)", (username,))
+                if DB_SHARDS:
+                    conn.execute("UPDATE users SET shard = ? WHERE id = ?", (_home_shard(cur.lastrowid), cur.lastrowid))
+                _bump_version(conn, "users_version")
+                return cur.lastrowid
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Username already exists: {username}")
     else:
-        global next_user_id
-        user = {"id": next_user_id, "username": username}
-        users.append(user)
-        next_user_id += 1
-        return user["id"]
+        return store.add_user(username, username_key(username))
 
 def get_users():
     if USE_SQLITE:
-        cursor.execute("SELECT id, username FROM users")
-        rows = cursor.fetchall()
-        return [{"id": row[0], "username": row[1]} for row in rows]
+        return [dict(u) for u in _cached_users()["users"]]
+    else:
+        return store.get_users()
+
+def get_user(user_id):
+    """Return {"id", "username"} for a user id, or None."""
+    if USE_SQLITE:
+        user = _cached_users()["by_id"].get(user_id)
+        return dict(user) if user else None
+    else:
+        return store.get_user(user_id)
+
+def get_user_by_name(username):
+    """Return {"id", "username"} for a username (case-insensitive), or None."""
+    if USE_SQLITE:
+        user = _cached_users()["by_name"].get(username_key(username))
+        return dict(user) if user else None
     else:
-        return users
+        return store.get_user_by_name(username_key(username))
 
 def add_workout(date, user_id, workout_type, details):
+    add_workouts([(date, user_id, workout_type, details)])
+
+def add_workouts(rows):
+    """Insert many workouts in a single transaction (one per shard file when sharded).
+
+    `rows` is an iterable of (date, user_id, workout_type, details) tuples.
+    Returns the number of rows inserted.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
     if USE_SQLITE:
-        details_json = json.dumps(details)
-        cursor.execute("INSERT INTO workouts (date, user_id, workout_type, details) VALUES (?, ?, ?, ?)",
-                       (date, user_id, workout_type, details_json))
-        conn.commit()
-    else:
-        global next_workout_id
-        workout = {
-            "id": next_workout_id,
-            "date": date,
-            "user_id": user_id,
-            "workout_type": workout_type,
-            "details": details
-        }
-        workouts.append(workout)
-        next_workout_id += 1
+        locations = {user_id: _user_location(user_id) for user_id in {row[1] for row in rows}}
+        for location in set(locations.values()):
+            with transaction(location) as conn:
+                _insert_workouts(conn, [row for row in rows if locations[row[1]] == location])
+    else:
+        with store.lock:
+            for date, user_id, workout_type, details in rows:
+                _, new_day = store.add_workout(date, user_id, workout_type, details)
+                if workout_type == "gym":
+                    apply_gym_stats(user_stats.setdefault(user_id, empty_stats()), date, details, new_day)
+    return len(rows)
+
+def _insert_workouts(conn, rows):
+    """Insert rows plus their typed rows, stats and data versions; conn must be in a transaction."""
+    if not rows:
+        return
+    new_sessions = _find_new_sessions(conn, rows)
+    conn.executemany("INSERT INTO workouts (date, user_id, workout_type, details) VALUES (?, ?, ?, ?)",
+                     [(date, user_id, workout_type, json.dumps(details))
+                      for date, user_id, workout_type, details in rows])
+    # AUTOINCREMENT ids are allocated consecutively while we hold the write lock
+    last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+    first_id = last_id - len(rows) + 1
+    _insert_typed_rows(conn, [(first_id + i, date, user_id, workout_type, details)
+                              for i, (date, user_id, workout_type, details) in enumerate(rows)])
+    for date, user_id, workout_type, details in rows:
+        if workout_type == "gym":
+            _upsert_stats(conn, user_id, date, details, (user_id, date) in new_sessions)
+            new_sessions.discard((user_id, date))
+    for user_id in {row[1] for row in rows}:
+        _bump_user_version(conn, user_id)
 
 def get_all_workouts():
     if USE_SQLITE:
-        cursor.execute("SELECT id, date, user_id, workout_type, details FROM workouts")
-        rows = cursor.fetchall()
+        rows = [row for location in _locations() for row in get_connection(location).execute(
+            "SELECT id, date, user_id, workout_type, details FROM workouts").fetchall()]
         workouts_list = []
         for row in rows:
             workout = {
@@ -102,15 +701,608 @@ def get_all_workouts():
             workouts_list.append(workout)
         return workouts_list
     else:
-        return workouts
+        return store.get_all_workouts()
+
+def get_workouts(user_id, workout_type, since=None, until=None, limit=None, order="desc", before=None):
+    """Return one user's workouts of a given type, ordered by date (then id).
+
+    `since`/`until` are inclusive ISO dates, `order` is "asc" or "desc".
+    `before` is a (date, id) keyset cursor: only rows strictly older than it.
+    """
+    if order not in ("asc", "desc"):
+        raise ValueError(f"Invalid order: {order}")
+    if USE_SQLITE:
+        query = "SELECT id, date, user_id, workout_type, details FROM workouts WHERE user_id = ? AND workout_type = ?"
+        params = [user_id, workout_type]
+        if since:
+            query += " AND date >= ?"
+            params.append(since)
+        if until:
+            query += " AND date <= ?"
+            params.append(until)
+        if before:
+            query += " AND (date, id) < (?, ?)"
+            params.extend(before)
+        direction = "DESC" if order == "desc" else "ASC"
+        query += f" ORDER BY date {direction}, id {direction}"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(int(limit))
+        rows = get_connection(_user_location(user_id)).execute(query, params).fetchall()
+        return [{
+            "id": row[0],
+            "date": row[1],
+            "user_id": row[2],
+            "workout_type": row[3],
+            "details": json.loads(row[4])
+        } for row in rows]
+    else:
+        return store.get_workouts(user_id, workout_type, since, until, limit, order, before)
+
+def iter_workouts(user_id, workout_types=("gym", "wod"), batch_size=500):
+    """Yield a user's workouts type by type, oldest first, without loading them all.
+
+    The SQLite path reads from one cursor per type in batches of batch_size
+    rows (the (user_id, workout_type, date) index returns them in order).
+    """
+    for workout_type in workout_types:
+        if USE_SQLITE:
+            cursor = get_connection(_user_location(user_id)).execute(
+                "SELECT id, date, user_id, workout_type, details FROM workouts "
+                "WHERE user_id = ? AND workout_type = ? ORDER BY date, id", (user_id, workout_type))
+            try:
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield {"id": row[0], "date": row[1], "user_id": row[2], "workout_type": row[3],
+                               "details": json.loads(row[4])}
+            finally:
+                cursor.close()
+        else:
+            yield from store.iter_workouts(user_id, workout_type, batch_size)
+
+def get_recent_dates(user_id, workout_type, limit, before=None):
+    """Return the user's `limit` most recent distinct workout dates, newest first.
+
+    `before` is a (date, id) keyset cursor as in get_workouts().
+    """
+    if USE_SQLITE:
+        query = "SELECT DISTINCT date FROM workouts WHERE user_id = ? AND workout_type = ?"
+        params = [user_id, workout_type]
+        if before:
+            query += " AND (date, id) < (?, ?)"
+            params.extend(before)
+        query += " ORDER BY date DESC LIMIT ?"
+        params.append(int(limit))
+        rows = get_connection(_user_location(user_id)).execute(query, params).fetchall()
+        return [row[0] for row in rows]
+    else:
+        return store.get_recent_dates(user_id, workout_type, limit, before)
 
 def delete_workout(workout_id, workout_type=None):
     if USE_SQLITE:
+        with transaction(_workout_location(workout_id)) as conn:
+            row = conn.execute("SELECT user_id, workout_type FROM workouts WHERE id = ?", (workout_id,)).fetchone()
+            if workout_type:
+                cur = conn.execute("DELETE FROM workouts WHERE id = ? AND workout_type = ?", (workout_id, workout_type))
+            else:
+                cur = conn.execute("DELETE FROM workouts WHERE id = ?", (workout_id,))
+            if cur.rowcount:
+                conn.execute("DELETE FROM gym_sets WHERE workout_id = ?", (workout_id,))
+                conn.execute("DELETE FROM wods WHERE workout_id = ?", (workout_id,))
+                _bump_user_version(conn, row[0])
+            # Max/last values can't be decremented, so recompute the user's gym stats
+            if row and row[1] == "gym" and workout_type in (None, "gym"):
+                _rebuild_stats(conn, row[0])
+    else:
+        with store.lock:
+            deleted = store.delete_workout(workout_id, workout_type)
+            if deleted and deleted["workout_type"] == "gym":
+                rebuild_user_stats(deleted["user_id"])
+
+# --- Per-user Data Version ---
+def _bump_user_version(conn, user_id):
+    conn.execute("INSERT INTO user_versions (user_id, version, updated_at) VALUES (?, 1, ?) "
+                 "ON CONFLICT (user_id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at",
+                 (user_id, time.time()))
+
+def get_user_version(user_id):
+    """Return (version, updated_at) of a user's workout data; (0, None) if never written.
+
+    The version changes on every add/delete of the user's workouts, so it can
+    be used to validate anything derived from them.
+    """
+    if USE_SQLITE:
+        row = get_connection(_user_location(user_id)).execute(
+            "SELECT version, updated_at FROM user_versions WHERE user_id = ?", (user_id,)).fetchone()
+        return (row[0], row[1]) if row else (0, None)
+    else:
+        return store.get_version(user_id)
+
+# --- Search ---
+def search_workouts(user_id, query, workout_type=None, limit=20, offset=0):
+    """Full-text search over one user's gym exercises/muscle groups and WOD text.
+
+    Every word of `query` must match, as a prefix. Returns up to `limit`
+    results, best match first, as workout dicts with two extra keys: "score"
+    (higher is better) and "snippet" (the matched text, matches in **).
+    """
+    terms = text_search.query_terms(query)
+    if not terms:
+        return []
+    if USE_SQLITE:
+        sql = ("SELECT w.id, w.date, w.user_id, w.workout_type, w.details, "
+               "snippet(workout_search, 0, '**', '**', '…', ?), bm25(workout_search, 1.0, 0.0) "
+               "FROM workout_search JOIN workouts w ON w.id = workout_search.rowid "
+               "WHERE workout_search MATCH ?")
+        params = [text_search.SNIPPET_WORDS, text_search.fts_query(terms, text_search.owner_token(user_id))]
         if workout_type:
-            cursor.execute("DELETE FROM workouts WHERE id = ? AND workout_type = ?", (workout_id, workout_type))
-        else:
-            cursor.execute("DELETE FROM workouts WHERE id = ?", (workout_id,))
-        conn.commit()
+            sql += " AND w.workout_type = ?"
+            params.append(workout_type)
+        sql += " ORDER BY bm25(workout_search, 1.0, 0.0), w.id DESC LIMIT ? OFFSET ?"
+        params.extend((int(limit), int(offset)))
+        rows = get_connection(_user_location(user_id)).execute(sql, params).fetchall()
+        return [{
+            "id": row[0],
+            "date": row[1],
+            "user_id": row[2],
+            "workout_type": row[3],
+            "details": json.loads(row[4]),
+            "snippet": row[5],
+            "score": -row[6],
+        } for row in rows]
     else:
-        global workouts
-        workouts = [w for w in workouts if w["id"] != workout_id]
+        results = []
+        for score, workout, text in store.search(user_id, terms, workout_type, int(limit), int(offset)):
+            workout.update(snippet=text_search.make_snippet(text, terms), score=score)
+            results.append(workout)
+        return results
+
+# --- Typed Gym/WOD Rows ---
+_NUMBER = re.compile(r'\d+(?:[.,]\d+)?')
+
+def parse_weight(value):
+    """Return the first number in a free-form weight string ("80", "80kg", "2x24"), or None."""
+    match = _NUMBER.search(str(value or ""))
+    return float(match.group(0).replace(",", ".")) if match else None
+
+def parse_int(value):
+    """Return the first whole number in a free-form string ("5", "5 sets"), or None."""
+    value = parse_weight(value)
+    return int(value) if value is not None else None
+
+def _insert_typed_rows(conn, rows):
+    """Mirror (workout_id, date, user_id, workout_type, details) rows into gym_sets/wods."""
+    gym_rows = []
+    wod_rows = []
+    for workout_id, date, user_id, workout_type, details in rows:
+        if workout_type == "gym":
+            gym_rows.append((workout_id, user_id, date, details.get("muscle_group"), details.get("exercise"),
+                             details.get("max_weight"), parse_weight(details.get("max_weight")),
+                             parse_int(details.get("sets")), parse_int(details.get("reps"))))
+        elif workout_type == "wod":
+            wod_rows.append((workout_id, user_id, date,
+                             details.get("wod_blocks", details.get("wod_workout")),
+                             details.get("wod_difficulty", details.get("feedback")),
+                             json.dumps(details["blocks"]) if "blocks" in details else None))
+    conn.executemany(
+        "INSERT OR REPLACE INTO gym_sets (workout_id, user_id, date, muscle_group, exercise, max_weight_text, "
+        "max_weight, sets, reps) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", gym_rows)
+    conn.executemany(
+        "INSERT OR REPLACE INTO wods (workout_id, user_id, date, wod_blocks, difficulty, blocks) "
+        "VALUES (?, ?, ?, ?, ?, ?)", wod_rows)
+
+# --- Per-user Training Aggregates ---
+
+def empty_stats():
+    return {"muscle_groups": {}, "exercises": {}, "sessions": 0, "last_session": None}
+
+def apply_gym_stats(stats, date, details, new_session):
+    """Fold one gym record into a stats dict (see get_user_stats for the shape)."""
+    group = (details.get("muscle_group") or "").strip()
+    name = (details.get("exercise") or "").strip()
+    weight = details.get("max_weight", "")
+    if new_session:
+        stats["sessions"] += 1
+    if stats["last_session"] is None or date > stats["last_session"]:
+        stats["last_session"] = date
+    if group and date > stats["muscle_groups"].get(group, ""):
+        stats["muscle_groups"][group] = date
+    if not name:
+        return
+    entry = stats["exercises"].get(name)
+    if entry is None:
+        stats["exercises"][name] = {"muscle_group": group, "last_date": date, "last_weight": weight,
+                                    "max_weight": weight, "entries": 1}
+        return
+    entry["entries"] += 1
+    if date >= entry["last_date"]:
+        entry.update(muscle_group=group, last_date=date, last_weight=weight)
+    value = parse_weight(weight)
+    if value is not None and value > (parse_weight(entry["max_weight"]) or -1):
+        entry["max_weight"] = weight
+
+def _find_new_sessions(conn, rows):
+    """(user_id, date) pairs in rows that have no gym workout stored yet."""
+    new_sessions = set()
+    for date, user_id, workout_type, details in rows:
+        if workout_type != "gym" or (user_id, date) in new_sessions:
+            continue
+        exists = conn.execute(
+            "SELECT 1 FROM workouts WHERE user_id = ? AND workout_type = 'gym' AND date = ? LIMIT 1",
+            (user_id, date)).fetchone()
+        if not exists:
+            new_sessions.add((user_id, date))
+    return new_sessions
+
+def _upsert_stats(conn, user_id, date, details, new_session):
+    group = (details.get("muscle_group") or "").strip()
+    name = (details.get("exercise") or "").strip()
+    weight = details.get("max_weight", "")
+    conn.execute(
+        "INSERT INTO user_stats (user_id, kind, name, last_date, entries) VALUES (?, 'sessions', '', ?, ?) "
+        "ON CONFLICT (user_id, kind, name) DO UPDATE SET "
+        "last_date = MAX(last_date, excluded.last_date), entries = entries + excluded.entries",
+        (user_id, date, 1 if new_session else 0))
+    if group:
+        conn.execute(
+            "INSERT INTO user_stats (user_id, kind, name, last_date, entries) VALUES (?, 'muscle_group', ?, ?, 1) "
+            "ON CONFLICT (user_id, kind, name) DO UPDATE SET "
+            "last_date = MAX(last_date, excluded.last_date), entries = entries + 1",
+            (user_id, group, date))
+    if name:
+        # In an UPSERT, bare column names refer to the existing row's values
+        conn.execute(
+            "INSERT INTO user_stats (user_id, kind, name, muscle_group, last_date, last_weight, max_weight, "
+            "max_weight_value, entries) VALUES (?, 'exercise', ?, ?, ?, ?, ?, ?, 1) "
+            "ON CONFLICT (user_id, kind, name) DO UPDATE SET "
+            "muscle_group = CASE WHEN excluded.last_date >= last_date THEN excluded.muscle_group ELSE muscle_group END, "
+            "last_weight = CASE WHEN excluded.last_date >= last_date THEN excluded.last_weight ELSE last_weight END, "
+            "last_date = MAX(last_date, excluded.last_date), "
+            "max_weight = CASE WHEN excluded.max_weight_value > COALESCE(max_weight_value, -1) "
+            "THEN excluded.max_weight ELSE max_weight END, "
+            "max_weight_value = CASE WHEN excluded.max_weight_value > COALESCE(max_weight_value, -1) "
+            "THEN excluded.max_weight_value ELSE max_weight_value END, "
+            "entries = entries + 1",
+            (user_id, name, group, date, weight, weight, parse_weight(weight)))
+
+def _rebuild_stats(conn, user_id):
+    stats = empty_stats()
+    rows = conn.execute(
+        "SELECT date, muscle_group, exercise, max_weight_text FROM gym_sets WHERE user_id = ? "
+        "ORDER BY date, workout_id",
+        (user_id,)).fetchall()
+    previous_date = None
+    for date, group, exercise, max_weight in rows:
+        details = {"muscle_group": group, "exercise": exercise, "max_weight": max_weight}
+        apply_gym_stats(stats, date, details, date != previous_date)
+        previous_date = date
+    conn.execute("DELETE FROM user_stats WHERE user_id = ?", (user_id,))
+    if stats["sessions"]:
+        conn.execute("INSERT INTO user_stats (user_id, kind, name, last_date, entries) "
+                     "VALUES (?, 'sessions', '', ?, ?)", (user_id, stats["last_session"], stats["sessions"]))
+    conn.executemany("INSERT INTO user_stats (user_id, kind, name, last_date) VALUES (?, 'muscle_group', ?, ?)",
+                     [(user_id, group, date) for group, date in stats["muscle_groups"].items()])
+    conn.executemany(
+        "INSERT INTO user_stats (user_id, kind, name, muscle_group, last_date, last_weight, max_weight, "
+        "max_weight_value, entries) VALUES (?, 'exercise', ?, ?, ?, ?, ?, ?, ?)",
+        [(user_id, name, e["muscle_group"], e["last_date"], e["last_weight"], e["max_weight"],
+          parse_weight(e["max_weight"]), e["entries"]) for name, e in stats["exercises"].items()])
+
+def rebuild_user_stats(user_id=None):
+    """Recompute user_stats from the workouts table for one user (or everyone).
+
+    Returns the number of users rebuilt.
+    """
+    if USE_SQLITE:
+        count = 0
+        for location in _locations() if user_id is None else [_user_location(user_id)]:
+            with transaction(location) as conn:
+                if user_id is None:
+                    user_ids = [r[0] for r in conn.execute("SELECT DISTINCT user_id FROM gym_sets").fetchall()]
+                    conn.execute("DELETE FROM user_stats")
+                else:
+                    user_ids = [user_id]
+                for uid in user_ids:
+                    _rebuild_stats(conn, uid)
+            count += len(user_ids)
+        return count
+    else:
+        with store.lock:
+            user_ids = store.user_ids_with("gym") if user_id is None else {user_id}
+            if user_id is None:
+                user_stats.clear()
+            for uid in user_ids:
+                stats = empty_stats()
+                previous_date = None
+                for w in store.get_workouts(uid, "gym", order="asc"):
+                    apply_gym_stats(stats, w["date"], w["details"], w["date"] != previous_date)
+                    previous_date = w["date"]
+                user_stats[uid] = stats
+        return len(user_ids)
+
+def get_user_stats(user_id):
+    """Return a user's gym aggregates:
+
+    {"muscle_groups": {group: last_date},
+     "exercises": {exercise: {"muscle_group", "last_date", "last_weight", "max_weight", "entries"}},
+     "sessions": number of gym sessions, "last_session": date of the latest one}
+    """
+    if USE_SQLITE:
+        stats = empty_stats()
+        rows = get_connection(_user_location(user_id)).execute(
+            "SELECT kind, name, muscle_group, last_date, last_weight, max_weight, entries "
+            "FROM user_stats WHERE user_id = ?", (user_id,)).fetchall()
+        for kind, name, group, last_date, last_weight, max_weight, entries in rows:
+            if kind == "sessions":
+                stats["sessions"], stats["last_session"] = entries, last_date
+            elif kind == "muscle_group":
+                stats["muscle_groups"][name] = last_date
+            else:
+                stats["exercises"][name] = {"muscle_group": group, "last_date": last_date,
+                                            "last_weight": last_weight, "max_weight": max_weight,
+                                            "entries": entries}
+        return stats
+    else:
+        with store.lock:
+            stats = user_stats.get(user_id) or empty_stats()
+            return {"muscle_groups": dict(stats["muscle_groups"]),
+                    "exercises": {k: dict(v) for k, v in stats["exercises"].items()},
+                    "sessions": stats["sessions"], "last_session": stats["last_session"]}
+
+def get_history_fingerprint(user_id, workout_type):
+    """Return (max workout id, count) for a user's workouts of one type.
+
+    Ids are never reused, so any add or delete changes the fingerprint.
+    """
+    if USE_SQLITE:
+        row = get_connection(_user_location(user_id)).execute(
+            "SELECT COALESCE(MAX(id), 0), COUNT(*) FROM workouts WHERE user_id = ? AND workout_type = ?",
+            (user_id, workout_type)).fetchone()
+        return row[0], row[1]
+    else:
+        return store.get_fingerprint(user_id, workout_type)
+
+# --- Suggestion Cache Storage ---
+def get_cached_suggestion(cache_key, max_age):
+    """Return a cached suggestion newer than max_age seconds, or None."""
+    min_created = time.time() - max_age
+    if USE_SQLITE:
+        row = get_connection().execute(
+            "SELECT suggestion FROM suggestion_cache WHERE cache_key = ? AND created_at >= ?",
+            (cache_key, min_created)).fetchone()
+        return row[0] if row else None
+    else:
+        entry = suggestion_cache_rows.get(cache_key)
+        if entry and entry["created_at"] >= min_created:
+            return entry["suggestion"]
+        return None
+
+def put_cached_suggestion(cache_key, user_id, kind, suggestion, pinned=False):
+    """Store a suggestion; pinned ones are exempt from the row cap in evict_cached_suggestions()."""
+    if USE_SQLITE:
+        with transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO suggestion_cache (cache_key, user_id, kind, suggestion, created_at, pinned) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (cache_key, user_id, kind, suggestion, time.time(), int(pinned)))
+    else:
+        suggestion_cache_rows[cache_key] = {"user_id": user_id, "kind": kind, "suggestion": suggestion,
+                                            "created_at": time.time(), "pinned": pinned}
+
+def pin_cached_suggestion(cache_key):
+    """Pin an existing entry (keeping its age). Returns False if there is none."""
+    if USE_SQLITE:
+        with transaction() as conn:
+            return conn.execute("UPDATE suggestion_cache SET pinned = 1 WHERE cache_key = ?",
+                                (cache_key,)).rowcount > 0
+    else:
+        entry = suggestion_cache_rows.get(cache_key)
+        if entry is None:
+            return False
+        entry["pinned"] = True
+        return True
+
+def delete_cached_suggestions(user_id=None, kind=None):
+    """Drop cached suggestions for one user (or all users if user_id is None).
+
+    If kind is given, only that user's gym or WOD suggestions are dropped.
+    """
+    global suggestion_cache_rows
+    if USE_SQLITE:
+        with transaction() as conn:
+            if user_id is None:
+                conn.execute("DELETE FROM suggestion_cache")
+            elif kind is None:
+                conn.execute("DELETE FROM suggestion_cache WHERE user_id = ?", (user_id,))
+            else:
+                conn.execute("DELETE FROM suggestion_cache WHERE user_id = ? AND kind = ?", (user_id, kind))
+    else:
+        suggestion_cache_rows = {k: v for k, v in suggestion_cache_rows.items()
+                                 if user_id is not None and
+                                 (v["user_id"] != user_id or (kind is not None and v["kind"] != kind))}
+
+def evict_cached_suggestions(max_age, max_rows):
+    """Delete expired entries, then the oldest unpinned ones beyond max_rows (pinned rows don't count)."""
+    global suggestion_cache_rows
+    min_created = time.time() - max_age
+    if USE_SQLITE:
+        with transaction() as conn:
+            conn.execute("DELETE FROM suggestion_cache WHERE created_at < ?", (min_created,))
+            conn.execute(
+                "DELETE FROM suggestion_cache WHERE pinned = 0 AND cache_key NOT IN "
+                "(SELECT cache_key FROM suggestion_cache WHERE pinned = 0 ORDER BY created_at DESC LIMIT ?)",
+                (max_rows,))
+    else:
+        live = [(k, v) for k, v in suggestion_cache_rows.items() if v["created_at"] >= min_created]
+        newest = sorted(((k, v) for k, v in live if not v.get("pinned")),
+                        key=lambda kv: kv[1]["created_at"], reverse=True)
+        suggestion_cache_rows = dict([(k, v) for k, v in live if v.get("pinned")] + newest[:max_rows])
+
+# --- Background Job Queue ---
+def enqueue_job(job_type, user_id):
+    """Queue a job unless an identical one is already pending."""
+    now = time.time()
+    if USE_SQLITE:
+        with transaction() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO jobs (job_type, user_id, status, created_at, updated_at) "
+                "VALUES (?, ?, 'pending', ?, ?)",
+                (job_type, user_id, now, now))
+    else:
+        global next_job_id
+        with jobs_lock:
+            if any(j["job_type"] == job_type and j["user_id"] == user_id and j["status"] == "pending"
+                   for j in jobs):
+                return
+            jobs.append({"id": next_job_id, "job_type": job_type, "user_id": user_id, "status": "pending",
+                         "attempts": 0, "error": None, "created_at": now, "updated_at": now})
+            next_job_id += 1
+
+def claim_job(stale_after):
+    """Atomically mark the oldest pending job as running and return it (or None).
+
+    Jobs left 'running' for longer than stale_after seconds (e.g. their worker
+    died) are put back to 'pending' first.
+    """
+    now = time.time()
+    if USE_SQLITE:
+        with transaction() as conn:
+            conn.execute(
+                "UPDATE OR IGNORE jobs SET status = 'pending' WHERE status = 'running' AND updated_at < ?",
+                (now - stale_after,))
+            # Stale jobs that duplicate a pending one are simply dropped
+            conn.execute("DELETE FROM jobs WHERE status = 'running' AND updated_at < ?", (now - stale_after,))
+            row = conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? "
+                "WHERE id = (SELECT id FROM jobs WHERE status = 'pending' ORDER BY id LIMIT 1) "
+                "RETURNING id, job_type, user_id, attempts",
+                (now,)).fetchone()
+        if row is None:
+            return None
+        return {"id": row[0], "job_type": row[1], "user_id": row[2], "attempts": row[3]}
+    else:
+        with jobs_lock:
+            for job in jobs:
+                if job["status"] == "running" and job["updated_at"] < now - stale_after:
+                    job["status"] = "pending"
+            for job in jobs:
+                if job["status"] == "pending":
+                    job.update(status="running", attempts=job["attempts"] + 1, updated_at=now)
+                    return {k: job[k] for k in ("id", "job_type", "user_id", "attempts")}
+        return None
+
+def finish_job(job_id, error=None, retry=False):
+    """Mark a job done, failed, or (retry=True) pending again."""
+    status = "pending" if retry else ("failed" if error else "done")
+    now = time.time()
+    if USE_SQLITE:
+        with transaction() as conn:
+            # A retry may collide with a newer pending job for the same user; then just drop this one
+            conn.execute("UPDATE OR IGNORE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                         (status, error, now, job_id))
+            conn.execute("DELETE FROM jobs WHERE id = ? AND status = 'running'", (job_id,))
+            # Keep the table small: finished jobs are only interesting for a day
+            conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                         (now - 24 * 3600,))
+    else:
+        global jobs
+        with jobs_lock:
+            for job in jobs:
+                if job["id"] == job_id:
+                    job.update(status=status, error=error, updated_at=now)
+            jobs = [j for j in jobs if j["status"] not in ("done", "failed") or j["updated_at"] >= now - 24 * 3600]
+
+def get_job_counts():
+    """Return {status: count} for the job queue."""
+    if USE_SQLITE:
+        rows = get_connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+    else:
+        counts = {}
+        for job in jobs:
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return counts
+
+# --- Single-flight Leases ---
+def acquire_flight_lease(key, owner, ttl):
+    """Take the lease for key unless a live one is held; returns True if taken."""
+    now = time.time()
+    if USE_SQLITE:
+        with transaction() as conn:
+            # Finished and dead leases are replaced; rows nobody reused go eventually
+            conn.execute("DELETE FROM flight_leases WHERE expires_at < ?", (now - 3600,))
+            cur = conn.execute(
+                "INSERT INTO flight_leases (key, owner, status, result, error, expires_at) "
+                "VALUES (?, ?, 'running', NULL, NULL, ?) "
+                "ON CONFLICT (key) DO UPDATE SET owner = excluded.owner, status = 'running', result = NULL, "
+                "error = NULL, expires_at = excluded.expires_at "
+                "WHERE flight_leases.status != 'running' OR flight_leases.expires_at < ?",
+                (key, owner, now + ttl, now))
+            return cur.rowcount > 0
+    else:
+        with jobs_lock:
+            lease = flight_leases.get(key)
+            if lease and lease["status"] == "running" and lease["expires_at"] >= now:
+                return False
+            flight_leases[key] = {"owner": owner, "status": "running", "result": None, "error": None,
+                                  "expires_at": now + ttl}
+            return True
+
+def get_flight_lease(key):
+    """Return {"owner", "status", "result", "error", "expires_at"} for key, or None."""
+    if USE_SQLITE:
+        row = get_connection().execute(
+            "SELECT owner, status, result, error, expires_at FROM flight_leases WHERE key = ?", (key,)).fetchone()
+        return dict(zip(("owner", "status", "result", "error", "expires_at"), row)) if row else None
+    else:
+        with jobs_lock:
+            lease = flight_leases.get(key)
+            return dict(lease) if lease else None
+
+def finish_flight_lease(key, owner, result, error, keep_for):
+    """Store the lease holder's result (or error) for waiters, readable for keep_for seconds."""
+    status = "failed" if error else "done"
+    expires_at = time.time() + keep_for
+    if USE_SQLITE:
+        with transaction() as conn:
+            conn.execute("UPDATE flight_leases SET status = ?, result = ?, error = ?, expires_at = ? "
+                         "WHERE key = ? AND owner = ?", (status, result, error, expires_at, key, owner))
+    else:
+        with jobs_lock:
+            lease = flight_leases.get(key)
+            if lease and lease["owner"] == owner:
+                lease.update(status=status, result=result, error=error, expires_at=expires_at)
+
+def clear_database():
+    """Delete all users and workouts (in the main DB and every shard)."""
+    if USE_SQLITE:
+        with transaction() as conn:
+            conn.execute("DELETE FROM users")
+            _bump_version(conn, "users_version")
+            conn.execute("DELETE FROM suggestion_cache")
+            conn.execute("DELETE FROM jobs")
+        # One transaction per file: users are gone first, so partial progress is never visible
+        for location in _locations():
+            with transaction(location) as conn:
+                for table in ("workouts", "user_stats", "gym_sets", "wods", "user_versions"):
+                    conn.execute(f"DELETE FROM {table}")
+    else:
+        global suggestion_cache_rows, jobs
+        with store.lock:
+            store.clear()
+            user_stats.clear()
+        suggestion_cache_rows = {}
+        jobs = []
+
+# Time every public data-access call (db_call_duration_seconds{function=...}).
+# Internal callers go through the module globals, so they are timed as well.
+for _name in ("add_user", "get_users", "get_user", "get_user_by_name", "get_user_version", "add_workout", "add_workouts", "get_all_workouts",
+              "get_workouts", "get_recent_dates", "search_workouts", "delete_workout", "rebuild_user_stats", "get_user_stats",
+              "get_history_fingerprint", "get_cached_suggestion", "put_cached_suggestion", "pin_cached_suggestion",
+              "delete_cached_suggestions", "evict_cached_suggestions", "enqueue_job", "claim_job",
+              "finish_job", "get_job_counts", "acquire_flight_lease", "get_flight_lease", "finish_flight_lease",
+              "clear_database", "migrate"):
+    globals()[_name] = metrics.timed("db_call_duration_seconds", function=_name)(globals()[_name])
@@ -0,0 +1,32 @@
+# gunicorn.conf.py
+# Production server settings; used by the Procfile:
+#
+#   gunicorn -c gunicorn.conf.py "app:create_app()"
+#
+# The app is preloaded in the master (imports, template parsing and schema
+# migrations happen once, and forked workers share those pages copy-on-write).
+# Workers then open their own SQLite connections and HTTP sessions lazily;
+# post_fork starts the per-worker background job threads.
+import os
+
+import metrics
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+# Threads keep serving while a request waits on the LLM
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() == "true"
+# Streamed suggestions can legitimately take longer than gunicorn's default 30s
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+accesslog = "-"
+
+def on_starting(server):
+    # Drop metric snapshots of a previous server run (see metrics.py)
+    metrics.clear_snapshots()
+
+def post_fork(server, worker):
+    import app
+    app.init_worker()
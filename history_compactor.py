@@ -0,0 +1,106 @@
+# history_compactor.py
+# Builds the gym-history part of the suggestion prompt within a token budget.
+#
+# The most recent sessions are kept verbatim; everything the coach needs from
+# older sessions is condensed into two tables: the last date each muscle group
+# was trained, and the last/max weight per exercise (read from the incrementally
+# maintained user_stats in database.py, so the full history is never loaded).
+import os
+import math
+
+# Approximate token budget for the history section of the gym prompt.
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", "1500"))
+# Number of most recent sessions included line by line.
+PROMPT_RECENT_SESSIONS = int(os.environ.get("PROMPT_RECENT_SESSIONS", "3"))
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token for English text)."""
+    return math.ceil(len(text) / 4)
+
+def format_gym_record(details):
+    return (
+        f"- Body Part: {details.get('muscle_group', '')}, "
+        f"Exercise: {details.get('exercise', '')}, "
+        f"Max Weight: {details.get('max_weight', '')}, "
+        f"Sets: {details.get('sets', '')}, "
+        f"Reps: {details.get('reps', '')}"
+    )
+
+def format_sessions(sessions):
+    """Format [(date, [details, ...]), ...] as the verbatim session list."""
+    lines = []
+    for date, records in sessions:
+        lines.append(f"Session Date: {date}")
+        for details in records:
+            lines.append(format_gym_record(details))
+        lines.append("")  # Blank line between sessions
+    return "\n".join(lines)
+
+def format_summary(muscle_groups, exercises, max_rows=None):
+    """Format the condensed tables, most recently trained first."""
+    groups = sorted(muscle_groups.items(), key=lambda kv: kv[1], reverse=True)
+    lifts = sorted(exercises.items(), key=lambda kv: kv[1]["last_date"], reverse=True)
+    if max_rows is not None:
+        groups, lifts = groups[:max_rows], lifts[:max_rows]
+    lines = ["Last trained date per muscle group:"]
+    lines += [f"- {group}: {date}" for group, date in groups]
+    lines.append("")
+    lines.append("Last/max weight per exercise:")
+    lines += [
+        f"- {name} ({entry['muscle_group']}): last {entry['last_weight']} on {entry['last_date']}, "
+        f"max {entry['max_weight']}"
+        for name, entry in lifts
+    ]
+    return "\n".join(lines)
+
+def compact_gym_history(recent_workouts, summary, token_budget=None, recent_sessions=None):
+    """Build the history text for the gym prompt within token_budget.
+
+    recent_workouts are the workouts of the user's most recent sessions, most
+    recent first; summary is the user's aggregates from database.get_user_stats().
+    Returns (text, stats) where stats has the estimated full/compact token
+    counts for logging.
+    """
+    token_budget = PROMPT_TOKEN_BUDGET if token_budget is None else token_budget
+    recent_sessions = PROMPT_RECENT_SESSIONS if recent_sessions is None else recent_sessions
+
+    # Group workouts by session date, most recent first
+    sessions = {}
+    for w in recent_workouts:
+        sessions.setdefault(w["date"], []).append(w["details"])
+    ordered = sorted(sessions.items(), key=lambda kv: kv[0], reverse=True)[:recent_sessions]
+    total_sessions = max(summary["sessions"], len(ordered))
+
+    recent_text = format_sessions(ordered)
+    # The full history isn't loaded; extrapolate its size from the recent sessions
+    full_tokens = estimate_tokens(recent_text) * total_sessions // max(len(ordered), 1)
+    stats = {"sessions": total_sessions, "full_tokens": full_tokens}
+    if total_sessions <= len(ordered) and estimate_tokens(recent_text) <= token_budget:
+        stats.update(compact_tokens=estimate_tokens(recent_text), verbatim_sessions=len(ordered))
+        return recent_text, stats
+
+    muscle_groups, exercises = summary["muscle_groups"], summary["exercises"]
+    max_rows = None
+    keep = len(ordered)
+    while True:
+        text = (
+            f"Most recent {keep} session(s):\n" + format_sessions(ordered[:keep]) +
+            f"\nSummary of all {total_sessions} sessions:\n" + format_summary(muscle_groups, exercises, max_rows)
+        )
+        tokens = estimate_tokens(text)
+        if tokens <= token_budget:
+            break
+        # Over budget: first drop verbatim sessions (keep at least one), then shorten the tables
+        if keep > 1:
+            keep -= 1
+        else:
+            rows = max(len(muscle_groups), len(exercises)) if max_rows is None else max_rows
+            if rows <= 1:
+                break
+            max_rows = rows // 2
+    if tokens > token_budget:
+        # Even one session and one-row tables don't fit (e.g. very long entries): cut the text
+        text = text[:token_budget * 4]
+        tokens = estimate_tokens(text)
+    stats.update(compact_tokens=tokens, verbatim_sessions=keep)
+    return text, stats
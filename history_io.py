@@ -0,0 +1,154 @@
+# history_io.py
+# Bulk import/export of workout history as CSV or JSON Lines.
+#
+# Both directions stream: imports parse the input line by line and write it
+# in chunks of IMPORT_CHUNK_SIZE rows (one add_workouts transaction each);
+# exports read from database.iter_workouts() and yield one line at a time.
+# Memory use is bounded by the chunk size, not by the length of the history.
+#
+# CSV columns (also the export format):
+#   date,type,muscle_group,exercise,max_weight,sets,reps,wod_blocks,wod_difficulty
+# JSONL lines: {"date": ..., "type": "gym"|"wod", "details": {...}} or the
+# same keys as the CSV columns at the top level.
+import os
+import io
+import csv
+import json
+import datetime
+
+import database
+from wod_parser import parse_wod_blocks
+
+IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", "500"))
+# Errors reported back in detail; the rest are only counted.
+MAX_REPORTED_ERRORS = 20
+
+CSV_COLUMNS = ["date", "type", "muscle_group", "exercise", "max_weight", "sets", "reps",
+               "wod_blocks", "wod_difficulty"]
+GYM_FIELDS = ["muscle_group", "exercise", "max_weight", "sets", "reps"]
+FORMATS = ("csv", "jsonl")
+
+def detect_format(filename, default="csv"):
+    """Guess the format from a file name (.csv, .jsonl/.ndjson/.json)."""
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    if extension == ".csv":
+        return "csv"
+    return default
+
+def _iter_records(lines, fmt):
+    """Yield (line_number, record dict or None, error or None) from text lines."""
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record, None
+        return
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f"invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, "expected a JSON object"
+            continue
+        yield line_number, record, None
+
+def validate_record(record):
+    """Turn one parsed record into (date, workout_type, details); raises ValueError."""
+    details = record.get("details")
+    if not isinstance(details, dict):
+        details = record
+    date = str(record.get("date") or "").strip()
+    try:
+        date = datetime.date.fromisoformat(date).isoformat()
+    except ValueError:
+        raise ValueError(f"invalid date {date!r} (expected YYYY-MM-DD)")
+    workout_type = str(record.get("type") or record.get("workout_type") or "").strip().lower()
+    if workout_type == "gym":
+        values = {field: str(details.get(field) or "").strip() for field in GYM_FIELDS}
+        missing = [field for field, value in values.items() if not value]
+        if missing:
+            raise ValueError(f"missing gym fields: {', '.join(missing)}")
+        return date, "gym", values
+    if workout_type == "wod":
+        text = str(details.get("wod_blocks") or details.get("wod_workout") or "").strip()
+        if not text:
+            raise ValueError("missing wod_blocks")
+        values = {"wod_blocks": text, "blocks": parse_wod_blocks(text)}
+        difficulty = str(details.get("wod_difficulty") or details.get("feedback") or "").strip()
+        if difficulty:
+            values["wod_difficulty"] = difficulty
+        return date, "wod", values
+    raise ValueError(f"invalid type {workout_type!r} (expected 'gym' or 'wod')")
+
+def iter_import(lines, fmt, user_id, chunk_size=None):
+    """Validate and store workouts from an iterable of text lines.
+
+    Valid rows are written in chunks of chunk_size rows, one transaction per
+    chunk; invalid rows are skipped and reported. Yields a progress report
+    after every chunk and a final one with "done": True:
+    {"processed", "imported", "error_count", "errors": [{"line", "error"}], "types", "done"}.
+    """
+    chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+    report = {"processed": 0, "imported": 0, "error_count": 0, "errors": [], "types": [], "done": False}
+    chunk = []
+
+    def flush():
+        report["imported"] += database.add_workouts(chunk)
+        for _, _, workout_type, _ in chunk:
+            if workout_type not in report["types"]:
+                report["types"].append(workout_type)
+        chunk.clear()
+
+    for line_number, record, error in _iter_records(lines, fmt):
+        report["processed"] += 1
+        if error is None:
+            try:
+                date, workout_type, details = validate_record(record)
+            except ValueError as e:
+                error = str(e)
+        if error is not None:
+            report["error_count"] += 1
+            if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                report["errors"].append({"line": line_number, "error": error})
+            continue
+        chunk.append((date, user_id, workout_type, details))
+        if len(chunk) >= chunk_size:
+            flush()
+            yield dict(report)
+    if chunk:
+        flush()
+    report["done"] = True
+    yield dict(report)
+
+def import_history(lines, fmt, user_id, chunk_size=None, progress=None):
+    """Run iter_import() to completion, calling progress(report) for each report. Returns the last one."""
+    for report in iter_import(lines, fmt, user_id, chunk_size):
+        if progress:
+            progress(report)
+    return report
+
+def export_history(user_id, fmt, workout_types=("gym", "wod")):
+    """Yield a user's history as CSV or JSONL text, one row per chunk."""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_COLUMNS)
+        for workout in database.iter_workouts(user_id, workout_types):
+            details = workout["details"]
+            writer.writerow([workout["date"], workout["workout_type"]] +
+                            [details.get(column, "") for column in CSV_COLUMNS[2:]])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+        return
+    for workout in database.iter_workouts(user_id, workout_types):
+        # "blocks" is derived from wod_blocks and re-parsed on import
+        details = {k: v for k, v in workout["details"].items() if k != "blocks"}
+        yield json.dumps({"id": workout["id"], "date": workout["date"],
+                          "type": workout["workout_type"], "details": details}) + "\n"
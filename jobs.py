@@ -0,0 +1,94 @@
+# jobs.py
+# Background job runner backed by the persistent `jobs` table in database.py.
+#
+# Writes (e.g. record_workout) enqueue a job; a small pool of worker threads
+# in each process claims jobs atomically from the table, so several gunicorn
+# workers can share one queue and jobs survive restarts.
+import os
+import logging
+import threading
+import traceback
+
+import database
+
+logger = logging.getLogger(__name__)
+
+# Run background jobs in this process (set to false for one-off scripts).
+BACKGROUND_JOBS = os.environ.get("BACKGROUND_JOBS", "true").lower() == "true"
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+# How often idle workers poll the table for jobs enqueued by other processes.
+POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", "5"))
+# A job 'running' for longer than this is assumed lost and is re-queued.
+STALE_AFTER = float(os.environ.get("JOB_STALE_AFTER", "300"))
+MAX_ATTEMPTS = 3
+
+_handlers = {}
+_wakeup = threading.Event()
+_started_pid = None
+_start_lock = threading.Lock()
+
+def register(job_type, handler):
+    """Register handler(user_id) for a job type."""
+    _handlers[job_type] = handler
+
+def enqueue(job_type, user_id):
+    """Persist a job and wake up a local worker. Never raises into the caller."""
+    try:
+        database.enqueue_job(job_type, user_id)
+        _wakeup.set()
+    except Exception as e:
+        logger.error(f"Failed to enqueue {job_type} job for user {user_id}: {str(e)}")
+
+def run_job(job):
+    handler = _handlers.get(job["job_type"])
+    if handler is None:
+        database.finish_job(job["id"], error=f"Unknown job type: {job['job_type']}")
+        return
+    try:
+        handler(job["user_id"])
+    except Exception as e:
+        logger.error(f"Job {job['id']} ({job['job_type']}) failed: {str(e)}")
+        logger.error(traceback.format_exc())
+        database.finish_job(job["id"], error=str(e), retry=job["attempts"] < MAX_ATTEMPTS)
+    else:
+        database.finish_job(job["id"])
+
+def run_pending():
+    """Run queued jobs in the calling thread until the queue is empty."""
+    count = 0
+    while True:
+        job = database.claim_job(STALE_AFTER)
+        if job is None:
+            return count
+        run_job(job)
+        count += 1
+
+def _worker():
+    while True:
+        try:
+            job = database.claim_job(STALE_AFTER)
+        except Exception as e:
+            logger.error(f"Failed to claim job: {str(e)}")
+            job = None
+        if job is None:
+            _wakeup.wait(POLL_INTERVAL)
+            _wakeup.clear()
+            continue
+        run_job(job)
+
+def start():
+    """Start the worker threads for this process (idempotent, fork-aware)."""
+    global _started_pid
+    if not BACKGROUND_JOBS or _started_pid == os.getpid():
+        return
+    with _start_lock:
+        if _started_pid == os.getpid():
+            return
+        _started_pid = os.getpid()
+        for i in range(JOB_WORKERS):
+            threading.Thread(target=_worker, name=f"job-worker-{i}", daemon=True).start()
+    logger.info(f"Started {JOB_WORKERS} background job workers")
+
+def stats():
+    """Return {status: count} for the job queue."""
+    return database.get_job_counts()
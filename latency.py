@@ -0,0 +1,109 @@
+# latency.py
+# Latency-budget helpers for the suggestion routes.
+#
+# - call(fn, timeout): wait at most `timeout` seconds for fn(); past that the
+#   caller gets DeadlineExceeded while fn keeps running in the background
+#   (so an LLM call that finishes late still fills the suggestion cache)
+# - prefetch(iterator, timeout): the same for a stream, bounded on its first item
+# - hedged(fn, delay): if fn() is still running after `delay`, start a second
+#   identical call and use whichever good result comes back first
+#
+# Work runs on small thread pools, created lazily per process (after fork).
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import metrics
+
+# Max calls running (or draining) in the background per pool and process.
+LATENCY_THREADS = int(os.environ.get("LATENCY_THREADS", "32"))
+
+class DeadlineExceeded(Exception):
+    """The call didn't produce a result within its deadline (it carries on in the background)."""
+
+_pools = {}
+_pools_pid = None
+_pools_lock = threading.Lock()
+
+def _pool(name):
+    """The named thread pool of this process."""
+    global _pools, _pools_pid
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            # Pools inherited through fork() have no threads
+            _pools = {}
+            _pools_pid = os.getpid()
+        pool = _pools.get(name)
+        if pool is None:
+            pool = _pools[name] = ThreadPoolExecutor(LATENCY_THREADS, thread_name_prefix=f"latency-{name}")
+        return pool
+
+def call(fn, timeout):
+    """Return fn(), or raise DeadlineExceeded if it takes longer than timeout seconds."""
+    future = _pool("deadline").submit(fn)
+    done, _ = wait([future], timeout=timeout)
+    if not done:
+        raise DeadlineExceeded(f"No result after {timeout}s")
+    return future.result()
+
+_END = object()
+
+class _Raised:
+    def __init__(self, error):
+        self.error = error
+
+def prefetch(iterator, timeout):
+    """Consume iterator in the background; return an iterator over its items.
+
+    Raises DeadlineExceeded if the first item takes longer than timeout
+    seconds. The iterator is then still run to its end, and its items dropped.
+    """
+    items = queue.Queue()
+    abandoned = threading.Event()
+
+    def pump():
+        try:
+            for item in iterator:
+                if not abandoned.is_set():
+                    items.put(item)
+        except BaseException as e:
+            items.put(_Raised(e))
+        finally:
+            items.put(_END)
+
+    _pool("prefetch").submit(pump)
+    try:
+        first = items.get(timeout=timeout)
+    except queue.Empty:
+        abandoned.set()
+        raise DeadlineExceeded(f"No output after {timeout}s")
+
+    def results(item):
+        while item is not _END:
+            if isinstance(item, _Raised):
+                raise item.error
+            yield item
+            item = items.get()
+    return results(first)
+
+def hedged(fn, delay, accept=lambda result: True):
+    """Return fn(), hedged: if it hasn't returned after `delay` seconds, call fn
+    again concurrently and return the first result accept() takes (else the
+    first call's result). Exceptions count as unaccepted results.
+    """
+    pool = _pool("hedge")
+    primary = pool.submit(fn)
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+    hedge = pool.submit(fn)
+    pending = {primary, hedge}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None and accept(future.result()):
+                metrics.inc("llm_hedges_total", {"winner": "primary" if future is primary else "hedge"})
+                return future.result()
+    metrics.inc("llm_hedges_total", {"winner": "none"})
+    return primary.result()
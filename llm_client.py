@@ -0,0 +1,146 @@
+# llm_client.py
+# Shared HTTP client for the OpenAI chat-completions API.
+#
+# - one pooled keep-alive requests.Session per process (no TLS handshake per call),
+#   re-created after fork() so workers never share the parent's sockets
+# - connect/read timeouts so a stalled upstream can't pin a worker forever
+# - retries with jittered exponential backoff on 429/5xx, honouring Retry-After
+# - a process-wide semaphore capping the number of in-flight LLM calls
+# - a count of 429 responses, which batch jobs use to back off (batch_plans.py)
+import os
+import time
+import random
+import datetime
+import threading
+import email.utils
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# Point this at a local OpenAI-compatible server for tests (e.g. http://127.0.0.1:8001/v1).
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+CONNECT_TIMEOUT = float(os.environ.get("OPENAI_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.environ.get("OPENAI_READ_TIMEOUT", "60"))
+MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", "3"))
+BACKOFF_BASE = float(os.environ.get("OPENAI_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.environ.get("OPENAI_BACKOFF_MAX", "20"))
+# Max concurrent LLM calls per process, and how long a caller waits for a slot.
+MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", "8"))
+SLOT_TIMEOUT = float(os.environ.get("OPENAI_SLOT_TIMEOUT", "30"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class LLMBusyError(Exception):
+    """Raised when no concurrency slot frees up within SLOT_TIMEOUT."""
+
+_slots = threading.BoundedSemaphore(MAX_CONCURRENCY)
+_in_flight = 0  # calls currently holding a slot (for the llm_in_flight gauge)
+_in_flight_lock = threading.Lock()
+_rate_limited = 0  # 429 responses seen by this process
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Return the process-wide pooled session, creating it on first use (per pid)."""
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        with _session_lock:
+            if _session is None or _session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONCURRENCY)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers["Content-Type"] = "application/json"
+                _session = session
+                _session_pid = os.getpid()
+    return _session
+
+def reset_session():
+    """Drop the pooled session; the next call opens new connections."""
+    global _session
+    with _session_lock:
+        _session = None
+
+def _retry_after(response):
+    """Seconds requested by a Retry-After header (delta-seconds or HTTP-date), or None."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        # A "-0000" zone means UTC with no further information, not local time
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, parsed.timestamp() - time.time())
+
+def _backoff(attempt, response=None):
+    # Full jitter: uniform(0, base * 2^attempt), capped
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+    if response is not None:
+        retry_after = _retry_after(response)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+    return min(delay, BACKOFF_MAX)
+
+def rate_limited_count():
+    """Number of 429 (rate limited) responses this process has received."""
+    return _rate_limited
+
+def _post(path, payload, headers, stream):
+    global _rate_limited
+    url = f"{OPENAI_BASE_URL}{path}"
+    for attempt in range(MAX_RETRIES + 1):
+        last_attempt = attempt == MAX_RETRIES
+        try:
+            response = get_session().post(url, json=payload, headers=headers, stream=stream,
+                                          timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        except (requests.ConnectionError, requests.Timeout):
+            if last_attempt:
+                raise
+            time.sleep(_backoff(attempt))
+            continue
+        if response.status_code == 429:
+            with _in_flight_lock:
+                _rate_limited += 1
+            metrics.inc("llm_rate_limited_total")
+        if response.status_code not in RETRY_STATUSES or last_attempt:
+            return response
+        delay = _backoff(attempt, response)
+        response.close()
+        time.sleep(delay)
+
+@contextmanager
+def chat_completion(payload, stream=False):
+    """POST payload to /chat/completions and yield the response.
+
+    A concurrency slot is held until the with-block exits, so streamed
+    responses count against the limit while they are being read.
+    """
+    global _in_flight
+    if not _slots.acquire(timeout=SLOT_TIMEOUT):
+        raise LLMBusyError(f"No LLM slot free after {SLOT_TIMEOUT}s")
+    with _in_flight_lock:
+        _in_flight += 1
+    try:
+        headers = {"Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}"}
+        response = _post("/chat/completions", payload, headers, stream)
+        try:
+            yield response
+        finally:
+            response.close()
+    finally:
+        with _in_flight_lock:
+            _in_flight -= 1
+        _slots.release()
+
+metrics.register_gauges(lambda: [("llm_in_flight", {}, _in_flight)])
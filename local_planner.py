@@ -0,0 +1,152 @@
+# local_planner.py
+# Suggestions built locally from a user's own history, shown when the LLM
+# misses the suggestion deadline or fails (see suggestion_or_local_plan in app.py).
+#
+# The gym plan follows the rules of the default gym_prompt: two muscle groups,
+# the ones trained least recently, five main exercises, and the last weight of
+# each exercise plus 1-3 kg. The WOD plan is one of a few templates in the
+# "Block X:" format, picked to avoid the last WOD's main movements and scaled
+# by its difficulty feedback.
+import datetime
+
+from database import parse_weight
+
+NOTE = "(Quick plan built from your history while the AI coach is unavailable.)"
+
+# Used when the history has fewer than two muscle groups / five exercises
+DEFAULT_GROUPS = ["Chest", "Back", "Legs", "Shoulders", "Arms"]
+DEFAULT_EXERCISES = {
+    "chest": ["Bench press", "Incline dumbbell press", "Cable fly"],
+    "back": ["Barbell row", "Lat pulldown", "Seated cable row"],
+    "legs": ["Back squat", "Romanian deadlift", "Leg press"],
+    "shoulders": ["Overhead press", "Lateral raise", "Face pull"],
+    "arms": ["Barbell curl", "Triceps pushdown", "Hammer curl"],
+}
+WARM_UPS = {
+    "chest": "Push-ups and band pull-aparts: 2 x 10",
+    "back": "Scapular pull-ups and cat-cow: 2 x 10",
+    "legs": "Bodyweight squats and leg swings: 2 x 10",
+    "shoulders": "Arm circles and band dislocates: 2 x 10",
+    "arms": "Light curls and triceps extensions: 2 x 15",
+}
+MAIN_EXERCISES = 5
+SETS, REPS = 4, 8
+
+def progress_weight(last_weight):
+    """The last weight plus 1-3 kg (more for heavier lifts), or None if it has no number."""
+    value = parse_weight(last_weight)
+    if not value:
+        return None
+    step = 1 if value < 20 else 2 if value < 60 else 3
+    return f"{value + step:g} kg"
+
+def gym_plan(stats):
+    """Today's gym program as text, from get_user_stats() aggregates."""
+    last_date = stats["last_session"]
+    trained = stats["muscle_groups"]  # group -> last date
+    last_groups = sorted(group for group, date in trained.items() if date == last_date)
+    # Least recently trained first, skipping the last session's groups while others are known
+    candidates = sorted((date, group) for group, date in trained.items() if group not in last_groups)
+    focus = [group for _, group in candidates][:2]
+    known = {group.lower() for group in trained}
+    for group in DEFAULT_GROUPS:
+        if len(focus) == 2:
+            break
+        if group.lower() not in known:
+            focus.append(group)
+    # Everything known was trained last time: repeat those groups, then any default
+    for group in last_groups + DEFAULT_GROUPS:
+        if len(focus) == 2:
+            break
+        if group.lower() not in {f.lower() for f in focus}:
+            focus.append(group)
+
+    # The user's own exercises for those groups, most practised first, alternating groups
+    per_group = []
+    for group in focus:
+        own = sorted(((-info["entries"], name) for name, info in stats["exercises"].items()
+                      if (info["muscle_group"] or "").lower() == group.lower()))
+        names = [name for _, name in own]
+        names += [name for name in DEFAULT_EXERCISES.get(group.lower(), [])
+                  if name.lower() not in {n.lower() for n in names}]
+        per_group.append([(group, name) for name in names])
+    chosen = [pair for row in zip(*per_group) for pair in row]
+    leftovers = [pair for row in per_group for pair in row if pair not in chosen]
+    chosen = (chosen + leftovers)[:MAIN_EXERCISES]
+
+    lines = []
+    if last_date:
+        reason = "" if set(focus) & set(last_groups) else ", the groups you haven't trained in a while"
+        lines.append(f"Last time ({last_date}) you trained {', '.join(last_groups)}. "
+                     f"Today's focus: {' and '.join(focus)}{reason}.")
+    else:
+        lines.append(f"No gym history yet. Today's focus: {' and '.join(focus)}.")
+    lines.append(NOTE)
+    lines.append("")
+    lines.append("**Warm-up & Stretching**")
+    lines.append("5 min easy rowing or cycling")
+    for group in focus:
+        lines.append(WARM_UPS.get(group.lower(), f"Light {group.lower()} mobility: 2 x 10"))
+    lines.append("")
+    lines.append("**Main Exercises**")
+    for group, name in chosen:
+        info = stats["exercises"].get(name)
+        weight = progress_weight(info["last_weight"]) if info else None
+        load = f"ramp to {weight}" if weight else "moderate weight"
+        lines.append(f"{group} - {name}: {load}, {REPS} reps, {SETS} sets.")
+    return "\n".join(lines)
+
+# Each template: (main movements, loads in kg at "perfect" difficulty, blocks).
+# Loads are scaled by the last WOD's feedback and rounded to 2.5 kg, kettlebells
+# ("kb") to the nearest real bell size.
+WOD_TEMPLATES = [
+    (("squat", "pull-up"), {"squat": 60, "kb": 16}, [
+        ("Warm-up", ["400m easy run", "2 rounds: 10 air squats, 5 scap pull-ups, 10 lunges"], "8 minutes"),
+        ("Strength - Front squat", ["5 x 5 front squats at {squat} kg"], "15 minutes"),
+        ("AMRAP 12", ["10 goblet squats ({kb} kg)", "8 pull-ups", "200m run"], "12 minutes"),
+        ("Cool-down", ["Couch stretch, 1 min per side", "Lat stretch on the rig, 1 min"], "5 minutes"),
+    ]),
+    (("press", "burpee"), {"press": 40, "db": 15}, [
+        ("Warm-up", ["500m row", "2 rounds: 10 push-ups, 10 band pull-aparts, 10 PVC pass-throughs"], "8 minutes"),
+        ("Strength - Push press", ["5 x 3 push press at {press} kg"], "15 minutes"),
+        ("For time: 21-15-9", ["Dumbbell push press ({db} kg each)", "Burpees", "Time cap 12 minutes"],
+         "12 minutes"),
+        ("Cool-down", ["Doorway chest stretch, 1 min per side", "Child's pose, 2 min"], "5 minutes"),
+    ]),
+    (("deadlift", "swing", "row"), {"deadlift": 90, "kb": 24}, [
+        ("Warm-up", ["400m easy run", "2 rounds: 10 good mornings, 10 glute bridges, 10 hollow rocks"], "8 minutes"),
+        ("Strength - Deadlift", ["5 x 5 deadlifts at {deadlift} kg"], "15 minutes"),
+        ("EMOM 12", ["Odd minutes: 15 kettlebell swings ({kb} kg)", "Even minutes: 12/10 cal row"], "12 minutes"),
+        ("Cool-down", ["Pigeon stretch, 1 min per side", "Hamstring stretch, 1 min per side"], "5 minutes"),
+    ]),
+]
+KETTLEBELLS = [8, 12, 16, 20, 24, 28, 32, 36, 40, 48]
+FEEDBACK_SCALE = [("too easy", 1.15), ("too difficult", 0.85), ("easy", 1.05), ("perfect", 1.0)]
+
+def _round_load(name, kg):
+    if name == "kb":
+        return min(KETTLEBELLS, key=lambda bell: abs(bell - kg))
+    return round(kg / 2.5) * 2.5
+
+def wod_plan(last_wod, today=None):
+    """Today's WOD as text in the "Block X:" format, given the user's last WOD (or None)."""
+    details = last_wod["details"] if last_wod else {}
+    last_text = str(details.get("wod_blocks", details.get("wod_workout", ""))).lower()
+    feedback = str(details.get("wod_difficulty", details.get("feedback", ""))).lower()
+    scale = next((factor for phrase, factor in FEEDBACK_SCALE if phrase in feedback), 1.0)
+
+    fresh = [t for t in WOD_TEMPLATES if not any(movement in last_text for movement in t[0])] or WOD_TEMPLATES
+    # Rotate by date so consecutive fallback days differ
+    day = (today or datetime.date.today()).toordinal()
+    _, loads, blocks = fresh[day % len(fresh)]
+    loads = {name: f"{_round_load(name, kg * scale):g}" for name, kg in loads.items()}
+
+    lines = []
+    for number, (title, exercises, time) in enumerate(blocks, 1):
+        # Text outside the blocks isn't shown, so the first title carries the note
+        lines.append(f"Block {number}: {title}" + (" (quick plan from your history)" if number == 1 else ""))
+        lines.append("Exercises:")
+        lines.extend(f"- {exercise.format(**loads)}" for exercise in exercises)
+        lines.append(f"Time: {time}")
+        lines.append("")
+    return "\n".join(lines).strip()
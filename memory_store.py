@@ -0,0 +1,245 @@
+# memory_store.py
+# Indexed in-memory storage used by database.py when USE_SQLITE=false.
+#
+# Workouts are stored by id, and every (user_id, workout_type) pair keeps a
+# list of (date, id) keys sorted like the SQLite index idx_workouts_user_type_date,
+# so the keyset/date-range queries are bisect + slice instead of full scans.
+# All access goes through one re-entrant lock. Records use __slots__ and are
+# handed to callers as fresh dicts (like rows read from SQLite), so callers
+# can't mutate the store by accident.
+#
+# Workout text is also kept in a text_search.InvertedIndex for search().
+#
+# With MEMORY_SNAPSHOT_PATH set, the store is loaded from that JSON file at
+# startup and written back (atomically) at interpreter exit.
+import os
+import json
+import atexit
+import bisect
+import time
+import tempfile
+import threading
+
+import text_search
+
+MEMORY_SNAPSHOT_PATH = os.environ.get("MEMORY_SNAPSHOT_PATH")
+
+class UserRecord:
+    __slots__ = ("id", "username")
+
+    def __init__(self, id, username):
+        self.id = id
+        self.username = username
+
+    def as_dict(self):
+        return {"id": self.id, "username": self.username}
+
+class WorkoutRecord:
+    __slots__ = ("id", "date", "user_id", "workout_type", "details")
+
+    def __init__(self, id, date, user_id, workout_type, details):
+        self.id = id
+        self.date = date
+        self.user_id = user_id
+        self.workout_type = workout_type
+        self.details = details
+
+    def as_dict(self):
+        return {"id": self.id, "date": self.date, "user_id": self.user_id,
+                "workout_type": self.workout_type, "details": dict(self.details)}
+
+class MemoryStore:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.users = {}     # id -> UserRecord
+            self.user_names = {}  # case-folded username -> id
+            self.workouts = {}  # id -> WorkoutRecord
+            self.index = {}     # (user_id, workout_type) -> sorted [(date, id), ...]
+            self.versions = {}  # user_id -> (data version, updated_at), see database.get_user_version
+            self.search_index = text_search.InvertedIndex()
+            self.next_user_id = 1
+            self.next_workout_id = 1
+
+    # --- Users ---
+
+    def add_user(self, username, name_key):
+        """Add a user; name_key is the case-folded username. Raises ValueError if it is taken."""
+        with self.lock:
+            if name_key in self.user_names:
+                raise ValueError(f"Username already exists: {username}")
+            user = UserRecord(self.next_user_id, username)
+            self.users[user.id] = user
+            self.user_names[name_key] = user.id
+            self.next_user_id += 1
+            return user.id
+
+    def get_users(self):
+        with self.lock:
+            return [user.as_dict() for user in self.users.values()]
+
+    def get_user(self, user_id):
+        with self.lock:
+            user = self.users.get(user_id)
+            return user.as_dict() if user else None
+
+    def get_user_by_name(self, name_key):
+        with self.lock:
+            user_id = self.user_names.get(name_key)
+            return self.users[user_id].as_dict() if user_id is not None else None
+
+    # --- Workouts ---
+
+    def add_workout(self, date, user_id, workout_type, details):
+        """Store one workout; returns (id, new_day) where new_day is True if the
+        user had no workout of this type on that date yet."""
+        with self.lock:
+            keys = self.index.setdefault((user_id, workout_type), [])
+            position = bisect.bisect_left(keys, (date,))
+            new_day = position == len(keys) or keys[position][0] != date
+            record = WorkoutRecord(self.next_workout_id, date, user_id, workout_type, details)
+            self.workouts[record.id] = record
+            bisect.insort(keys, (date, record.id))
+            self.search_index.add(user_id, record.id, text_search.document_text(workout_type, details))
+            self.next_workout_id += 1
+            self._bump_version(user_id)
+            return record.id, new_day
+
+    def get_all_workouts(self):
+        with self.lock:
+            return [w.as_dict() for w in self.workouts.values()]
+
+    def _range(self, user_id, workout_type, since=None, until=None, before=None):
+        """Index keys for the filters, ascending."""
+        keys = self.index.get((user_id, workout_type), [])
+        lo = bisect.bisect_left(keys, (since,)) if since else 0
+        hi = len(keys)
+        if until:
+            # (until, inf): every key on the until date sorts before it
+            hi = bisect.bisect_left(keys, (until, float("inf")), lo, hi)
+        if before:
+            hi = bisect.bisect_left(keys, tuple(before), lo, hi)
+        return keys[lo:hi]
+
+    def get_workouts(self, user_id, workout_type, since=None, until=None, limit=None, order="desc", before=None):
+        with self.lock:
+            keys = self._range(user_id, workout_type, since, until, before)
+            if order == "desc":
+                keys = keys[::-1]
+            if limit is not None:
+                keys = keys[:int(limit)]
+            return [self.workouts[workout_id].as_dict() for _, workout_id in keys]
+
+    def iter_workouts(self, user_id, workout_type, batch_size=500):
+        """Yield workouts oldest first; the lock is only held while copying each batch."""
+        with self.lock:
+            keys = list(self.index.get((user_id, workout_type), []))
+        for start in range(0, len(keys), batch_size):
+            with self.lock:
+                batch = [self.workouts[workout_id].as_dict() for _, workout_id in keys[start:start + batch_size]
+                         if workout_id in self.workouts]
+            yield from batch
+
+    def get_recent_dates(self, user_id, workout_type, limit, before=None):
+        with self.lock:
+            keys = self._range(user_id, workout_type, before=before)
+            dates = []
+            for date, _ in reversed(keys):
+                if len(dates) >= int(limit):
+                    break
+                if not dates or dates[-1] != date:
+                    dates.append(date)
+            return dates
+
+    def get_fingerprint(self, user_id, workout_type):
+        with self.lock:
+            keys = self.index.get((user_id, workout_type), [])
+            return max((workout_id for _, workout_id in keys), default=0), len(keys)
+
+    def delete_workout(self, workout_id, workout_type=None):
+        """Delete a workout (only if it has workout_type, when given). Returns the deleted dict or None."""
+        with self.lock:
+            record = self.workouts.get(workout_id)
+            if record is None or (workout_type and record.workout_type != workout_type):
+                return None
+            del self.workouts[workout_id]
+            keys = self.index[(record.user_id, record.workout_type)]
+            del keys[bisect.bisect_left(keys, (record.date, record.id))]
+            self.search_index.remove(record.user_id, record.id,
+                                     text_search.document_text(record.workout_type, record.details))
+            self._bump_version(record.user_id)
+            return record.as_dict()
+
+    def search(self, user_id, terms, workout_type=None, limit=20, offset=0):
+        """Ranked matches as (score, workout dict, searched text), like database.search_workouts."""
+        with self.lock:
+            results = []
+            for score, workout_id in self.search_index.search(user_id, terms):
+                record = self.workouts[workout_id]
+                if workout_type and record.workout_type != workout_type:
+                    continue
+                results.append((score, record))
+            return [(score, record.as_dict(), text_search.document_text(record.workout_type, record.details))
+                    for score, record in results[offset:offset + limit]]
+
+    def _bump_version(self, user_id):
+        version, _ = self.versions.get(user_id, (0, None))
+        self.versions[user_id] = (version + 1, time.time())
+
+    def get_version(self, user_id):
+        with self.lock:
+            return self.versions.get(user_id, (0, None))
+
+    def user_ids_with(self, workout_type):
+        with self.lock:
+            return {user_id for (user_id, kind), keys in self.index.items() if kind == workout_type and keys}
+
+    # --- Snapshots ---
+
+    def save(self, path):
+        """Write the store to path as JSON (temp file + os.replace)."""
+        with self.lock:
+            data = {
+                "next_user_id": self.next_user_id,
+                "next_workout_id": self.next_workout_id,
+                "users": [u.as_dict() for u in self.users.values()],
+                "workouts": [w.as_dict() for w in self.workouts.values()],
+            }
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".memory-snapshot-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def load(self, path, name_key=str.lower):
+        """Replace the store's contents with a snapshot written by save()."""
+        with open(path) as f:
+            data = json.load(f)
+        with self.lock:
+            self.clear()
+            for user in data["users"]:
+                self.users[user["id"]] = UserRecord(user["id"], user["username"])
+                self.user_names[name_key(user["username"])] = user["id"]
+            for w in data["workouts"]:
+                record = WorkoutRecord(w["id"], w["date"], w["user_id"], w["workout_type"], w["details"])
+                self.workouts[record.id] = record
+                self.index.setdefault((record.user_id, record.workout_type), []).append((record.date, record.id))
+                self.search_index.add(record.user_id, record.id,
+                                      text_search.document_text(record.workout_type, record.details))
+            for keys in self.index.values():
+                keys.sort()
+            self.next_user_id = data["next_user_id"]
+            self.next_workout_id = data["next_workout_id"]
+
+    def enable_snapshots(self, path, name_key=str.lower):
+        """Load path if it exists and save back to it at interpreter exit."""
+        if os.path.exists(path):
+            self.load(path, name_key)
+        atexit.register(self.save, path)
@@ -0,0 +1,321 @@
+# metrics.py
+# Minimal Prometheus instrumentation shared by app.py, database.py and the LLM client.
+#
+# Counters and histograms are kept in memory per process. Each process also
+# writes a JSON snapshot of them to METRICS_DIR/<pid>-<start time>.json (from a
+# background thread every FLUSH_INTERVAL seconds, and on every scrape), and
+# /metrics sums the snapshots of all processes, so whichever gunicorn worker
+# answers the scrape reports totals for the whole server. A scrape folds the
+# snapshots of exited processes (old workers, `flask generate-plans`, ...) into
+# METRICS_DIR/totals.json, so their counts keep counting (totals stay
+# monotonic, even when the OS reuses a pid) without leaving one file per
+# process behind; gauges are only taken from live processes.
+# gunicorn.conf.py clears METRICS_DIR when the server starts.
+import os
+import json
+import time
+import atexit
+import tempfile
+import threading
+import functools
+
+try:
+    import fcntl
+except ImportError:  # Windows (flask run): scrapes are not serialized across processes
+    fcntl = None
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(tempfile.gettempdir(), "workout-app-metrics"))
+FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", "10"))
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> {"buckets", "counts", "sum", "count"}
+_descriptions = {}  # name -> (type, help)
+_process_gauges = []  # callables returning [(name, labels dict, value)], summed over live processes
+_global_gauges = []   # callables for values shared by all processes (e.g. the jobs table)
+_flusher_pid = None
+# Tells this process's snapshot apart from an earlier process with the same pid
+_started = time.time_ns()
+TOTALS_FILE = "totals.json"
+
+def _key(name, labels):
+    return name, tuple(sorted((labels or {}).items()))
+
+def describe(name, kind, help_text):
+    """Set the # TYPE (counter, gauge, histogram) and # HELP lines for a metric."""
+    _descriptions[name] = (kind, help_text)
+
+def inc(name, labels=None, value=1):
+    if not METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    _ensure_flusher()
+
+def observe(name, value, labels=None, buckets=DEFAULT_BUCKETS):
+    if not METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = {"buckets": list(buckets), "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(hist["buckets"]):
+            if value <= bound:
+                hist["counts"][i] += 1
+                break
+        hist["sum"] += value
+        hist["count"] += 1
+    _ensure_flusher()
+
+def timed(name, **labels):
+    """Decorator observing the wall time of each call in histogram `name`.
+
+    Calls that raise also increment `<name minus _duration_seconds>_errors_total`.
+    """
+    errors_name = name.replace("_duration_seconds", "") + "_errors_total"
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                inc(errors_name, labels)
+                raise
+            finally:
+                observe(name, time.perf_counter() - start, labels)
+        return wrapper
+    return decorator
+
+def register_gauges(collector, per_process=True):
+    """Register collector() -> [(name, labels, value), ...], evaluated at scrape/flush time.
+
+    per_process gauges (e.g. this worker's cache size) are summed over live
+    processes; others (e.g. rows in a shared table) are read once per scrape.
+    """
+    (_process_gauges if per_process else _global_gauges).append(collector)
+
+def _collect_gauges(collectors):
+    values = []
+    for collector in collectors:
+        try:
+            values.extend(collector())
+        except Exception:
+            pass  # a failing gauge must not break the scrape
+    return values
+
+def snapshot():
+    """This process's metrics as a JSON-serializable dict."""
+    with _lock:
+        counters = [[name, list(map(list, labels)), value] for (name, labels), value in _counters.items()]
+        histograms = [[name, list(map(list, labels)), dict(hist, counts=list(hist["counts"]))]
+                      for (name, labels), hist in _histograms.items()]
+    gauges = [[name, sorted(labels.items()), value] for name, labels, value in _collect_gauges(_process_gauges)]
+    return {"pid": os.getpid(), "started": _started, "counters": counters, "histograms": histograms, "gauges": gauges}
+
+def flush():
+    """Atomically write this process's snapshot to METRICS_DIR."""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    _write_json(os.path.join(METRICS_DIR, f"{os.getpid()}-{_started}.json"), snapshot())
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception:
+            pass
+
+def _final_flush():
+    if _flusher_pid == os.getpid():
+        try:
+            flush()
+        except Exception:
+            pass
+
+def _ensure_flusher():
+    # One flusher thread per process; re-started after a fork (gunicorn workers)
+    global _flusher_pid
+    if _flusher_pid != os.getpid():
+        with _lock:
+            if _flusher_pid != os.getpid():
+                _flusher_pid = os.getpid()
+                threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True).start()
+                atexit.register(_final_flush)
+
+def _reset_after_fork():
+    # A forked child starts with its parent's totals (already in the parent's
+    # snapshot) and possibly a lock held by a parent thread: start from zero.
+    global _lock, _counters, _histograms, _started
+    _lock = threading.Lock()
+    _counters = {}
+    _histograms = {}
+    _started = time.time_ns()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def clear_snapshots():
+    """Delete all snapshots in METRICS_DIR (gunicorn on_starting: start a new server from zero)."""
+    if not os.path.isdir(METRICS_DIR):
+        return
+    for filename in os.listdir(METRICS_DIR):
+        if filename.endswith(".json"):
+            try:
+                os.unlink(os.path.join(METRICS_DIR, filename))
+            except FileNotFoundError:
+                pass
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _merge(counters, histograms, snap):
+    for name, labels, value in snap["counters"]:
+        key = _key(name, dict(labels))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, hist in snap["histograms"]:
+        key = _key(name, dict(labels))
+        merged = histograms.get(key)
+        if merged is None or merged["buckets"] != hist["buckets"]:
+            histograms[key] = dict(hist, counts=list(hist["counts"]))
+            continue
+        merged["counts"] = [a + b for a, b in zip(merged["counts"], hist["counts"])]
+        merged["sum"] += hist["sum"]
+        merged["count"] += hist["count"]
+
+def _write_json(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=METRICS_DIR, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def _fold_into_totals(totals, dead):
+    """Add the dead processes' snapshots to the totals snapshot, then delete them."""
+    counters, histograms = {}, {}
+    for snap in [totals] + [snap for _, snap in dead]:
+        _merge(counters, histograms, snap)
+    totals = {"pid": None, "gauges": [],
+              "counters": [[name, list(map(list, labels)), value] for (name, labels), value in counters.items()],
+              "histograms": [[name, list(map(list, labels)), hist] for (name, labels), hist in histograms.items()]}
+    # Totals first: a crash in between double counts once rather than losing counts
+    _write_json(os.path.join(METRICS_DIR, TOTALS_FILE), totals)
+    for path, _ in dead:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+    return totals
+
+def _load_snapshots():
+    flush()
+    with open(os.path.join(METRICS_DIR, ".lock"), "w") as lock_file:
+        # One scrape at a time, so two of them never fold the same snapshot
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        loaded, totals = [], None
+        for filename in os.listdir(METRICS_DIR):
+            if not filename.endswith(".json"):
+                continue
+            path = os.path.join(METRICS_DIR, filename)
+            try:
+                with open(path) as f:
+                    snap = json.load(f)
+            except (OSError, ValueError):
+                continue  # being replaced or removed right now
+            if filename == TOTALS_FILE:
+                totals = snap
+            else:
+                loaded.append((path, snap))
+        # Only the newest snapshot of a pid can belong to a running process
+        newest = {}
+        for _, snap in loaded:
+            newest[snap["pid"]] = max(newest.get(snap["pid"], 0), snap.get("started", 0))
+        snapshots, dead = [], []
+        for path, snap in loaded:
+            alive = snap.get("started", 0) == newest[snap["pid"]] and \
+                (snap["pid"] == os.getpid() or _pid_alive(snap["pid"]))
+            if alive:
+                snapshots.append(snap)
+            else:
+                dead.append((path, snap))
+        if dead:
+            totals = _fold_into_totals(totals or {"counters": [], "histograms": []}, dead)
+        if totals:
+            snapshots.append(totals)
+    return snapshots
+
+def collect():
+    """Merge all processes' snapshots: returns (counters, histograms, gauges) dicts."""
+    counters, histograms, gauges = {}, {}, {}
+    for snap in _load_snapshots():
+        _merge(counters, histograms, snap)
+        if snap["pid"] is not None:
+            for name, labels, value in snap["gauges"]:
+                key = _key(name, dict(labels))
+                gauges[key] = gauges.get(key, 0) + value
+    for name, labels, value in _collect_gauges(_global_gauges):
+        gauges[_key(name, labels)] = value
+    return counters, histograms, gauges
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escape = lambda v: str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in pairs) + "}"
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    counters, histograms, gauges = collect()
+    by_name = {}
+    for (name, labels), value in sorted(list(counters.items()) + list(gauges.items())):
+        by_name.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), hist in sorted(histograms.items(), key=lambda item: item[0]):
+        lines = by_name.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip(hist["buckets"], hist["counts"]):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', repr(float(bound)))])} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {hist['count']}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {hist['sum']}")
+        lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+    output = []
+    for name in sorted(by_name):
+        if name in _descriptions:
+            kind, help_text = _descriptions[name]
+            output.append(f"# HELP {name} {help_text}")
+            output.append(f"# TYPE {name} {kind}")
+        output.extend(by_name[name])
+    return "\n".join(output) + "\n"
+
+describe("http_request_duration_seconds", "histogram", "Time to produce response headers, by endpoint.")
+describe("http_requests_total", "counter", "HTTP responses by endpoint, method and status.")
+describe("db_call_duration_seconds", "histogram", "Duration of database.py calls.")
+describe("db_call_errors_total", "counter", "database.py calls that raised.")
+describe("llm_call_duration_seconds", "histogram", "Duration of LLM calls, until the last token.")
+describe("llm_first_token_seconds", "histogram", "Time to the first streamed LLM token.")
+describe("llm_calls_total", "counter", "LLM calls by mode and outcome.")
+describe("llm_tokens_total", "counter", "Tokens reported in the API usage field.")
+describe("llm_rate_limited_total", "counter", "429 responses from the LLM API (each retry counts).")
+describe("llm_in_flight", "gauge", "LLM calls currently holding a concurrency slot.")
+describe("llm_coalesced_total", "counter", "Suggestion requests that waited on an identical in-flight LLM call.")
+describe("llm_hedges_total", "counter", "Hedged LLM completions by the call that answered first.")
+describe("suggestion_fallbacks_total", "counter", "Suggestion pages served a locally built plan, by kind and reason.")
+describe("suggestion_cache_requests_total", "counter", "Suggestion cache lookups by result.")
+describe("suggestion_cache_memory_entries", "gauge", "Entries in the in-process suggestion caches.")
+describe("jobs", "gauge", "Background jobs by status.")
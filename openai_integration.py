@@ -1,36 +1,121 @@
 # openai_integration.py
 import os
 import json
-import requests
+import time
+from collections import deque
+
+import latency
+import metrics
+from llm_client import chat_completion
+
+FALLBACK_MESSAGE = "Sorry, I couldn't process that prompt."
+
+# Hedged completions: a second request is sent once the first has taken longer
+# than this percentile of recent successful calls (clamped to the min/max delay;
+# the default delay applies until there are enough samples).
+HEDGE_PERCENTILE = float(os.environ.get("LLM_HEDGE_PERCENTILE", "90"))
+HEDGE_MIN_DELAY = float(os.environ.get("LLM_HEDGE_MIN_DELAY", "1"))
+HEDGE_MAX_DELAY = float(os.environ.get("LLM_HEDGE_MAX_DELAY", "10"))
+HEDGE_DEFAULT_DELAY = float(os.environ.get("LLM_HEDGE_DEFAULT_DELAY", "6"))
+HEDGE_MIN_SAMPLES = 20
+
+_latencies = deque(maxlen=200)  # seconds, recent successful completions
+
+def _build_request(prompt: str):
+    return {
+        "model": "gpt-3.5-turbo",
+        "messages": [
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": prompt}
+        ],
+        "max_tokens": 1000,
+        "temperature": 0.7
+    }
+
+def _record_call(mode, outcome, start, usage=None):
+    """Record latency, outcome and the API-reported token usage of one LLM call."""
+    elapsed = time.perf_counter() - start
+    if mode == "complete" and outcome == "ok":
+        _latencies.append(elapsed)
+    metrics.observe("llm_call_duration_seconds", elapsed, {"mode": mode})
+    metrics.inc("llm_calls_total", {"mode": mode, "outcome": outcome})
+    for kind in ("prompt", "completion"):
+        tokens = (usage or {}).get(f"{kind}_tokens")
+        if tokens:
+            metrics.inc("llm_tokens_total", {"type": kind}, tokens)
 
 def query_openai(prompt: str) -> str:
+    start = time.perf_counter()
     try:
-        headers = {
-            "Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": "gpt-3.5-turbo",
-            "messages": [
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            "max_tokens": 1000,
-            "temperature": 0.7
-        }
-        
-        response = requests.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers=headers,
-            json=data
-        )
-        
-        if response.status_code == 200:
-            return response.json()["choices"][0]["message"]["content"].strip()
-        else:
-            print(f"OpenAI API error: {response.status_code} - {response.text}")
-            return "Sorry, I couldn't process that prompt."
+        data = _build_request(prompt)
+
+        with chat_completion(data) as response:
+            if response.status_code == 200:
+                body = response.json()
+                _record_call("complete", "ok", start, body.get("usage"))
+                return body["choices"][0]["message"]["content"].strip()
+            else:
+                print(f"OpenAI API error: {response.status_code} - {response.text}")
+                _record_call("complete", f"http_{response.status_code}", start)
+                return FALLBACK_MESSAGE
+    except Exception as e:
+        print("Error calling OpenAI API:", e)
+        _record_call("complete", "error", start)
+        return FALLBACK_MESSAGE
+
+def hedge_delay():
+    """Seconds to wait for a completion before hedging it (see HEDGE_PERCENTILE)."""
+    samples = sorted(_latencies)
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+    value = samples[min(len(samples) - 1, int(len(samples) * HEDGE_PERCENTILE / 100))]
+    return min(max(value, HEDGE_MIN_DELAY), HEDGE_MAX_DELAY)
+
+def query_openai_hedged(prompt: str) -> str:
+    """query_openai() with a hedged second request when the first one is slow."""
+    return latency.hedged(lambda: query_openai(prompt), hedge_delay(),
+                          accept=lambda result: result != FALLBACK_MESSAGE)
+
+def stream_openai(prompt: str):
+    """Generator variant of query_openai: yields content deltas as they arrive.
+
+    Uses the chat-completions `stream` option (Server-Sent Events). If the call
+    fails before any content was produced, yields the fallback message instead.
+    """
+    produced = False
+    start = time.perf_counter()
+    usage = None
+    try:
+        data = _build_request(prompt)
+        data["stream"] = True
+        # Ask for a final chunk with the token usage (its "choices" list is empty)
+        data["stream_options"] = {"include_usage": True}
+
+        with chat_completion(data, stream=True) as response:
+            if response.status_code != 200:
+                print(f"OpenAI API error: {response.status_code} - {response.text}")
+                _record_call("stream", f"http_{response.status_code}", start)
+                yield FALLBACK_MESSAGE
+                return
+            for line in response.iter_lines():
+                # Each event is a line "data: {...}"; the stream ends with "data: [DONE]"
+                if not line.startswith(b"data:"):
+                    continue
+                payload = line[len(b"data:"):].strip()
+                if payload == b"[DONE]":
+                    break
+                event = json.loads(payload)
+                usage = event.get("usage") or usage
+                choices = event.get("choices") or [{}]
+                content = choices[0].get("delta", {}).get("content")
+                if content:
+                    if not produced:
+                        metrics.observe("llm_first_token_seconds", time.perf_counter() - start)
+                    produced = True
+                    yield content
+        _record_call("stream", "ok", start, usage)
     except Exception as e:
         print("Error calling OpenAI API:", e)
-        return "Sorry, I couldn't process that prompt."
+        _record_call("stream", "error", start, usage)
+        if not produced:
+            yield FALLBACK_MESSAGE
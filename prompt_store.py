@@ -0,0 +1,97 @@
+# prompt_store.py
+# In-memory cache of the prompt templates in prompts.json.
+#
+# Parsed templates are kept per process and revalidated with a single
+# os.stat() per load: a save in any gunicorn worker replaces the file (new
+# inode/mtime/size), so other workers notice it without re-reading the file
+# on every request. Saves write a temp file and os.replace() it into place,
+# so readers never see a half-written file.
+import os
+import json
+import stat
+import tempfile
+import threading
+
+PROMPTS_FILE = os.environ.get("PROMPTS_FILE", os.path.join("/data", "prompts.json"))
+
+DEFAULT_PROMPTS = {
+    "gym_prompt": (
+        "Based on my recent gym workout history focusing on strength training.\n"
+        "Please suggest a workout plan for today, starting with warm-up and following with the main exercises. "
+        "Keep in mind a high-intensity level. Suggest 5 min warm-up & stretching exercises relevant to the main exercises. "
+        "Include exactly 5 types of exercises in the main exercises. Each exercise can be from 3 to 5 sets. "
+        "The exercises must be limited to 2 body parts per session, for example - chest and back, or shoulders and legs. "
+        "Do not suggest the same body parts that were trained in the most recent history. Suggest those that I haven't trained in a while. "
+        "When choosing weight for the exercise - take the weight I have done with this exercise in the last historic session and add 1-3 kg. "
+        "Give me suggestion in the following format where every set starts from the new line. "
+        "In the beginning, tell me briefly and without too much details what I trained last time, and where the focus of today's training should be. "
+        "Then give me warm-up exercises. The title saying **Warm-up & Stretching** must be in bold font. "
+        "Keep one blank line between warm-up and main exercises. The title saying **Main Exercises** must be in bold font. "
+        "Then give me today's program. Indicate which part of the body it works, max number of sets, max number of repetitions and max weight. "
+        "List main exercises as single line for each out of 5. For example: Chest - Bench press: ramp to 80kg, 6 reps, 5 sets.\n"
+    ),
+    "wod_prompt": (
+        "You are a professional CrossFit coach, and I am an athlete with 2 years of experience in CrossFit. "
+        "Give me a WOD exercise program following the typical structure of a WOD. Include Rx weights and time for exercises where appropriate. "
+        "The weights should be in kilograms. The time should be in minutes. "
+        "Please provide today's WOD program in exactly 4 complete blocks. Each block should start with 'Block X:' where X is the block number. "
+        "Each block must include the following details: Block title, Exercises, Time. The first block is always the warm-up. "
+        "The suggestion must take into account my last saved WOD workout below, targeting different muscle groups and considering previous difficulty feedback. "
+        "To understand the difficulty feedback, look for one of the following keywords: too easy, easy, perfect, too difficult.\n"
+    )
+}
+
+_lock = threading.Lock()
+_cached = None      # parsed prompts
+_cached_stat = None  # (inode, mtime_ns, size) of the file they were read from
+
+def _file_signature():
+    try:
+        st = os.stat(PROMPTS_FILE)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+def signature():
+    """(inode, mtime_ns, size) of the prompts file, or None; changes on every save."""
+    return _file_signature()
+
+def load():
+    """Return the prompts dict (a copy), re-reading the file only if it changed."""
+    global _cached, _cached_stat
+    signature = _file_signature()
+    if signature is None:
+        save(DEFAULT_PROMPTS)
+        signature = _file_signature()
+    with _lock:
+        if _cached is not None and signature == _cached_stat:
+            return dict(_cached)
+    with open(PROMPTS_FILE, "r") as f:
+        prompts = json.load(f)
+    with _lock:
+        _cached, _cached_stat = prompts, signature
+    return dict(prompts)
+
+def save(prompts):
+    """Atomically write the prompts file (temp file + os.replace)."""
+    global _cached, _cached_stat
+    directory = os.path.dirname(os.path.abspath(PROMPTS_FILE))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".prompts-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(prompts, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates the file 0600: keep the mode of the file being replaced
+        try:
+            mode = stat.S_IMODE(os.stat(PROMPTS_FILE).st_mode)
+        except FileNotFoundError:
+            mode = 0o644
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, PROMPTS_FILE)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    with _lock:
+        _cached, _cached_stat = dict(prompts), _file_signature()
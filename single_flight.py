@@ -0,0 +1,157 @@
+# single_flight.py
+# Request coalescing for LLM calls: concurrent requests for the same key
+# (kind, user, prompt hash) share one upstream call instead of each starting
+# their own.
+#
+# Within a process, the first request leads and the others follow its
+# chunks as they arrive. Across gunicorn workers, the leader also takes a
+# lease row in the flight_leases table (database.py); a leader in another
+# worker that finds the lease taken polls the row until the holder stores
+# its result (or error), then hands that to its own followers. A lease whose
+# holder died expires after LEASE_TTL and is taken over.
+#
+# Results are shared as text, including the LLM fallback message, so a
+# failed call fails every waiter the same way. A waiter that gives up after
+# WAIT_TIMEOUT, or whose flight raised, gets a FlightError.
+import os
+import time
+import uuid
+import hashlib
+import threading
+
+import database
+import metrics
+
+# Seconds a lease stays valid; longer than an LLM call can take with its retries.
+LEASE_TTL = float(os.environ.get("FLIGHT_LEASE_TTL", "300"))
+# Seconds a finished flight's result stays readable for waiters in other workers.
+RESULT_TTL = float(os.environ.get("FLIGHT_RESULT_TTL", "30"))
+# Max seconds a request waits on somebody else's call.
+WAIT_TIMEOUT = float(os.environ.get("FLIGHT_WAIT_TIMEOUT", "180"))
+POLL_INTERVAL = float(os.environ.get("FLIGHT_POLL_INTERVAL", "0.2"))
+
+class FlightError(Exception):
+    """The shared call failed, or waiting for it timed out."""
+
+class _Flight:
+    """One in-process call and the chunks it has produced so far."""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.parts = []
+        self.done = False
+        self.error = None
+
+    def add(self, chunk):
+        with self.cond:
+            self.parts.append(chunk)
+            self.cond.notify_all()
+
+    def finish(self, error=None):
+        with self.cond:
+            self.done = True
+            self.error = error
+            self.cond.notify_all()
+
+    def follow(self, timeout):
+        """Yield every chunk of the flight, including those produced before joining."""
+        deadline = time.monotonic() + timeout
+        index = 0
+        while True:
+            with self.cond:
+                while index == len(self.parts) and not self.done:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise FlightError("Timed out waiting for an identical request")
+                    self.cond.wait(remaining)
+                chunks = self.parts[index:]
+                index = len(self.parts)
+                done, error = self.done, self.error
+            yield from chunks
+            if done:
+                if error is not None:
+                    raise FlightError(str(error) or type(error).__name__)
+                return
+
+_lock = threading.Lock()
+_flights = {}  # key -> _Flight
+
+def make_key(kind, user_id, prompt):
+    """Flight key for a user's gym/WOD prompt."""
+    return f"{kind}:{user_id}:{hashlib.sha256(prompt.encode('utf-8')).hexdigest()}"
+
+def run(key, fn, timeout=None):
+    """Return fn() (a string), or the result of an identical call already in flight."""
+    return "".join(stream(key, lambda: iter([fn()]), timeout))
+
+def stream(key, fn, timeout=None):
+    """Streaming variant of run(): fn() returns an iterator of text chunks.
+
+    A generator: nothing happens until it is iterated. A follower in the same
+    process gets the leader's chunks as they arrive; one in another worker
+    gets the whole text once that worker's call has finished.
+    """
+    timeout = WAIT_TIMEOUT if timeout is None else timeout
+    with _lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+    if not leader:
+        metrics.inc("llm_coalesced_total", {"scope": "process"})
+        yield from flight.follow(timeout)
+        return
+    yield from _lead(key, flight, fn, timeout)
+
+def _acquire(key, token, timeout):
+    """Take the lease (returns None), or wait for the worker holding it and return its result."""
+    deadline = time.monotonic() + timeout
+    # Only fails while another worker holds a live lease
+    if database.acquire_flight_lease(key, token, LEASE_TTL):
+        return None
+    metrics.inc("llm_coalesced_total", {"scope": "cross_process"})
+    while True:
+        lease = database.get_flight_lease(key)
+        if lease is not None and lease["status"] == "failed":
+            raise FlightError(lease["error"])
+        if lease is not None and lease["status"] == "done":
+            return lease["result"]
+        # The holder died (lease expired or purged): take over
+        if (lease is None or lease["expires_at"] < time.time()) and \
+                database.acquire_flight_lease(key, token, LEASE_TTL):
+            return None
+        if time.monotonic() >= deadline:
+            raise FlightError("Timed out waiting for an identical request in another worker")
+        time.sleep(POLL_INTERVAL)
+
+def _lead(key, flight, fn, timeout):
+    token = uuid.uuid4().hex
+    leased = False
+    error = None
+    try:
+        result = _acquire(key, token, timeout)
+        leased = result is None
+        chunks = fn() if leased else iter([result])
+        try:
+            for chunk in chunks:
+                flight.add(chunk)
+                yield chunk
+        except GeneratorExit:
+            # Our client went away: finish the call anyway for the waiters
+            # (and for whatever fn does at the end, e.g. caching the result)
+            for chunk in chunks:
+                flight.add(chunk)
+            raise
+    except GeneratorExit:
+        raise
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        with _lock:
+            del _flights[key]
+        flight.finish(error)
+        if leased:
+            database.finish_flight_lease(key, token, "".join(flight.parts),
+                                         None if error is None else str(error) or type(error).__name__,
+                                         RESULT_TTL)
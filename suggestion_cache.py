@@ -0,0 +1,102 @@
+# suggestion_cache.py
+# Two-tier cache for LLM suggestions: an in-process LRU in front of the
+# suggestion_cache table in database.py (shared by all gunicorn workers).
+#
+# The key hashes the prompt template together with a fingerprint of the user's
+# history (max workout id + count), so a new/deleted workout or an edited
+# prompt naturally produces a different key. invalidate_user()/clear() drop
+# the now-unreachable entries early.
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import database
+import metrics
+
+# How long a cached suggestion stays valid (seconds).
+CACHE_TTL = int(os.environ.get("SUGGESTION_CACHE_TTL", str(24 * 3600)))
+# Max entries kept in the per-process LRU tier.
+MEMORY_CACHE_SIZE = int(os.environ.get("SUGGESTION_CACHE_SIZE", "256"))
+# Max rows kept in the SQLite tier (pinned rows aside); eviction runs every EVICT_EVERY writes.
+PERSISTENT_CACHE_ROWS = int(os.environ.get("SUGGESTION_CACHE_ROWS", "5000"))
+EVICT_EVERY = 100
+
+_lock = threading.Lock()
+_memory = OrderedDict()  # cache_key -> (user_id, kind, suggestion, created_at)
+_stats = {"memory_hits": 0, "persistent_hits": 0, "misses": 0, "stores": 0}
+
+def make_key(kind, user_id, template):
+    """Build the cache key for a user's gym/WOD suggestion."""
+    max_id, count = database.get_history_fingerprint(user_id, kind)
+    template_hash = hashlib.sha256(template.encode("utf-8")).hexdigest()
+    raw = f"{kind}:{user_id}:{template_hash}:{max_id}:{count}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def get(cache_key, user_id, kind):
+    """Return the cached suggestion for cache_key, or None on a miss."""
+    now = time.time()
+    with _lock:
+        entry = _memory.get(cache_key)
+        if entry and now - entry[3] <= CACHE_TTL:
+            _memory.move_to_end(cache_key)
+            _stats["memory_hits"] += 1
+            metrics.inc("suggestion_cache_requests_total", {"result": "memory_hit"})
+            return entry[2]
+    suggestion = database.get_cached_suggestion(cache_key, CACHE_TTL)
+    with _lock:
+        if suggestion is None:
+            _stats["misses"] += 1
+            metrics.inc("suggestion_cache_requests_total", {"result": "miss"})
+            return None
+        _stats["persistent_hits"] += 1
+    metrics.inc("suggestion_cache_requests_total", {"result": "persistent_hit"})
+    _remember(cache_key, user_id, kind, suggestion, now)
+    return suggestion
+
+def put(cache_key, user_id, kind, suggestion, pinned=False):
+    """Store a suggestion. Pinned entries (batch-generated) only expire after CACHE_TTL,
+    never to the PERSISTENT_CACHE_ROWS cap."""
+    now = time.time()
+    _remember(cache_key, user_id, kind, suggestion, now)
+    database.put_cached_suggestion(cache_key, user_id, kind, suggestion, pinned)
+    with _lock:
+        _stats["stores"] += 1
+        evict = _stats["stores"] % EVICT_EVERY == 0
+    if evict:
+        database.evict_cached_suggestions(CACHE_TTL, PERSISTENT_CACHE_ROWS)
+
+def pin(cache_key, user_id, kind, suggestion):
+    """Pin an entry that is already cached (storing it if only the memory tier had it)."""
+    if not database.pin_cached_suggestion(cache_key):
+        put(cache_key, user_id, kind, suggestion, pinned=True)
+
+def _remember(cache_key, user_id, kind, suggestion, created_at):
+    with _lock:
+        _memory[cache_key] = (user_id, kind, suggestion, created_at)
+        _memory.move_to_end(cache_key)
+        while len(_memory) > MEMORY_CACHE_SIZE:
+            _memory.popitem(last=False)
+
+def invalidate_user(user_id, kind=None):
+    """Drop a user's cached suggestions (optionally only gym or WOD) after their history changed."""
+    with _lock:
+        for key in [k for k, v in _memory.items() if v[0] == user_id and kind in (None, v[1])]:
+            del _memory[key]
+    database.delete_cached_suggestions(user_id, kind)
+
+def clear():
+    """Drop every cached suggestion (e.g. after the prompts were edited)."""
+    with _lock:
+        _memory.clear()
+    database.delete_cached_suggestions()
+
+def stats():
+    """Return hit/miss counters for this process."""
+    with _lock:
+        result = dict(_stats)
+        result["memory_entries"] = len(_memory)
+    return result
+
+metrics.register_gauges(lambda: [("suggestion_cache_memory_entries", {}, len(_memory))])
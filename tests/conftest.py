@@ -0,0 +1,14 @@
+# conftest.py
+# Point the app at throwaway storage before any module reads its settings.
+import os
+import sys
+import tempfile
+
+_data_dir = tempfile.mkdtemp(prefix="workout-tests-")
+os.environ.setdefault("DB_PATH", os.path.join(_data_dir, "test.db"))
+os.environ.setdefault("PROMPTS_FILE", os.path.join(_data_dir, "prompts.json"))
+os.environ.setdefault("METRICS_DIR", os.path.join(_data_dir, "metrics"))
+os.environ.setdefault("BACKGROUND_JOBS", "false")
+os.environ.setdefault("OPENAI_BASE_URL", "http://127.0.0.1:9/v1")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
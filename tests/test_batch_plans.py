@@ -0,0 +1,23 @@
+import app as app_module
+import batch_plans
+import database
+import suggestion_cache
+
+def test_batch_larger_than_cache_cap_stays_cached(monkeypatch, tmp_path):
+    monkeypatch.setattr(suggestion_cache, "PERSISTENT_CACHE_ROWS", 10)
+    monkeypatch.setattr(suggestion_cache, "EVICT_EVERY", 5)
+    monkeypatch.setattr(app_module, "query_openai", lambda prompt: "Plan for today")
+    user_ids = [database.add_user(f"batch-user-{i}") for i in range(20)]
+    tasks = [(user_id, kind) for user_id in user_ids for kind in ("gym", "wod")]
+    assert len(tasks) > suggestion_cache.PERSISTENT_CACHE_ROWS
+
+    stats = batch_plans.run(tasks, app_module.generate_plan, str(tmp_path / "checkpoint.jsonl"))
+    assert stats["generated"] == len(tasks) and stats["error"] == 0
+
+    # Ordinary traffic after the batch still evicts down to the cap, but not the batch's rows
+    for i in range(20):
+        suggestion_cache.put(f"page-view-{i}", user_ids[0], "gym", "Page view plan")
+    suggestion_cache._memory.clear()
+    for user_id, kind in tasks:
+        key = app_module.suggestion_cache_key(kind, user_id)
+        assert database.get_cached_suggestion(key, suggestion_cache.CACHE_TTL) == "Plan for today"
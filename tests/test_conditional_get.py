@@ -0,0 +1,38 @@
+import uuid
+
+import pytest
+
+import app as app_module
+import database
+
+@pytest.fixture
+def client(monkeypatch):
+    user_id = database.add_user(f"etag-user-{uuid.uuid4().hex}")
+    database.add_workout("2025-01-01", user_id, "gym", {"muscle_group": "Chest", "exercise": "Bench press",
+                                                        "max_weight": "80", "sets": "5", "reps": "5"})
+    suggestions = iter(["First plan", "Second plan"])
+    monkeypatch.setattr(app_module, "query_openai", lambda prompt: next(suggestions))
+    monkeypatch.setattr(app_module, "query_openai_hedged", lambda prompt: next(suggestions))
+    client = app_module.app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+        sess["user_name"] = "etag-user"
+    return client
+
+def test_embedded_suggestion_page_is_not_validated(client, monkeypatch):
+    monkeypatch.setattr(app_module, "STREAM_SUGGESTIONS", False)
+    first = client.get("/gym_suggest")
+    assert b"First plan" in first.data
+    assert first.headers.get("ETag") is None and first.headers.get("Last-Modified") is None
+    client.get("/gym_suggest?regenerate=1")
+    # A revisit must show the regenerated suggestion, not a 304 for the old page
+    again = client.get("/gym_suggest", headers={"If-None-Match": '"anything"', "If-Modified-Since":
+                                                "Wed, 01 Jan 2100 00:00:00 GMT"})
+    assert again.status_code == 200 and b"Second plan" in again.data
+
+def test_streaming_shell_is_validated(client, monkeypatch):
+    monkeypatch.setattr(app_module, "STREAM_SUGGESTIONS", True)
+    first = client.get("/gym_suggest")
+    etag = first.headers.get("ETag")
+    assert etag
+    assert client.get("/gym_suggest", headers={"If-None-Match": etag}).status_code == 304
@@ -0,0 +1,29 @@
+from history_compactor import compact_gym_history, estimate_tokens
+
+def _workout(date, exercise, notes=""):
+    return {"date": date, "details": {"muscle_group": "Legs", "exercise": exercise + notes,
+                                      "max_weight": "100", "sets": "5", "reps": "5"}}
+
+def _summary(workouts):
+    return {"sessions": len({w["date"] for w in workouts}),
+            "muscle_groups": {"Legs": max(w["date"] for w in workouts)},
+            "exercises": {w["details"]["exercise"]: {"muscle_group": "Legs", "last_date": w["date"],
+                                                     "last_weight": "100", "max_weight": "100", "entries": 1}
+                          for w in workouts},
+            "last_session": max(w["date"] for w in workouts)}
+
+def test_short_history_within_budget_is_verbatim():
+    workouts = [_workout("2025-01-02", "Squat"), _workout("2025-01-01", "Lunge")]
+    text, stats = compact_gym_history(workouts, _summary(workouts), token_budget=1500)
+    assert "Session Date: 2025-01-02" in text and "Session Date: 2025-01-01" in text
+    assert stats["verbatim_sessions"] == 2
+
+def test_short_history_with_long_entries_respects_budget():
+    notes = " - " + "paused reps, slow eccentric, belt on the last set " * 40
+    workouts = [_workout("2025-01-03", "Squat", notes), _workout("2025-01-02", "Lunge", notes),
+                _workout("2025-01-01", "Deadlift", notes)]
+    text, stats = compact_gym_history(workouts, _summary(workouts), token_budget=300, recent_sessions=3)
+    assert estimate_tokens(text) <= 300
+    assert stats["compact_tokens"] <= 300
+    # The most recent session is what's kept
+    assert "2025-01-03" in text
@@ -0,0 +1,20 @@
+import time
+import email.utils
+
+import llm_client
+
+class _Response:
+    def __init__(self, retry_after):
+        self.headers = {"Retry-After": retry_after}
+
+def test_retry_after_seconds_and_dates():
+    assert llm_client._retry_after(_Response("7")) == 7.0
+    date = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25 < llm_client._retry_after(_Response(date)) <= 30
+    # "-0000" parses as a naive datetime, which is still UTC
+    naive = email.utils.formatdate(time.time() + 30)
+    assert 25 < llm_client._retry_after(_Response(naive)) <= 30
+
+def test_malformed_retry_after_falls_back_to_backoff():
+    assert llm_client._retry_after(_Response("soon")) is None
+    assert 0 <= llm_client._backoff(0, _Response("soon")) <= llm_client.BACKOFF_BASE
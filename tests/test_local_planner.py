@@ -0,0 +1,25 @@
+import datetime
+
+from local_planner import DEFAULT_GROUPS, gym_plan, wod_plan
+
+def _stats(muscle_groups, last_date="2025-01-10"):
+    return {"sessions": 2, "last_session": last_date, "muscle_groups": muscle_groups, "exercises": {}}
+
+def test_focus_when_every_known_group_was_trained_last_session():
+    plan = gym_plan(_stats({group: "2025-01-10" for group in DEFAULT_GROUPS}))
+    assert "Today's focus: Arms and Back." in plan
+    assert "Light curls and triceps extensions" in plan
+    assert plan.count(" sets.") == 5
+
+def test_focus_tops_up_from_last_session_groups():
+    trained = {group: "2025-01-10" for group in DEFAULT_GROUPS}
+    trained["Legs"] = "2025-01-01"
+    plan = gym_plan(_stats(trained))
+    assert "Today's focus: Legs and Arms." in plan
+    assert plan.count(" sets.") == 5
+
+def test_kettlebell_loads_are_real_bell_sizes():
+    last_wod = {"details": {"wod_blocks": "squat and press", "wod_difficulty": "perfect"}}
+    plan = wod_plan(last_wod, today=datetime.date(2025, 1, 1))
+    assert "kettlebell swings (24 kg)" in plan
+    assert "deadlifts at 90 kg" in plan
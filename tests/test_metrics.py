@@ -0,0 +1,43 @@
+import os
+import json
+import subprocess
+import sys
+
+import pytest
+
+import metrics
+
+@pytest.fixture
+def metrics_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    return tmp_path
+
+def _write(directory, pid, started, value):
+    snap = {"pid": pid, "started": started, "counters": [["test_total", [], value]],
+            "histograms": [], "gauges": [["test_gauge", [], 1]]}
+    (directory / f"{pid}-{started}.json").write_text(json.dumps(snap))
+
+def _dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+def _collected(name):
+    counters, _, gauges = metrics.collect()
+    return counters.get((name, ()), 0), gauges.get(("test_gauge", ()), 0)
+
+def test_exited_processes_are_folded_into_totals(metrics_dir):
+    pid = _dead_pid()
+    _write(metrics_dir, pid, 1, 5)
+    assert _collected("test_total") == (5, 0)
+    assert sorted(os.listdir(metrics_dir)) == [".lock", f"{os.getpid()}-{metrics._started}.json", "totals.json"]
+    # Later processes add to the folded totals
+    _write(metrics_dir, pid, 2, 3)
+    assert _collected("test_total") == (8, 0)
+
+def test_reused_pid_does_not_replace_the_old_snapshot(metrics_dir):
+    # An earlier process had this (live) pid; its counts must not be lost
+    _write(metrics_dir, os.getppid(), 1, 4)
+    _write(metrics_dir, os.getppid(), 2, 1)
+    assert _collected("test_total") == (5, 1)
+    assert _collected("test_total") == (5, 1)
@@ -0,0 +1,46 @@
+import json
+import sqlite3
+
+import pytest
+
+import database
+
+GYM = [("2025-01-01", {"muscle_group": "Legs ", "exercise": "Squat", "max_weight": "100kg", "sets": "5", "reps": "5"}),
+       ("2025-01-01", {"muscle_group": "Back", "exercise": "Row", "max_weight": "60", "sets": "4 sets", "reps": "8"}),
+       ("2025-01-03", {"muscle_group": "Legs", "exercise": "Squat", "max_weight": "90", "sets": "5", "reps": "5"}),
+       ("2025-01-03", {"muscle_group": "", "exercise": "Plank", "max_weight": "", "sets": "3", "reps": "1"})]
+WOD = ("2025-01-02", {"wod_blocks": "Block 1: Warm-up\nExercises:\n- Row\nTime: 5 minutes"})
+
+def _pre_versioning_db(path):
+    conn = sqlite3.connect(path, isolation_level=None)
+    database._migration_base_tables(conn)
+    rows = [(date, 1, "gym", json.dumps(details)) for date, details in GYM]
+    rows.append((WOD[0], 1, "wod", json.dumps(WOD[1])))
+    conn.executemany("INSERT INTO workouts (date, user_id, workout_type, details) VALUES (?, ?, ?, ?)", rows)
+    return conn
+
+def test_backfill_migrations_match_the_live_code(tmp_path):
+    conn = _pre_versioning_db(str(tmp_path / "old.db"))
+    for _, migration in database.MIGRATIONS[1:]:
+        migration(conn)
+    query = lambda sql: sorted(conn.execute(sql).fetchall(), key=repr)
+    typed = query("SELECT * FROM gym_sets"), query("SELECT workout_id, user_id, date, wod_blocks, difficulty FROM wods")
+    stats = query("SELECT * FROM user_stats")
+    assert len(typed[0]) == 4 and len(stats) == 6
+
+    # What today's write path and stats rebuild produce for the same rows
+    rows = conn.execute("SELECT id, date, user_id, workout_type, details FROM workouts").fetchall()
+    database._insert_typed_rows(conn, [(r[0], r[1], r[2], r[3], json.loads(r[4])) for r in rows])
+    database._rebuild_stats(conn, 1)
+    assert query("SELECT * FROM gym_sets") == typed[0]
+    assert query("SELECT workout_id, user_id, date, wod_blocks, difficulty FROM wods") == typed[1]
+    assert query("SELECT * FROM user_stats") == stats
+
+@pytest.mark.skipif(not database.USE_SQLITE, reason="SQLite only")
+def test_wods_saved_without_blocks_get_parsed():
+    user_id = database.add_user("blocks-user")
+    database.add_workout(WOD[0], user_id, "wod", dict(WOD[1]))
+    assert database.parse_missing_wod_blocks() >= 1
+    wod = database.get_workouts(user_id, "wod")[0]
+    assert wod["details"]["blocks"][0]["title"] == "Warm-up"
+    assert database.parse_missing_wod_blocks() == 0
@@ -0,0 +1,13 @@
+import os
+import stat
+
+import prompt_store
+
+def test_save_keeps_the_file_mode(tmp_path, monkeypatch):
+    path = tmp_path / "prompts.json"
+    monkeypatch.setattr(prompt_store, "PROMPTS_FILE", str(path))
+    prompt_store.save(prompt_store.DEFAULT_PROMPTS)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+    os.chmod(path, 0o640)
+    prompt_store.save(prompt_store.DEFAULT_PROMPTS)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
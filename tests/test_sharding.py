@@ -0,0 +1,85 @@
+import pytest
+
+import database
+
+pytestmark = pytest.mark.skipif(not database.USE_SQLITE, reason="SQLite only")
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """A new, empty database at tmp_path; DB_SHARDS is set by the test."""
+    database.close_connection()
+    monkeypatch.setattr(database, "db_path", str(tmp_path / "test.db"))
+    monkeypatch.setattr(database, "DB_SHARDS", 0)
+    monkeypatch.setattr(database, "_initialized", False)
+    database._user_cache["version"] = None
+    yield
+    database.close_connection()
+    database._user_cache["version"] = None
+
+def _use_shards(monkeypatch, count):
+    monkeypatch.setattr(database, "DB_SHARDS", count)
+    database.migrate()
+
+def _add_gym(user_id, date, exercise, weight):
+    database.add_workout(date, user_id, "gym", {"muscle_group": "Legs", "exercise": exercise,
+                                                "max_weight": weight, "sets": "5", "reps": "5"})
+
+def _workout_count(location):
+    return database.get_connection(location).execute("SELECT COUNT(*) FROM workouts").fetchone()[0]
+
+def test_users_and_workout_ids_route_to_their_shard(fresh_db, monkeypatch):
+    _use_shards(monkeypatch, 3)
+    user_ids = [database.add_user(f"user-{i}") for i in range(6)]
+    for user_id in user_ids:
+        _add_gym(user_id, "2025-01-01", "Squat", "100")
+    assert _workout_count(None) == 0
+    for user_id in user_ids:
+        shard = database._home_shard(user_id)
+        [workout] = database.get_workouts(user_id, "gym")
+        assert database._user_location(user_id) == shard
+        assert database._workout_location(workout["id"]) == shard
+        assert database.get_connection(shard).execute(
+            "SELECT user_id FROM workouts WHERE id = ?", (workout["id"],)).fetchone() == (user_id,)
+    assert sum(_workout_count(shard) for shard in range(3)) == len(user_ids)
+
+def test_delete_in_a_shard_rebuilds_stats(fresh_db, monkeypatch):
+    _use_shards(monkeypatch, 2)
+    user_id = database.add_user("lifter")
+    _add_gym(user_id, "2025-01-01", "Squat", "100")
+    _add_gym(user_id, "2025-01-02", "Squat", "120")
+    heaviest = database.get_workouts(user_id, "gym")[0]
+    assert database._workout_location(heaviest["id"]) == database._home_shard(user_id)
+    database.delete_workout(heaviest["id"], "gym")
+    assert [w["details"]["max_weight"] for w in database.get_workouts(user_id, "gym")] == ["100"]
+    stats = database.get_user_stats(user_id)
+    assert stats["exercises"]["Squat"]["max_weight"] == "100"
+    assert stats["sessions"] == 1 and stats["last_session"] == "2025-01-01"
+
+def test_rebalance_round_trip(fresh_db, monkeypatch):
+    user_ids = [database.add_user(f"user-{i}") for i in range(5)]
+    for user_id in user_ids:
+        _add_gym(user_id, "2025-01-01", "Squat", str(80 + user_id))
+        database.add_workout("2025-01-02", user_id, "wod", {"wod_blocks": "Block 1: Thrusters"})
+    before = {user_id: (database.get_workouts(user_id, "gym")[0]["details"], database.get_user_stats(user_id))
+              for user_id in user_ids}
+
+    _use_shards(monkeypatch, 2)
+    assert database.rebalance_shards() == len(user_ids)
+    assert _workout_count(None) == 0
+    for user_id in user_ids:
+        assert database._user_location(user_id) == database._home_shard(user_id)
+        assert (database.get_workouts(user_id, "gym")[0]["details"], database.get_user_stats(user_id)) == \
+            before[user_id]
+        [match] = database.search_workouts(user_id, "thrust")
+        assert "**Thrusters**" in match["snippet"]
+        # Moved rows got ids in their new shard's range, so deletes find them
+        wod = database.get_workouts(user_id, "wod")[0]
+        assert database._workout_location(wod["id"]) == database._home_shard(user_id)
+    assert database.rebalance_shards() == 0
+
+    monkeypatch.setattr(database, "DB_SHARDS", 0)
+    assert database.rebalance_shards() == len(user_ids)
+    assert _workout_count(None) == 2 * len(user_ids)
+    assert _workout_count(0) == _workout_count(1) == 0
+    for user_id in user_ids:
+        assert database.get_user_stats(user_id) == before[user_id][1]
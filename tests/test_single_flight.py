@@ -0,0 +1,76 @@
+import time
+import threading
+
+import app as app_module
+import database
+import metrics
+import single_flight
+
+def _coalesced(scope):
+    return metrics._counters.get(("llm_coalesced_total", (("scope", scope),)), 0)
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_identical_requests_share_one_llm_call(monkeypatch):
+    calls = []
+    release = threading.Event()
+
+    def fake_query(prompt):
+        calls.append(prompt)
+        release.wait(5)
+        return "Shared plan"
+
+    monkeypatch.setattr(app_module, "query_openai", fake_query)
+    user_id = database.add_user("flight-user")
+    results = []
+    requests = [threading.Thread(target=lambda: results.append(app_module.get_suggestion("gym", user_id)))
+                for _ in range(2)]
+    followers = _coalesced("process")
+    requests[0].start()
+    _wait_for(lambda: calls)
+    requests[1].start()
+    _wait_for(lambda: _coalesced("process") > followers)
+    release.set()
+    for thread in requests:
+        thread.join(5)
+    assert results == ["Shared plan", "Shared plan"]
+    assert len(calls) == 1
+
+def test_follower_gets_the_whole_text_when_the_leader_disconnects():
+    release = threading.Event()
+
+    def chunks():
+        yield "a"
+        release.wait(5)
+        yield "b"
+        yield "c"
+
+    leader = single_flight.stream("test:disconnect", chunks)
+    assert next(leader) == "a"
+    results = []
+    follower = threading.Thread(target=lambda: results.append(
+        single_flight.run("test:disconnect", lambda: "second call")))
+    followers = _coalesced("process")
+    follower.start()
+    _wait_for(lambda: _coalesced("process") > followers)
+    release.set()
+    leader.close()  # drains the rest of the call for the follower
+    follower.join(5)
+    assert results == ["abc"]
+    assert "test:disconnect" not in single_flight._flights
+
+def test_waits_for_a_call_in_another_worker(monkeypatch):
+    monkeypatch.setattr(single_flight, "POLL_INTERVAL", 0.01)
+    key = "test:other-worker"
+    assert database.acquire_flight_lease(key, "other-worker", single_flight.LEASE_TTL)
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(single_flight.run(key, lambda: "own call")))
+    waiter.start()
+    time.sleep(0.05)
+    database.finish_flight_lease(key, "other-worker", "their result", None, single_flight.RESULT_TTL)
+    waiter.join(5)
+    assert results == ["their result"]
@@ -0,0 +1,152 @@
+# text_search.py
+# Helpers for the workout history search (database.search_workouts).
+#
+# SQLite keeps an FTS5 table (workout_search, see database.py) in sync with
+# gym_sets/wods through triggers; this module turns the user's free-form text
+# into a safe FTS5 query. The in-memory backend uses InvertedIndex instead:
+# per-user postings with BM25 ranking, prefix matching and snippets shaped
+# like FTS5's, so both backends answer the same queries in a similar order.
+#
+# Every query word must match (AND), as a prefix ("thrust" finds
+# "Thrusters"). Matches in snippets are wrapped in ** like the LLM's
+# markdown, so templates can reuse the markdown_bold filter.
+import re
+import math
+import bisect
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+# Max number of query words used (the rest are ignored)
+MAX_QUERY_TERMS = 8
+SNIPPET_WORDS = 12
+
+def query_terms(query):
+    """Lower-cased words of a search query, at most MAX_QUERY_TERMS."""
+    return [word.lower() for word in _WORD.findall(query or "")][:MAX_QUERY_TERMS]
+
+def fts_query(terms, owner):
+    """FTS5 MATCH expression: every term as a quoted prefix, scoped to one owner token."""
+    body = " AND ".join(f'"{term}"*' for term in terms)
+    return f'owner : "{owner}" AND body : ({body})'
+
+def owner_token(user_id):
+    return f"u{user_id}"
+
+def document_text(workout_type, details):
+    """The searchable text of a workout (same fields as the SQLite triggers)."""
+    if workout_type == "gym":
+        parts = (details.get("exercise"), details.get("muscle_group"))
+    elif workout_type == "wod":
+        parts = (details.get("wod_blocks", details.get("wod_workout")),
+                 details.get("wod_difficulty", details.get("feedback")))
+    else:
+        parts = ()
+    return " ".join(str(part) for part in parts if part)
+
+def _stem(word):
+    # Crude plural folding so "thrusters" finds "thruster"; SQLite uses the porter stemmer
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def make_snippet(text, terms, size=SNIPPET_WORDS):
+    """Up to `size` words of text around the first match, matches wrapped in **."""
+    words = list(_WORD.finditer(text))
+    stems = [_stem(term) for term in terms]
+
+    def matches(word):
+        word = _stem(word.lower())
+        return any(word.startswith(stem) for stem in stems)
+
+    first = next((i for i, m in enumerate(words) if matches(m.group(0))), 0)
+    start = max(0, min(first - size // 4, len(words) - size))
+    window = words[start:start + size]
+    if not window:
+        return ""
+    out = []
+    position = window[0].start()
+    for m in window:
+        out.append(text[position:m.start()])
+        out.append(f"**{m.group(0)}**" if matches(m.group(0)) else m.group(0))
+        position = m.end()
+    snippet = " ".join("".join(out).split())
+    if start > 0:
+        snippet = "…" + snippet
+    if start + size < len(words):
+        snippet += "…"
+    return snippet
+
+class _UserIndex:
+    __slots__ = ("postings", "terms", "lengths")
+
+    def __init__(self):
+        self.postings = {}  # term -> {workout_id: term frequency}
+        self.terms = []     # sorted vocabulary, for prefix lookups
+        self.lengths = {}   # workout_id -> number of words
+
+class InvertedIndex:
+    """Per-user inverted index over workout text. Not thread-safe: MemoryStore holds its lock."""
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self.users = {}  # user_id -> _UserIndex
+
+    def add(self, user_id, workout_id, text):
+        words = [_stem(word.lower()) for word in _WORD.findall(text)]
+        if not words:
+            return
+        index = self.users.setdefault(user_id, _UserIndex())
+        index.lengths[workout_id] = len(words)
+        for word in words:
+            postings = index.postings.get(word)
+            if postings is None:
+                postings = index.postings[word] = {}
+                bisect.insort(index.terms, word)
+            postings[workout_id] = postings.get(workout_id, 0) + 1
+
+    def remove(self, user_id, workout_id, text):
+        index = self.users.get(user_id)
+        if index is None or index.lengths.pop(workout_id, None) is None:
+            return
+        for word in {_stem(word.lower()) for word in _WORD.findall(text)}:
+            postings = index.postings.get(word)
+            if postings is None:
+                continue
+            postings.pop(workout_id, None)
+            if not postings:
+                del index.postings[word]
+                del index.terms[bisect.bisect_left(index.terms, word)]
+
+    def search(self, user_id, terms):
+        """Return [(score, workout_id)] of the user's workouts matching every term, best first."""
+        index = self.users.get(user_id)
+        if index is None or not terms:
+            return []
+        total = len(index.lengths)
+        average = sum(index.lengths.values()) / total
+        scores = None
+        for term in terms:
+            stem = _stem(term)
+            # Every indexed word starting with the term counts as an occurrence
+            frequencies = {}
+            position = bisect.bisect_left(index.terms, stem)
+            while position < len(index.terms) and index.terms[position].startswith(stem):
+                for workout_id, count in index.postings[index.terms[position]].items():
+                    frequencies[workout_id] = frequencies.get(workout_id, 0) + count
+                position += 1
+            if not frequencies:
+                return []
+            idf = math.log((total - len(frequencies) + 0.5) / (len(frequencies) + 0.5) + 1)
+            term_scores = {}
+            for workout_id, count in frequencies.items():
+                if scores is not None and workout_id not in scores:
+                    continue
+                norm = self.K1 * (1 - self.B + self.B * index.lengths[workout_id] / average)
+                term_scores[workout_id] = (scores or {}).get(workout_id, 0) + \
+                    idf * count * (self.K1 + 1) / (count + norm)
+            scores = term_scores
+            if not scores:
+                return []
+        return sorted(((score, workout_id) for workout_id, score in scores.items()),
+                      key=lambda item: (-item[0], -item[1]))
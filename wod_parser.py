@@ -0,0 +1,86 @@
+# wod_parser.py
+# Parses WOD programs written in the "Block X:" format the WOD prompt asks for.
+#
+# Blocks are parsed once, when a WOD is saved (older WODs at startup, see
+# database.parse_missing_wod_blocks), and stored as structured data so history
+# pages don't run regexes on render.
+import re
+
+# "Block 2:" anywhere in the text starts a new block
+BLOCK_HEADER = re.compile(r'Block\s+(\d+):')
+# Optional markdown/list decoration before a label, e.g. "**Time:** 12 minutes" or "- Exercises:"
+_LABEL = re.compile(r'^[\s*#-]*(block title|title|exercises|time)\s*:\**\s*(.*?)\**\s*$', re.IGNORECASE)
+_DECORATION = re.compile(r'^[\s*#]+|[\s*#]+$')
+
+def iter_wod_blocks(chunks):
+    """Split a (possibly streamed) WOD completion into "Block X:" blocks.
+
+    Yields ("token", chunk) for every chunk and ("block", {"index", "text", "end"})
+    as soon as a block is complete, i.e. once the next block header has arrived.
+    Text before the first header is dropped; if there are no headers at all, the
+    whole completion is treated as a single block.
+    """
+    buffer = ""
+    start = 0  # offset of the first block that has not been emitted yet
+    index = 0
+    for chunk in chunks:
+        buffer += chunk
+        yield "token", chunk
+        headers = [m.start() for m in BLOCK_HEADER.finditer(buffer, start)]
+        # Every header but the last one closes the block before the next header
+        for block_start, block_end in zip(headers, headers[1:]):
+            yield "block", {"index": index, "text": buffer[block_start:block_end], "end": block_end}
+            index += 1
+            start = block_end
+    headers = [m.start() for m in BLOCK_HEADER.finditer(buffer, start)]
+    if headers:
+        yield "block", {"index": index, "text": buffer[headers[0]:], "end": len(buffer)}
+    elif index == 0:
+        # Fallback: if no blocks found, use the full suggestion
+        yield "block", {"index": 0, "text": buffer, "end": len(buffer)}
+
+def split_wod_blocks(text):
+    """Return the raw text of each "Block X:" block (or [text] if there are none)."""
+    return [data["text"] for kind, data in iter_wod_blocks([text]) if kind == "block"]
+
+def parse_block(text):
+    """Parse one block's text into {"number", "title", "exercises", "time", "text"}."""
+    header = BLOCK_HEADER.search(text)
+    number = int(header.group(1)) if header else None
+    # The rest of the header line is the title unless a "Block Title:" line follows
+    if header:
+        first_line, _, rest = text[header.end():].partition("\n")
+        title = _DECORATION.sub("", first_line)
+    else:
+        title, rest = "", text
+    exercises = []
+    time = ""
+    section = "exercises"
+    for line in rest.splitlines():
+        line = line.strip()
+        if not _DECORATION.sub("", line):
+            continue
+        label = _LABEL.match(line)
+        if label:
+            name, value = label.group(1).lower(), label.group(2).strip()
+            if name in ("block title", "title"):
+                title = value or title
+            elif name == "time":
+                time = value
+                section = "time"
+            else:
+                section = "exercises"
+                if value:
+                    exercises.append(value)
+            continue
+        if section == "time" and not time:
+            time = line
+        else:
+            exercises.append(line)
+    return {"number": number, "title": title, "exercises": exercises, "time": time, "text": text.strip()}
+
+def parse_wod_blocks(text):
+    """Parse a full WOD program into a list of block dicts (see parse_block)."""
+    if not text:
+        return []
+    return [parse_block(block) for block in split_wod_blocks(text)]